@@ -1,18 +1,46 @@
 """FastAPI application factory and configuration."""
 
 import logging
+from contextlib import asynccontextmanager
 
+from build_executor import BuildQueueFullError, build_queue_full_handler
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from rate_limit import limiter, rate_limit_exceeded_handler
 from routes import router
 from slowapi.errors import RateLimitExceeded
 from config import CORS_ORIGINS, validate_config
+from dune_cache_stats import get_dune_cache_stats
+from result_seeder import get_result_seeder
+from trash_reaper import get_trash_reaper
+from workspace_pool import get_workspace_pool
 
 logging.basicConfig(level=logging.INFO, format="%(name)s: %(message)s")
 log = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background services."""
+    dune_cache_stats = get_dune_cache_stats()
+    dune_cache_stats.start()
+    trash_reaper = get_trash_reaper()
+    trash_reaper.start()
+    workspace_pool = get_workspace_pool()
+    if workspace_pool is not None:
+        workspace_pool.start()
+    result_seeder = get_result_seeder()
+    if result_seeder is not None:
+        result_seeder.start()
+    yield
+    if result_seeder is not None:
+        result_seeder.stop()
+    if workspace_pool is not None:
+        workspace_pool.stop()
+    trash_reaper.stop()
+    dune_cache_stats.stop()
+
+
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application."""
     # Validate configuration on startup
@@ -25,10 +53,12 @@ def create_app() -> FastAPI:
         title="Hardcaml Web IDE",
         description="API for compiling and running Hardcaml circuits",
         version="1.0.0",
+        lifespan=lifespan,
     )
 
     app.state.limiter = limiter
     app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+    app.add_exception_handler(BuildQueueFullError, build_queue_full_handler)
 
     app.add_middleware(
         CORSMiddleware,
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark parsing of large dune outputs: previous multi-pass vs single-pass.
+
+Generates stdout/stderr shaped like a long AoC run (debug prints, PASS
+lines, a big ASCII waveform, a summary) and times:
+
+- multi_pass: the previous flow, which joined stdout and stderr, split the
+  result into lines, parsed them, then rescanned the joined text for
+  exceptions and compile errors
+- single_pass: compiler.OutputParser fed line by line, as the build does
+
+Both are given the lines the command runner already split, and report
+time and tracemalloc peak.
+
+Usage:
+    uv run python benchmarks/bench_output_parser.py              # ~8MB of output
+    uv run python benchmarks/bench_output_parser.py --mb 32 -n 3
+"""
+
+import argparse
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from compiler import (
+    TEST_SUMMARY,
+    WAVEFORM_END,
+    WAVEFORM_START,
+    OutputParser,
+    _merge_parsed,
+)
+
+
+def make_output(mb: int) -> tuple[list[str], list[str]]:
+    """stdout and stderr lines totalling about `mb` megabytes."""
+    target = mb * 1024 * 1024
+    stdout, size, i = [], 0, 0
+    while size < target * 0.6:
+        line = f"cycle {i}: acc={i * 7919 % 100003} state=Running"
+        stdout.append(line)
+        if i % 50 == 0:
+            stdout.append(f"PASS: check {i}")
+        size += len(line) + 1
+        i += 1
+    stdout.append(WAVEFORM_START)
+    while size < target:
+        line = "│" + "──┐  ┌" * 40
+        stdout.append(line)
+        size += len(line) + 1
+    stdout += [WAVEFORM_END, TEST_SUMMARY, f"TESTS: {i // 50} passed, 0 failed"]
+    stderr = ["Done: 120/121 (jobs: 1)"] * 100
+    return stdout, stderr
+
+
+def multi_pass(stdout_lines: list[str], stderr_lines: list[str]):
+    """The parsing done per build before the single-pass parser."""
+    stdout = "\n".join(stdout_lines)
+    stderr = "\n".join(stderr_lines)
+    combined = stdout + "\n" + stderr
+    test_lines, waveform_lines, waveform = [], [], None
+    in_waveform = in_summary = False
+    passed = failed = None
+    for line in combined.split("\n"):
+        clean = line
+        if line.startswith("+    ") or line.startswith("-    "):
+            clean = line[5:]
+        elif line.startswith("|    "):
+            clean = line[5:]
+        elif line.startswith("+") and not line.startswith("++"):
+            clean = line[1:]
+        if WAVEFORM_START in clean:
+            in_waveform = True
+        elif WAVEFORM_END in clean:
+            in_waveform = False
+            waveform = "\n".join(waveform_lines)
+        elif TEST_SUMMARY in clean:
+            in_summary = True
+        elif in_waveform:
+            waveform_lines.append(clean)
+        elif in_summary:
+            match = re.search(r"TESTS:\s*(\d+)\s*passed,\s*(\d+)\s*failed", clean)
+            in_summary = False
+            if match:
+                passed, failed = int(match.group(1)), int(match.group(2))
+                test_lines.append(clean)
+        elif clean.startswith("PASS:") or clean.startswith("FAIL:"):
+            test_lines.append(clean)
+    has_compile_error = "Error:" in stderr and "File" in stderr and "line" in stderr
+    exception = None
+    for line in combined.split("\n"):
+        if "Failure" in line or "failwith" in line.lower() or "Exception:" in line:
+            exception = line.strip()
+            break
+    return "\n".join(test_lines).strip(), waveform, passed, failed, has_compile_error, exception
+
+
+def single_pass(stdout_lines: list[str], stderr_lines: list[str]):
+    stdout = OutputParser()
+    stderr = OutputParser(compile_errors=True)
+    for line in stdout_lines:
+        stdout.feed(line)
+    for line in stderr_lines:
+        stderr.feed(line)
+    stderr.finish()
+    return _merge_parsed(stdout.result(), stderr.result())
+
+
+def measure(fn, stdout, stderr, runs: int) -> tuple[list[float], int]:
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn(stdout, stderr)
+        timings.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    fn(stdout, stderr)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=int, default=8, help="Output size (megabytes)")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="Runs per method")
+    args = parser.parse_args()
+
+    stdout, stderr = make_output(args.mb)
+    print(f"Output: {len(stdout) + len(stderr)} lines, ~{args.mb}MB")
+    for fn in (multi_pass, single_pass):
+        timings, peak = measure(fn, stdout, stderr, args.runs)
+        print(
+            f"{fn.__name__:>12}: median {statistics.median(timings):8.1f}ms  "
+            f"min {min(timings):8.1f}ms  peak alloc {peak / 1024 / 1024:6.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
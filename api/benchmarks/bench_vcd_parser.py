@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark VCD parsing on large files: whole-file text vs streaming.
+
+Writes a synthetic VCD shaped like a long Hardcaml simulation (a clock,
+counters and a few wide registers, one timestamp per half cycle), or uses
+a given file, then times in a fresh process each:
+
+- read_text: read it into a string and split it (the pre-streaming way)
+- build_index: vcd_parser's one-pass index
+- columnar: waveform_columns.vcd_to_columnar over the stream
+
+and reports throughput and the process's peak RSS.
+
+Usage:
+    uv run python benchmarks/bench_vcd_parser.py                  # 200MB synthetic VCD
+    uv run python benchmarks/bench_vcd_parser.py --size-mb 500
+    uv run python benchmarks/bench_vcd_parser.py waveform.vcd
+"""
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from vcd_parser import build_index, open_vcd
+from waveform_columns import vcd_to_columnar
+
+SIGNALS = [("clock", 1), ("enable", 1), ("count", 16), ("acc", 64), ("state", 4)]
+
+
+def write_synthetic_vcd(path: Path, size_mb: int) -> None:
+    """Write cycles until the file reaches size_mb."""
+    codes = [chr(33 + i) for i in range(len(SIGNALS))]
+    target = size_mb * 1024 * 1024
+    with open(path, "w") as f:
+        f.write("$timescale 1ns $end\n$scope module traces $end\n")
+        for (name, width), code in zip(SIGNALS, codes):
+            f.write(f"$var wire {width} {code} {name} $end\n")
+        f.write("$upscope $end\n$enddefinitions $end\n")
+        cycle = 0
+        while f.tell() < target:
+            lines = []
+            for _ in range(1000):
+                acc = (cycle * 0x9E3779B97F4A7C15) & (2**64 - 1)
+                lines.append(
+                    f"#{cycle * 10}\n1!\n{cycle % 7 != 0:d}\"\n"
+                    f"b{cycle & 0xFFFF:b} #\nb{acc:b} $\nb{cycle % 5:b} %\n"
+                    f"#{cycle * 10 + 5}\n0!\n"
+                )
+                cycle += 1
+            f.write("".join(lines))
+
+
+def run_read_text(path: Path) -> int:
+    return len(path.read_text().split())
+
+
+def run_build_index(path: Path) -> int:
+    with open_vcd(path) as stream:
+        return build_index(stream).changes
+
+
+def run_columnar(path: Path) -> int:
+    with open_vcd(path) as stream:
+        return len(vcd_to_columnar(stream))
+
+
+METHODS = {
+    "read_text": run_read_text,
+    "build_index": run_build_index,
+    "columnar": run_columnar,
+}
+
+
+def measure(name: str, path: Path, results) -> None:
+    """Run one method; report (seconds, peak RSS in MB, result)."""
+    t0 = time.perf_counter()
+    value = METHODS[name](path)
+    elapsed = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results.put((elapsed, peak_mb, value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("vcd", nargs="?", type=Path, help="VCD file (default: synthetic)")
+    parser.add_argument("--size-mb", type=int, default=200, help="Synthetic VCD size")
+    parser.add_argument(
+        "--methods",
+        default=",".join(METHODS),
+        help=f"Comma-separated subset of {', '.join(METHODS)}",
+    )
+    parser.add_argument(
+        "--work-dir", type=Path, default=None, help="Where to write the synthetic VCD"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp:
+        path = args.vcd
+        if path is None:
+            path = Path(tmp) / "synthetic.vcd"
+            write_synthetic_vcd(path, args.size_mb)
+        size_mb = path.stat().st_size / (1024 * 1024)
+        print(f"VCD: {path} ({size_mb:.0f}MB)")
+
+        # Each method in its own process, so peak RSS is its own
+        ctx = multiprocessing.get_context("spawn")
+        for name in args.methods.split(","):
+            results = ctx.Queue()
+            proc = ctx.Process(target=measure, args=(name, path, results))
+            proc.start()
+            elapsed, peak_mb, value = results.get()
+            proc.join()
+            print(
+                f"{name:>12}: {elapsed:7.2f}s  {size_mb / elapsed:6.1f}MB/s  "
+                f"peak RSS {peak_mb:7.0f}MB  ({value})"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold-session workspace setup: shutil.copytree vs materialize_tree.
+
+Times what WorkspaceCache does for a brand-new session_id, using either a
+real build template (with its pre-built _build/) or a synthetic one.
+
+Usage:
+    uv run python benchmarks/bench_workspace_setup.py                       # synthetic template
+    uv run python benchmarks/bench_workspace_setup.py /opt/build-templates/standard
+    uv run python benchmarks/bench_workspace_setup.py -n 10 --files 20000
+"""
+
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from workspace_materializer import materialize_tree
+
+
+def make_synthetic_template(root: Path, files: int, file_size: int) -> Path:
+    """Create a template shaped like a built dune project."""
+    template = root / "template"
+    (template / "test").mkdir(parents=True)
+    (template / "dune-project").write_text("(lang dune 3.11)\n")
+    (template / "test" / "harness_utils.ml").write_text("let x = ()\n")
+    build = template / "_build"
+    build.mkdir()
+    (build / ".db").write_bytes(b"\x00" * 65536)
+    (build / "log").write_text("# dune build\n")
+    payload = b"\x00" * file_size
+    per_dir = 200
+    for i in range(files):
+        d = build / "default" / f"lib{i // per_dir}" / ".objs"
+        if i % per_dir == 0:
+            d.mkdir(parents=True)
+        (d / f"m{i}.cmx").write_bytes(payload)
+    return template
+
+
+def time_setup(setup, template: Path, work: Path, runs: int) -> list[float]:
+    """Run setup(template, dest) `runs` times into fresh destinations."""
+    timings = []
+    for i in range(runs):
+        dest = work / f"ws-{setup.__name__}-{i}"
+        t0 = time.perf_counter()
+        setup(template, dest)
+        timings.append((time.perf_counter() - t0) * 1000)
+        shutil.rmtree(dest)
+    return timings
+
+
+def copytree_setup(template: Path, dest: Path) -> None:
+    """The old path: copy everything, then drop unused directories."""
+    shutil.copytree(template, dest)
+    for subdir in ["src", "test"]:
+        if (dest / subdir).exists():
+            shutil.rmtree(dest / subdir)
+
+
+def materialize_setup(template: Path, dest: Path) -> None:
+    """The new path."""
+    materialize_tree(template, dest, skip={"src", "test"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("template", nargs="?", type=Path, help="Template directory")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="Runs per method")
+    parser.add_argument(
+        "--files", type=int, default=5000, help="Synthetic _build file count"
+    )
+    parser.add_argument(
+        "--file-size", type=int, default=32 * 1024, help="Synthetic file size (bytes)"
+    )
+    parser.add_argument(
+        "--work-dir", type=Path, default=None, help="Where to create workspaces"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp:
+        work = Path(tmp)
+        if args.template:
+            template = args.template
+        else:
+            template = make_synthetic_template(work, args.files, args.file_size)
+
+        stats = materialize_tree(template, work / "probe", skip={"src", "test"})
+        shutil.rmtree(work / "probe")
+        print(f"Template: {template}")
+        print(f"  {stats.summary()}")
+
+        for setup in (copytree_setup, materialize_setup):
+            timings = time_setup(setup, template, work, args.runs)
+            print(
+                f"{setup.__name__:>18}: median {statistics.median(timings):8.1f}ms  "
+                f"min {min(timings):8.1f}ms  max {max(timings):8.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
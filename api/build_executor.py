@@ -0,0 +1,237 @@
+"""
+Bounded build executor for compile requests.
+
+Runs builds on a fixed number of worker slots so the event loop stays free
+for other requests (including /health). Admission is bounded:
+once every worker is busy and the wait queue is full, new builds are
+rejected with BuildQueueFullError instead of piling up.
+"""
+
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+log = logging.getLogger(__name__)
+
+# Default configuration
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_RETRY_AFTER_SECONDS = 5
+
+
+class BuildQueueFullError(Exception):
+    """Raised when a build cannot be admitted because the queue is full."""
+
+    def __init__(self, queue_depth: int, retry_after: int):
+        super().__init__(
+            f"Build queue is full ({queue_depth} builds waiting). Please try again shortly."
+        )
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+
+@dataclass
+class BuildTicket:
+    """Admission record for a single build."""
+
+    # Builds already running or waiting when this one was admitted
+    queue_depth: int
+    submitted_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    cancelled: bool = False
+
+    @property
+    def wait_ms(self) -> int:
+        """Time spent waiting for a free worker."""
+        if self.started_at is None:
+            return 0
+        return int((self.started_at - self.submitted_at) * 1000)
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    """Resolve a slot waiter unless it was cancelled in the meantime."""
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class BuildExecutor:
+    """
+    Fixed-size pool of build workers with a bounded admission queue.
+
+    At most `workers` builds run at once; up to `queue_size` more may wait
+    for a worker. Anything beyond that is rejected immediately so callers
+    can answer with 503 + Retry-After.
+
+    A build holds a worker slot (see slot()) while it runs. Slots are
+    handed out in FIFO order and are not tied to a single event loop.
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        retry_after: int = DEFAULT_RETRY_AFTER_SECONDS,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._running = 0
+        self._waiting = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait_ms = 0
+        # Builds waiting for a slot: (ticket, loop, future) in arrival order
+        self._waiters: deque[
+            tuple[BuildTicket, asyncio.AbstractEventLoop, asyncio.Future]
+        ] = deque()
+
+        log.info(
+            f"BuildExecutor initialized: workers={workers}, queue_size={queue_size}"
+        )
+
+    def _admit(self) -> BuildTicket:
+        """Reserve a place in the queue, or raise if it is full."""
+        with self._lock:
+            if self._running + self._waiting >= self.workers + self.queue_size:
+                self._rejected += 1
+                raise BuildQueueFullError(self._waiting, self.retry_after)
+            ticket = BuildTicket(
+                queue_depth=self._running + self._waiting, submitted_at=time.time()
+            )
+            self._waiting += 1
+            return ticket
+
+    def _start(self, ticket: BuildTicket) -> None:
+        """Move a ticket from waiting to running (caller holds the lock)."""
+        self._waiting -= 1
+        self._running += 1
+        ticket.started_at = time.time()
+        self._total_wait_ms += ticket.wait_ms
+
+    async def _acquire_slot(self, ticket: BuildTicket) -> None:
+        """Wait until a worker slot is free for this ticket."""
+        with self._lock:
+            if self._running < self.workers and not self._waiters:
+                self._start(ticket)
+                return
+            loop = asyncio.get_running_loop()
+            waiter = loop.create_future()
+            self._waiters.append((ticket, loop, waiter))
+
+        try:
+            await waiter
+        except BaseException:
+            with self._lock:
+                if ticket.started_at is None:
+                    # Still queued: give up our place
+                    ticket.cancelled = True
+                    self._waiting -= 1
+                    self._waiters = deque(
+                        w for w in self._waiters if w[0] is not ticket
+                    )
+                    raise
+            # The slot was handed to us just as we were cancelled
+            self._release_slot(ticket)
+            raise
+
+    def _release_slot(self, ticket: BuildTicket) -> None:
+        """Free a worker slot, handing it straight to the next waiter."""
+        with self._lock:
+            self._running -= 1
+            self._completed += 1
+            ticket.finished_at = time.time()
+            if self._waiters and self._running < self.workers:
+                next_ticket, loop, waiter = self._waiters.popleft()
+                self._start(next_ticket)
+                loop.call_soon_threadsafe(_wake, waiter)
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self, on_admit: Callable[[BuildTicket], None] | None = None
+    ) -> AsyncIterator[BuildTicket]:
+        """
+        Hold a worker slot for the duration of the block.
+
+        Args:
+            on_admit: Optional callback invoked once the build is queued,
+                before waiting for a free worker.
+
+        Raises:
+            BuildQueueFullError: if every worker is busy and the queue is full.
+        """
+        ticket = self._admit()
+        if on_admit:
+            on_admit(ticket)
+        await self._acquire_slot(ticket)
+        try:
+            yield ticket
+        finally:
+            self._release_slot(ticket)
+
+    def get_stats(self) -> dict:
+        """Get executor statistics."""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "running": self._running,
+                "waiting": self._waiting,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": (
+                    self._total_wait_ms // self._completed if self._completed else 0
+                ),
+            }
+
+
+async def build_queue_full_handler(request: Request, exc: Exception) -> Response:
+    """Handler for builds rejected by admission control."""
+    queue_depth = getattr(exc, "queue_depth", None)
+    retry_after = getattr(exc, "retry_after", DEFAULT_RETRY_AFTER_SECONDS)
+    log.warning(f"Build queue full ({queue_depth} waiting), rejecting request")
+
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(retry_after)},
+        content={
+            "success": False,
+            "error_type": "server_busy",
+            "error_message": "The build server is busy. Please try again in a few seconds.",
+            "queue_depth": queue_depth,
+        },
+    )
+
+
+# Global singleton instance
+_executor_instance: BuildExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_build_executor() -> BuildExecutor:
+    """Get the global build executor instance."""
+    global _executor_instance
+    if _executor_instance is None:
+        with _executor_lock:
+            if _executor_instance is None:
+                from config import (
+                    BUILD_QUEUE_RETRY_AFTER,
+                    BUILD_QUEUE_SIZE,
+                    BUILD_WORKERS,
+                )
+
+                _executor_instance = BuildExecutor(
+                    workers=BUILD_WORKERS,
+                    queue_size=BUILD_QUEUE_SIZE,
+                    retry_after=BUILD_QUEUE_RETRY_AFTER,
+                )
+    return _executor_instance
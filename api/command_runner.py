@@ -0,0 +1,194 @@
+"""
+Asyncio subprocess runner with streaming output capture.
+
+Runs build commands without tying up a thread per build: stdout and stderr
+are read incrementally, each complete line is handed to a callback as soon
+as it arrives, and the retained copy of the output is capped so runaway
+test output cannot grow without limit. On timeout the whole process group
+is killed, including any test runners dune spawned.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+log = logging.getLogger(__name__)
+
+# Default configuration
+DEFAULT_MAX_OUTPUT_BYTES = 1024 * 1024  # per stream
+READ_CHUNK_SIZE = 64 * 1024
+
+# opam binaries are not always on PATH for the API process
+OPAM_BIN = "/root/.opam/5.2.0+ox/bin"
+
+# Called with (line, stream_name) for every complete output line
+LineCallback = Callable[[str, str], None]
+
+
+@dataclass
+class CommandResult:
+    """Result of running a command."""
+
+    returncode: int
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    truncated: bool = False
+
+
+class CappedLines:
+    """Keeps lines up to `limit` bytes in total and counts the rest."""
+
+    def __init__(self, limit: int, label: str = "output"):
+        self.limit = limit
+        # Named in the truncation marker
+        self.label = label
+        self.size = 0
+        self.dropped = 0
+        self._lines: list[str] = []
+
+    def append(self, line: str) -> None:
+        n = len(line) + 1
+        if self.size + n > self.limit:
+            self.dropped += n
+            return
+        self.size += n
+        self._lines.append(line)
+
+    def text(self) -> str:
+        text = "\n".join(self._lines)
+        if self.dropped:
+            text += f"\n... [{self.label} truncated: {self.dropped} bytes omitted]"
+        return text
+
+
+def build_command_env(env: Optional[dict] = None) -> dict:
+    """
+    Build the subprocess environment, ensuring opam binaries are on PATH.
+
+    Variables set to None in env are removed rather than inherited.
+    """
+    run_env = os.environ.copy()
+    for name, value in (env or {}).items():
+        if value is None:
+            run_env.pop(name, None)
+        else:
+            run_env[name] = value
+    if OPAM_BIN not in run_env.get("PATH", ""):
+        run_env["PATH"] = f"{OPAM_BIN}:{run_env.get('PATH', '')}"
+    return run_env
+
+
+def _kill_process_group(proc: asyncio.subprocess.Process) -> None:
+    """Kill the process and everything it spawned."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _pump(
+    stream: asyncio.StreamReader,
+    name: str,
+    buffer: CappedLines,
+    on_line: Optional[LineCallback],
+) -> None:
+    """Read a stream chunk by chunk, splitting it into lines as they complete."""
+    pending = b""
+    while True:
+        chunk = await stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for raw in lines:
+            line = raw.decode("utf-8", errors="replace")
+            buffer.append(line)
+            if on_line:
+                on_line(line, name)
+        # A single line longer than the cap is never going to be kept whole
+        if len(pending) > buffer.limit:
+            buffer.dropped += len(pending)
+            pending = b""
+    if pending:
+        line = pending.decode("utf-8", errors="replace")
+        buffer.append(line)
+        if on_line:
+            on_line(line, name)
+
+
+async def run_command_async(
+    cmd: list[str],
+    cwd: Path,
+    timeout: int,
+    env: Optional[dict] = None,
+    on_line: Optional[LineCallback] = None,
+    max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+) -> CommandResult:
+    """
+    Run a command with timeout, streaming its output line by line.
+
+    Args:
+        cmd: Command and arguments
+        cwd: Working directory
+        timeout: Seconds before the whole process group is killed
+        env: Extra environment variables (None values unset a variable)
+        on_line: Optional callback invoked with (line, "stdout"|"stderr")
+        max_output_bytes: Cap on retained output per stream
+    """
+    stdout_buf = CappedLines(max_output_bytes)
+    stderr_buf = CappedLines(max_output_bytes)
+
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=cwd,
+            env=build_command_env(env),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+    except Exception as e:
+        return CommandResult(returncode=-1, stdout="", stderr=str(e))
+
+    readers = asyncio.gather(
+        _pump(proc.stdout, "stdout", stdout_buf, on_line),
+        _pump(proc.stderr, "stderr", stderr_buf, on_line),
+    )
+    timed_out = False
+    try:
+        await asyncio.wait_for(asyncio.shield(readers), timeout)
+        returncode = await proc.wait()
+    except asyncio.TimeoutError:
+        timed_out = True
+        _kill_process_group(proc)
+        await proc.wait()
+        # Pipes close once every process in the group is gone
+        try:
+            await asyncio.wait_for(readers, 5)
+        except asyncio.TimeoutError:
+            log.warning(f"Output of timed-out command {cmd[0]} did not close")
+        returncode = -1
+    finally:
+        if proc.returncode is None:
+            _kill_process_group(proc)
+            await proc.wait()
+        if not readers.done():
+            readers.cancel()
+
+    stderr = stderr_buf.text()
+    if timed_out:
+        stderr += f"\nCommand timed out after {timeout} seconds"
+
+    return CommandResult(
+        returncode=returncode,
+        stdout=stdout_buf.text(),
+        stderr=stderr,
+        timed_out=timed_out,
+        truncated=bool(stdout_buf.dropped or stderr_buf.dropped),
+    )
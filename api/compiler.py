@@ -4,20 +4,36 @@ Hardcaml Compiler Module
 Handles compilation and execution of Hardcaml circuits in a sandboxed environment.
 """
 
+import asyncio
+import dataclasses
 import logging
-import os
 import re
 import shutil
-import subprocess
 import tempfile
+import threading
 import time
 import uuid
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional
-
-from result_cache import get_result_cache
-from workspace_cache import get_workspace_cache
+from typing import Callable, Optional
+
+from build_executor import BuildTicket, get_build_executor
+from command_runner import (
+    DEFAULT_MAX_OUTPUT_BYTES,
+    CappedLines,
+    CommandResult,
+    run_command_async,
+)
+from config import COMPILE_OUTPUT_LIMIT_BYTES, COMPILE_TIMEOUT_SECONDS, DUNE_CACHE_ROOT
+from diagnostics import Diagnostic, DiagnosticsParser
+from dune_cache_stats import get_dune_cache_stats
+from result_cache import ResultCache, get_result_cache
+from single_flight import get_single_flight
+from waveform_blobs import EncodedBlob, decode_blob, encode_blob
+from waveform_store import get_waveform_store
+from trash_reaper import get_trash_reaper
+from workspace_cache import get_workspace_cache, inline_tests_deps, write_workspace_files
+from workspace_materializer import materialize_tree
 
 log = logging.getLogger(__name__)
 
@@ -37,6 +53,23 @@ class CompileResult:
     run_time_ms: Optional[int] = None
     tests_passed: Optional[int] = None
     tests_failed: Optional[int] = None
+    queue_wait_ms: Optional[int] = None
+    queue_depth: Optional[int] = None
+    # Ids for GET /waveforms/{id} and uncompressed sizes of the payloads
+    waveform_id: Optional[str] = None
+    waveform_vcd_id: Optional[str] = None
+    waveform_size: Optional[int] = None
+    waveform_vcd_size: Optional[int] = None
+    # Distinct compiler errors and warnings, in order (see diagnostics.py)
+    diagnostics: Optional[list[Diagnostic]] = None
+
+
+# Called with (event_name, data) as a build progresses; used by /compile/stream
+ProgressCallback = Callable[[str, dict], None]
+
+
+def _ignore_progress(event: str, data: dict) -> None:
+    """Default progress callback: drop events."""
 
 
 # Build cache directory (pre-built in Docker image for fast compilation)
@@ -90,12 +123,34 @@ def _get_n2t_template_dir() -> Path:
         _n2t_template_dir_cache = _get_template_dir() / "n2t"
     return _n2t_template_dir_cache
 
+
+def get_template_dir_for(is_n2t: bool) -> Path:
+    """Get the template directory for a project type."""
+    return _get_n2t_template_dir() if is_n2t else _get_standard_template_dir()
+
+# Per-build VCD output directory inside a build dir; hidden, so dune ignores it
+VCD_DIR_NAME = ".waveforms"
+
+# dune alias built per request mode: type-check only, also compile and
+# link, or also run the inline tests
+DUNE_TARGETS = {"check": "@check", "build": "@all", "test": "@runtest"}
+
+# Result cache mode for compile failures, keyed by the files without
+# input.txt (see _compile_inputs), so test builds of sources that failed to
+# compile before are answered without building
+COMPILE_FAILURE_MODE = "compile"
+
 # Markers for parsing output
 WAVEFORM_START = "===WAVEFORM_START==="
 WAVEFORM_END = "===WAVEFORM_END==="
 TEST_SUMMARY = "===TEST_SUMMARY==="
 
 
+def _compile_inputs(files: dict[str, str]) -> dict[str, str]:
+    """The files compiling depends on: all but input.txt, which only the tests read."""
+    return {name: content for name, content in files.items() if name != "input.txt"}
+
+
 def create_build_dir() -> Path:
     """Create an isolated build directory for this request."""
     build_id = str(uuid.uuid4())[:8]
@@ -161,34 +216,25 @@ def _copy_template_selectively(
             _create_fallback_structure(build_dir, is_n2t, files=None)
         return
 
-    # Copy dune-project
-    if (template_dir / "dune-project").exists():
-        shutil.copy2(template_dir / "dune-project", build_dir / "dune-project")
+    # Flat layout: src/ and test/ are not used; lib/n2t_chips only for N2T projects.
+    # Includes the pre-built _build/ for faster first builds (linked, not copied).
+    skip = {"src", "test"} if is_n2t else {"src", "test", "lib"}
+    stats = materialize_tree(template_dir, build_dir, skip=skip)
 
-    # For flat layout, we don't copy src/test directories - we'll create dune file directly
-    # But we still need harness_utils.ml - copy it from template if it exists
+    # For flat layout we create the dune file directly, but we still need
+    # harness_utils.ml - copy it from template if it exists
     template_harness = template_dir / "test" / "harness_utils.ml"
     if template_harness.exists():
         shutil.copy2(template_harness, build_dir / "harness_utils.ml")
 
-    # Copy lib/n2t_chips only for N2T projects
-    if is_n2t:
-        n2t_lib_src = template_dir / "lib" / "n2t_chips"
-        if n2t_lib_src.exists():
-            (build_dir / "lib").mkdir(exist_ok=True)
-            shutil.copytree(
-                n2t_lib_src, build_dir / "lib" / "n2t_chips", dirs_exist_ok=True
-            )
-
-    # Copy pre-built _build/ directory for faster first builds
-    # Try template's own _build first, then fall back to build-cache's _build
-    template_build = template_dir / "_build"
+    # Template without its own _build: fall back to build-cache's _build (has pre-compiled deps)
     build_cache_build = BUILD_CACHE_DIR / "_build"
-    if template_build.exists():
-        shutil.copytree(template_build, build_dir / "_build", dirs_exist_ok=True)
-    elif build_cache_build.exists():
-        # Use build-cache's _build as fallback - has pre-compiled deps
-        shutil.copytree(build_cache_build, build_dir / "_build", dirs_exist_ok=True)
+    if not (template_dir / "_build").exists() and build_cache_build.exists():
+        build_stats = materialize_tree(
+            build_cache_build, build_dir / "_build", rel_root=("_build",)
+        )
+        log.info(f"[compile] Materialized build-cache _build: {build_stats.summary()}")
+    log.info(f"[compile] Materialized template: {stats.summary()}")
 
 
 def _copy_build_cache_selectively(
@@ -208,15 +254,15 @@ def _copy_build_cache_selectively(
     if is_n2t:
         n2t_lib_src = cache_dir / "lib" / "n2t_chips"
         if n2t_lib_src.exists():
-            (build_dir / "lib").mkdir(exist_ok=True)
-            shutil.copytree(
-                n2t_lib_src, build_dir / "lib" / "n2t_chips", dirs_exist_ok=True
+            materialize_tree(
+                n2t_lib_src, build_dir / "lib" / "n2t_chips", rel_root=("lib", "n2t_chips")
             )
 
-    # Copy pre-built _build/ directory for faster first builds
+    # Pre-built _build/ directory for faster first builds
     cache_build = cache_dir / "_build"
     if cache_build.exists():
-        shutil.copytree(cache_build, build_dir / "_build", dirs_exist_ok=True)
+        stats = materialize_tree(cache_build, build_dir / "_build", rel_root=("_build",))
+        log.info(f"[compile] Materialized build-cache _build: {stats.summary()}")
 
 
 def _create_fallback_structure(build_dir: Path, is_n2t: bool, files: dict[str, str] | None = None) -> None:
@@ -241,9 +287,7 @@ def _create_fallback_structure(build_dir: Path, is_n2t: bool, files: dict[str, s
     circuit_modules = _get_circuit_modules(files_dict, is_n2t)
     modules_line = f" (modules {' '.join(circuit_modules)})\n" if circuit_modules else ""
     
-    # Only include input.txt dependency if it exists
-    has_input_txt = "input.txt" in files_dict
-    input_deps_line = " (deps input.txt)" if has_input_txt else ""
+    input_deps_line = inline_tests_deps(files_dict)
     
     (build_dir / "dune").write_text(f"""(library
  (name user_circuit)
@@ -312,9 +356,7 @@ def setup_project(
     circuit_modules = _get_circuit_modules(files, is_n2t)
     modules_line = f" (modules {' '.join(circuit_modules)})\n" if circuit_modules else ""
     
-    # Only include input.txt dependency if it exists
-    has_input_txt = "input.txt" in files
-    input_deps_line = " (deps input.txt)" if has_input_txt else ""
+    input_deps_line = inline_tests_deps(files)
     
     (build_dir / "dune").write_text(f"""(library
  (name user_circuit)
@@ -338,33 +380,31 @@ def setup_project(
             (build_dir / filename).write_text(content)
 
 
-def run_command(
-    cmd: list[str], cwd: Path, timeout: int, env: Optional[dict] = None
-) -> tuple[int, str, str]:
-    """
-    Run a command with timeout and capture output.
+# "TESTS: X passed, Y failed" (the line after TEST_SUMMARY)
+_SUMMARY_RE = re.compile(r"TESTS:\s*(\d+)\s*passed,\s*(\d+)\s*failed")
 
-    Returns (return_code, stdout, stderr).
-    """
-    # Set up environment with opam paths
-    run_env = os.environ.copy()
-    if env:
-        run_env.update(env)
+# Compile error kinds, most specific first (see parse_error)
+_ERROR_KIND_RE = re.compile(
+    r"Error: (Unbound|Syntax error|This expression has type)|(?i:timed out)"
+)
+_ERROR_KINDS = {
+    "Unbound": "unbound_error",
+    "Syntax error": "syntax_error",
+    "This expression has type": "type_error",
+    None: "timeout_error",
+}
+_ERROR_KIND_ORDER = ("unbound_error", "syntax_error", "type_error", "timeout_error")
 
-    # Ensure opam binaries are in PATH
-    opam_bin = "/root/.opam/5.2.0+ox/bin"
-    if opam_bin not in run_env.get("PATH", ""):
-        run_env["PATH"] = f"{opam_bin}:{run_env.get('PATH', '')}"
 
-    try:
-        result = subprocess.run(
-            cmd, cwd=cwd, capture_output=True, text=True, timeout=timeout, env=run_env
-        )
-        return result.returncode, result.stdout, result.stderr
-    except subprocess.TimeoutExpired:
-        return -1, "", f"Command timed out after {timeout} seconds"
-    except Exception as e:
-        return -1, "", str(e)
+def _add_error_kinds(text: str, kinds: set[str]) -> None:
+    """Add the compile error kinds mentioned in text to kinds."""
+    for match in _ERROR_KIND_RE.finditer(text):
+        kinds.add(_ERROR_KINDS[match.group(1)])
+
+
+def _error_type(kinds: set[str]) -> str:
+    """The most specific of the kinds seen ("compile_error" if none)."""
+    return next((k for k in _ERROR_KIND_ORDER if k in kinds), "compile_error")
 
 
 @dataclass
@@ -375,108 +415,290 @@ class ParsedOutput:
     waveform: Optional[str]
     tests_passed: Optional[int]
     tests_failed: Optional[int]
+    # First line that looks like an uncaught exception
+    exception: Optional[str] = None
+    # First complete compiler error block (stderr only)
+    compile_error: Optional[str] = None
+    # An error diagnostic, or "Error:", "File" and "line" in the output
+    has_compile_error: bool = False
+    # Most specific class of the error diagnostics, if a compile error
+    error_type: Optional[str] = None
+    # Distinct compiler diagnostics (stderr only)
+    diagnostics: list[Diagnostic] = field(default_factory=list)
+    # Their blocks as printed, separated by blank lines
+    diagnostics_text: Optional[str] = None
+    # Test lines or the waveform exceeded the parser's byte cap
+    truncated: bool = False
 
 
-def parse_output(output_text: str) -> ParsedOutput:
+class OutputParser:
     """
-    Parse output to separate test results from waveform.
+    Single-pass parser for test output, fed one line at a time.
 
-    Returns ParsedOutput with test output, waveform, and test counts.
+    Separates PASS/FAIL lines and the test summary from waveform blocks,
+    and notes exception lines and (with compile_errors) compiler
+    diagnostics, so dune's output never has to be joined or scanned again
+    after the build. Test lines and the waveform are each kept up to
+    max_bytes, followed by a truncation marker.
     """
-    waveform = None
-    test_lines = []
-    tests_passed = None
-    tests_failed = None
 
-    in_waveform = False
-    waveform_lines = []
-    in_summary = False
+    def __init__(
+        self, max_bytes: int = DEFAULT_MAX_OUTPUT_BYTES, compile_errors: bool = False
+    ):
+        self.waveform: Optional[str] = None
+        self.tests_passed: Optional[int] = None
+        self.tests_failed: Optional[int] = None
+        self.exception: Optional[str] = None
+        self.compile_error: Optional[str] = None
+        self._tests = CappedLines(max_bytes, "test output")
+        self._waveform: Optional[CappedLines] = None
+        self._max_bytes = max_bytes
+        self._waveform_dropped = 0
+        self._in_summary = False
+        self._errors = DiagnosticsParser() if compile_errors else None
+        # Substrings of has_compile_error seen so far
+        self._seen_error = self._seen_file = self._seen_line = False
+        self._error_kinds: set[str] = set()
+
+    @property
+    def test_lines(self) -> list[str]:
+        """PASS/FAIL and summary lines kept so far."""
+        return self._tests._lines
+
+    def feed(self, line: str) -> Optional[str]:
+        """
+        Consume one line of output.
+
+        Returns "compile_error" if the line completed the first compiler
+        error block, "test" if it was a PASS/FAIL line, "summary" if it
+        completed the test summary, otherwise None.
+        """
+        kind = None
+        if self._errors is not None:
+            kind = self._scan_errors(line)
+        if self.exception is None and (
+            "Failure" in line or "Exception:" in line or "failwith" in line.lower()
+        ):
+            self.exception = line.strip()
 
-    for line in output_text.split("\n"):
         # Strip diff prefixes (+, -, |) that dune adds
         clean_line = line
-        if line.startswith("+    ") or line.startswith("-    "):
-            clean_line = line[5:]
-        elif line.startswith("|    "):
-            clean_line = line[5:]
-        elif line.startswith("+") and not line.startswith("++"):
-            clean_line = line[1:]
-
-        if WAVEFORM_START in clean_line:
-            in_waveform = True
-            continue
-        elif WAVEFORM_END in clean_line:
-            in_waveform = False
-            waveform = "\n".join(waveform_lines)
-            continue
-        elif TEST_SUMMARY in clean_line:
-            in_summary = True
-            continue
-
-        if in_waveform:
-            waveform_lines.append(clean_line)
-        elif in_summary:
-            # Parse "TESTS: X passed, Y failed"
-            match = re.search(r"TESTS:\s*(\d+)\s*passed,\s*(\d+)\s*failed", clean_line)
+        if line[:1] in ("+", "-", "|"):
+            if line.startswith(("+    ", "-    ", "|    ")):
+                clean_line = line[5:]
+            elif line[0] == "+" and not line.startswith("++"):
+                clean_line = line[1:]
+
+        # All markers start with "===", so most lines are ruled out at once
+        if "===" in clean_line:
+            if WAVEFORM_START in clean_line:
+                self._waveform = CappedLines(self._max_bytes, "waveform")
+                return kind
+            elif WAVEFORM_END in clean_line:
+                if self._waveform is not None:
+                    self.waveform = self._waveform.text()
+                    self._waveform_dropped += self._waveform.dropped
+                    self._waveform = None
+                return kind
+            elif TEST_SUMMARY in clean_line:
+                self._in_summary = True
+                return kind
+
+        if self._waveform is not None:
+            self._waveform.append(clean_line)
+        elif self._in_summary:
+            match = _SUMMARY_RE.search(clean_line)
+            self._in_summary = False
             if match:
-                tests_passed = int(match.group(1))
-                tests_failed = int(match.group(2))
-                test_lines.append(clean_line)
-            in_summary = False
-        else:
-            # Capture PASS/FAIL lines
-            if clean_line.startswith("PASS:") or clean_line.startswith("FAIL:"):
-                test_lines.append(clean_line)
+                self.tests_passed = int(match.group(1))
+                self.tests_failed = int(match.group(2))
+                self._tests.append(clean_line)
+                return kind or "summary"
+        elif clean_line.startswith(("PASS:", "FAIL:")):
+            self._tests.append(clean_line)
+            return kind or "test"
+        return kind
+
+    def _scan_errors(self, line: str) -> Optional[str]:
+        """Track compile errors in a stderr line."""
+        if not self._seen_error and "Error:" in line:
+            self._seen_error = True
+        if not self._seen_file and "File" in line:
+            self._seen_file = True
+        if not self._seen_line and "line" in line:
+            self._seen_line = True
+        if len(self._error_kinds) < len(_ERROR_KINDS):
+            _add_error_kinds(line, self._error_kinds)
+        return self._note_diagnostic(self._errors.feed(line))
+
+    def _note_diagnostic(self, diagnostic: Optional[Diagnostic]) -> Optional[str]:
+        """Keep the block of the first error diagnostic as compile_error."""
+        if (
+            diagnostic is not None
+            and diagnostic.severity == "error"
+            and self.compile_error is None
+        ):
+            self.compile_error = self._errors.blocks[-1]
+            return "compile_error"
+        return None
 
+    def finish(self) -> Optional[str]:
+        """
+        End of output: complete a compiler diagnostic still open.
+
+        Returns the first error block if it completed only now.
+        """
+        if self._errors is None:
+            return None
+        if self._note_diagnostic(self._errors.finish()):
+            return self.compile_error
+        return None
+
+    def result(self) -> ParsedOutput:
+        """Return everything parsed so far."""
+        diagnostics = list(self._errors.diagnostics) if self._errors else []
+        error_classes = {d.error_class for d in diagnostics if d.severity == "error"}
+        has_compile_error = bool(error_classes) or (
+            self._seen_error and self._seen_file and self._seen_line
+        )
+        error_type = None
+        if has_compile_error:
+            # Kinds from "Error: ..." lines also cover a block still open
+            # and errors without a location
+            error_type = _error_type(error_classes | self._error_kinds)
+        return ParsedOutput(
+            test_output=self._tests.text().strip(),
+            waveform=self.waveform,
+            tests_passed=self.tests_passed,
+            tests_failed=self.tests_failed,
+            exception=self.exception,
+            compile_error=self.compile_error,
+            has_compile_error=has_compile_error,
+            error_type=error_type,
+            truncated=bool(self._tests.dropped or self._waveform_dropped),
+            diagnostics=diagnostics,
+            diagnostics_text=self._errors.text() if diagnostics else None,
+        )
+
+
+def parse_output(output_text: str) -> ParsedOutput:
+    """
+    Parse output to separate test results from waveform.
+
+    Returns ParsedOutput with test output, waveform, and test counts.
+    """
+    parser = OutputParser()
+    for line in output_text.split("\n"):
+        parser.feed(line)
+    return parser.result()
+
+
+def _merge_parsed(stdout: ParsedOutput, stderr: ParsedOutput) -> ParsedOutput:
+    """
+    Combine output parsed from stdout and stderr.
+
+    stderr wins on conflicts, except for the exception line, which is the
+    first in stdout-then-stderr order.
+    """
+
+    def pick(name: str):
+        value = getattr(stderr, name)
+        return value if value is not None else getattr(stdout, name)
+
+    test_output = "\n".join(t for t in (stdout.test_output, stderr.test_output) if t)
     return ParsedOutput(
-        test_output="\n".join(test_lines).strip(),
-        waveform=waveform,
-        tests_passed=tests_passed,
-        tests_failed=tests_failed,
+        test_output=test_output,
+        waveform=pick("waveform"),
+        tests_passed=pick("tests_passed"),
+        tests_failed=pick("tests_failed"),
+        exception=stdout.exception if stdout.exception is not None else stderr.exception,
+        compile_error=pick("compile_error"),
+        has_compile_error=stdout.has_compile_error or stderr.has_compile_error,
+        error_type=pick("error_type"),
+        truncated=stdout.truncated or stderr.truncated,
+        diagnostics=stderr.diagnostics or stdout.diagnostics,
+        diagnostics_text=pick("diagnostics_text"),
     )
 
 
-def read_vcd_file(build_dir: Optional[Path] = None) -> Optional[str]:
+def new_vcd_path(build_dir: Path) -> Path:
     """
-    Read the VCD file generated by the test.
-    Returns the VCD content as a string, or None if not found.
+    Path for this build's VCD, in a fresh per-build directory.
+
+    VCDs left by earlier builds in the same workspace are removed first, so
+    a build whose test writes no VCD can't return a stale one. The file
+    name is new for every build, which makes dune rerun the tests (see
+    workspace_cache.inline_tests_deps).
     """
-    # Try per-build path first (from env var)
-    vcd_path = os.getenv("HARDCAML_VCD_PATH")
-    if vcd_path:
-        try:
-            path = Path(vcd_path)
-            if path.exists():
-                return path.read_text()
-        except Exception:
-            pass
+    vcd_dir = build_dir / VCD_DIR_NAME
+    shutil.rmtree(vcd_dir, ignore_errors=True)
+    vcd_dir.mkdir(parents=True)
+    return vcd_dir / f"{uuid.uuid4().hex}.vcd"
+
+
+def store_vcd_file(vcd_path: Path) -> Optional[EncodedBlob]:
+    """
+    Move the VCD file written by this build's test into the waveform store.
+
+    The file is compressed as it is read, so the VCD text is never held in
+    memory; it is only decompressed for requests that inline it.
+
+    Args:
+        vcd_path: The build's HARDCAML_VCD_PATH, from new_vcd_path()
+
+    Returns:
+        The stored VCD, or None if the test wrote none.
 
-    # Fallback to legacy global path (for backwards compatibility)
-    legacy_path = Path("/tmp/waveform.vcd")
+    Raises:
+        OSError: If the waveform store can't be written.
+    """
     try:
-        if legacy_path.exists():
-            return legacy_path.read_text()
-    except Exception:
-        pass
-    return None
+        return get_waveform_store().put_file(vcd_path)
+    except FileNotFoundError:
+        return None
+    finally:
+        # Don't keep it in the (cached) workspace
+        vcd_path.unlink(missing_ok=True)
+
+
+def load_vcd_text(vcd_id: str) -> Optional[str]:
+    """
+    Decompress a stored VCD, from the waveform store or the result cache.
+
+    Blocking; run it off the event loop.
+
+    Returns:
+        The VCD text, or None if neither has it any more.
+    """
+    path = get_waveform_store().path(vcd_id)
+    if path is not None:
+        try:
+            return decode_blob(path.read_bytes())
+        except FileNotFoundError:
+            # Evicted since the check
+            pass
+    blob = get_result_cache().get_blob(vcd_id)
+    return decode_blob(blob.data) if blob is not None else None
 
 
 def parse_error(stderr: str) -> tuple[str, str]:
     """
     Parse error message to determine error type.
 
-    Returns (error_type, cleaned_message).
+    Returns (error_type, cleaned_message): the most specific class of the
+    error diagnostics and their deduplicated blocks, or if none were
+    recognized, the kind mentioned in stderr and stderr itself.
     """
-    if "Error: Unbound" in stderr:
-        return "unbound_error", stderr
-    elif "Error: Syntax error" in stderr:
-        return "syntax_error", stderr
-    elif "Error: This expression has type" in stderr:
-        return "type_error", stderr
-    elif "timed out" in stderr.lower():
-        return "timeout_error", stderr
-    else:
-        return "compile_error", stderr
+    parser = DiagnosticsParser()
+    for line in stderr.split("\n"):
+        parser.feed(line)
+    parser.finish()
+    classes = {d.error_class for d in parser.diagnostics if d.severity == "error"}
+    if classes:
+        return _error_type(classes), parser.text()
+    kinds: set[str] = set()
+    _add_error_kinds(stderr, kinds)
+    return _error_type(kinds), stderr
 
 
 def compile_and_run(
@@ -485,14 +707,45 @@ def compile_and_run(
     include_vcd: bool = True,
     session_id: Optional[str] = None,
     project_type: Optional[str] = None,
+    inline_vcd: bool = True,
+    mode: str = "test",
+) -> CompileResult:
+    """
+    Compile and run Hardcaml code (blocking wrapper for scripts and the CLI runner).
+
+    See compile_and_run_async for details.
+    """
+    return asyncio.run(
+        compile_and_run_async(
+            files=files,
+            timeout_seconds=timeout_seconds,
+            include_vcd=include_vcd,
+            session_id=session_id,
+            project_type=project_type,
+            inline_vcd=inline_vcd,
+            mode=mode,
+        )
+    )
+
+
+async def compile_and_run_async(
+    files: dict[str, str],
+    timeout_seconds: int = 30,
+    include_vcd: bool = True,
+    session_id: Optional[str] = None,
+    project_type: Optional[str] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    inline_vcd: bool = True,
+    mode: str = "test",
 ) -> CompileResult:
     """
     Compile and run Hardcaml code.
 
-    1. Get or create build directory (cached if session_id provided)
-    2. Set up project with user files
-    3. Run dune build @runtest
-    4. Parse and return results
+    1. Return a cached result if these exact files were built before
+    2. Join an identical build already in flight, if any (see single_flight)
+    3. Otherwise wait for a build worker slot (raises BuildQueueFullError if
+       the queue is full)
+    4. Build and test on that slot (see _build_and_run)
 
     Args:
         files: Map of filename to content
@@ -500,80 +753,187 @@ def compile_and_run(
         include_vcd: Whether to generate VCD output
         session_id: Optional browser session ID for workspace caching
         project_type: Optional project type ("standard" or "n2t"). If None, inferred from files.
+        on_progress: Optional callback receiving (event, data) as the build
+            progresses: queued, started, workspace_ready, dune_started,
+            compile_error (first one only), compiled, test, summary.
+            Requests that join an in-flight build get coalesced, then that
+            build's later events.
+        inline_vcd: Return the VCD text in waveform_vcd. If False, only its
+            id and size are set and clients fetch it from GET /waveforms/{id}.
+        mode: "test" builds and runs the tests; "check" only type-checks and
+            "build" compiles and links without running anything (see
+            DUNE_TARGETS). Those two return diagnostics but no test output
+            or waveforms, and are cached separately from "test". Test builds
+            compile first and time the phases in compile_time_ms and
+            run_time_ms.
     """
-    build_dir = None
-    use_temp_dir = session_id is None
-    cache_hit = False
-    total_start = time.time()
+    progress = on_progress or _ignore_progress
+    if mode not in DUNE_TARGETS:
+        raise ValueError(f"Unknown build mode: {mode}")
+    # Nothing runs, so there is no VCD to produce
+    if mode != "test":
+        include_vcd = False
+
+    # Only the tests read input.txt
+    compile_files = _compile_inputs(files)
+    cache_files = files if mode == "test" else compile_files
+
+    # Check result cache first (before any work)
+    result_cache = get_result_cache()
+    # May hit the on-disk store, so keep it off the event loop
+    cached_result = await asyncio.to_thread(
+        result_cache.get, cache_files, include_vcd, inline_vcd, mode
+    )
+    if cached_result is None and mode == "test":
+        # These sources failed to compile before, whatever input.txt was
+        cached_result = await asyncio.to_thread(
+            result_cache.get, compile_files, False, inline_vcd, COMPILE_FAILURE_MODE
+        )
+    if cached_result:
+        progress("cache_hit", {})
+        log.info(
+            f"[compile] Result cache hit: session={session_id[:8] if session_id else 'none'}"
+        )
+        # Cached, so no compile or run time
+        cached_result.compile_time_ms = 0
+        if cached_result.run_time_ms is not None:
+            cached_result.run_time_ms = 0
+        return cached_result
+
+    async def build(progress: ProgressCallback) -> CompileResult:
+        def on_admit(ticket: BuildTicket) -> None:
+            progress("queued", {"queue_depth": ticket.queue_depth})
+
+        async with get_build_executor().slot(on_admit=on_admit) as ticket:
+            progress("started", {"queue_wait_ms": ticket.wait_ms})
+            result, vcd = await _build_and_run(
+                files=files,
+                timeout_seconds=timeout_seconds,
+                include_vcd=include_vcd,
+                session_id=session_id,
+                project_type=project_type,
+                progress=progress,
+                mode=mode,
+            )
+        # Fill the cache before the flight ends, so identical requests
+        # arriving later hit it rather than starting another build
+        waveform, vcd = await asyncio.to_thread(
+            _store_result, result_cache, cache_files, result, include_vcd, mode, vcd
+        )
+        if mode != "check" and result.stage == "compile" and not result.success:
+            await asyncio.to_thread(
+                result_cache.put, compile_files, result, False, COMPILE_FAILURE_MODE
+            )
+
+        return dataclasses.replace(
+            result,
+            queue_wait_ms=ticket.wait_ms,
+            queue_depth=ticket.queue_depth,
+            waveform_id=waveform.id if waveform else None,
+            waveform_vcd_id=vcd.id if vcd else None,
+            waveform_size=waveform.size if waveform else None,
+            waveform_vcd_size=vcd.size if vcd else None,
+        )
 
+    # Identical requests already building share that build. A build with VCD
+    # output also answers requests without it. The key includes the mode.
+    cache_key = result_cache.key(cache_files, mode)
+    flight_key = (cache_key, project_type, include_vcd)
+    join_keys = [flight_key]
+    if not include_vcd:
+        join_keys.append((cache_key, project_type, True))
     try:
-        # Check result cache first (before any work)
-        result_cache = get_result_cache()
-        # Include include_vcd in cache key since it affects the result
-        cache_key_files = {**files, "__include_vcd__": str(include_vcd)}
-        cached_result = result_cache.get(cache_key_files)
-        if cached_result:
-            # Return cached result, but adjust VCD if needed
-            if not include_vcd and cached_result.waveform_vcd:
-                # Create a copy without VCD if it wasn't requested
-                cached_result = CompileResult(
-                    success=cached_result.success,
-                    output=cached_result.output,
-                    waveform=cached_result.waveform,
-                    waveform_vcd=None,  # Don't include VCD if not requested
-                    error_type=cached_result.error_type,
-                    error_message=cached_result.error_message,
-                    stage=cached_result.stage,
-                    compile_time_ms=0,  # Cached, so no compile time
-                    run_time_ms=cached_result.run_time_ms,
-                    tests_passed=cached_result.tests_passed,
-                    tests_failed=cached_result.tests_failed,
-                )
-            else:
-                # Use cached result as-is, but mark compile_time_ms as 0 for cache hit
-                cached_result = CompileResult(
-                    success=cached_result.success,
-                    output=cached_result.output,
-                    waveform=cached_result.waveform,
-                    waveform_vcd=cached_result.waveform_vcd if include_vcd else None,
-                    error_type=cached_result.error_type,
-                    error_message=cached_result.error_message,
-                    stage=cached_result.stage,
-                    compile_time_ms=0,  # Cached, so no compile time
-                    run_time_ms=cached_result.run_time_ms,
-                    tests_passed=cached_result.tests_passed,
-                    tests_failed=cached_result.tests_failed,
-                )
-            log.info(
-                f"[compile] Result cache hit: session={session_id[:8] if session_id else 'none'}"
-            )
-            return cached_result
+        result = await get_single_flight().run(
+            key=flight_key,
+            start=build,
+            join_keys=join_keys,
+            progress=progress,
+            timeout=timeout_seconds,
+        )
+    except asyncio.TimeoutError:
+        # Joined a build that allows itself longer than this request does
+        return CompileResult(
+            success=False,
+            error_type="timeout_error",
+            error_message=f"Build timed out after {timeout_seconds} seconds",
+            stage="compile",
+        )
 
-        # Determine project type
-        if project_type is None:
-            is_n2t = _is_n2t_project(files)
-        else:
-            is_n2t = project_type == "n2t"
-        project_type = "n2t" if is_n2t else "standard"
-        file_names = list(files.keys())
-        log.info(
-            f"[compile] Starting: session={session_id[:8] if session_id else 'none'}, type={project_type}, files={file_names}"
+    # Waiters share the build's result; give each its own copy
+    if not include_vcd:
+        return dataclasses.replace(
+            result, waveform_vcd=None, waveform_vcd_id=None, waveform_vcd_size=None
         )
+    if not inline_vcd or result.waveform_vcd_id is None:
+        return dataclasses.replace(result)
+    # Builds leave the VCD compressed in the waveform store; only requests
+    # that inline it pay for decompressing it
+    vcd_text = await asyncio.to_thread(load_vcd_text, result.waveform_vcd_id)
+    return dataclasses.replace(result, waveform_vcd=vcd_text)
 
-        # Get or create build directory
-        t0 = time.time()
-        if session_id:
-            # Use session-based cached workspace
-            template_dir = _get_n2t_template_dir() if is_n2t else _get_standard_template_dir()
-            log.info(f"[compile] Using template: {template_dir}")
 
-            cache = get_workspace_cache()
-            build_dir, cache_hit = cache.get_or_create(session_id, is_n2t, template_dir)
-            log.info(
-                f"[timing] get_workspace (cache_hit={cache_hit}): "
-                f"{int((time.time() - t0) * 1000)}ms"
-            )
+def _store_result(
+    result_cache: ResultCache,
+    files: dict[str, str],
+    result: CompileResult,
+    include_vcd: bool,
+    mode: str = "test",
+    vcd: Optional[EncodedBlob] = None,
+) -> tuple[Optional[EncodedBlob], Optional[EncodedBlob]]:
+    """
+    Cache a build's result and write its waveform to the waveform store.
+
+    The waveform is written even when the result itself isn't cacheable, so
+    its id in the response always resolves. The VCD is already in the store
+    (see store_vcd_file).
+
+    Args:
+        vcd: The build's VCD, from store_vcd_file
+
+    Returns:
+        Tuple of (waveform, vcd) EncodedBlobs, None where absent.
+    """
+    waveform, _ = result_cache.put(files, result, include_vcd, mode, vcd=vcd)
+    if waveform is None and result.waveform is not None:
+        waveform = encode_blob(result.waveform)
+    if waveform is not None:
+        try:
+            get_waveform_store().put(waveform)
+        except OSError as e:
+            log.warning(f"[compile] Failed to store waveform {waveform.id[:8]}...: {e}")
+    return waveform, vcd if include_vcd else None
+
+
+def _prepare_build_dir(
+    files: dict[str, str], session_id: Optional[str], is_n2t: bool
+) -> tuple[Path, bool, Optional[threading.Lock]]:
+    """
+    Get a build directory with the user's files in place.
+
+    Blocking (copies templates, writes files, waits for the session's
+    workspace lock); run it off the event loop.
+
+    Returns:
+        Tuple of (build_dir, workspace_cache_hit, slot_lock). For session
+        workspaces slot_lock is held and must be released after the build.
+    """
+    project_type = "n2t" if is_n2t else "standard"
+    t0 = time.time()
+    if session_id:
+        # Use session-based cached workspace
+        template_dir = get_template_dir_for(is_n2t)
+        log.info(f"[compile] Using template: {template_dir}")
+
+        cache = get_workspace_cache()
+        # Serializes builds within the session; other sessions are unaffected
+        slot, cache_hit = cache.checkout(session_id, is_n2t, template_dir)
+        build_dir = slot.path
+        log.info(
+            f"[timing] get_workspace (cache_hit={cache_hit}): "
+            f"{int((time.time() - t0) * 1000)}ms"
+        )
 
+        try:
             # Check workspace state
             ws_build_dir = build_dir / "_build"
             ws_src_files = (
@@ -588,98 +948,351 @@ def compile_and_run(
 
             # Update user files in the workspace
             t0 = time.time()
-            cache.update_workspace(session_id, files)
+            write_workspace_files(build_dir, files)
             log.info(f"[timing] update_workspace: {int((time.time() - t0) * 1000)}ms")
-        else:
-            # Legacy: use temp directory (no caching)
-            build_dir = create_build_dir()
-            log.info(f"[timing] create_build_dir: {int((time.time() - t0) * 1000)}ms")
+        except BaseException:
+            slot.lock.release()
+            raise
+        return build_dir, cache_hit, slot.lock
+
+    # Legacy: use temp directory (no caching)
+    build_dir = create_build_dir()
+    log.info(f"[timing] create_build_dir: {int((time.time() - t0) * 1000)}ms")
+
+    # Set up project (copy template + write user files)
+    t0 = time.time()
+    setup_project(build_dir, files, project_type=project_type)
+    log.info(f"[timing] setup_project: {int((time.time() - t0) * 1000)}ms")
+    return build_dir, False, None
+
+
+async def _prepare_build_dir_async(
+    files: dict[str, str], session_id: Optional[str], is_n2t: bool
+) -> tuple[Path, bool, Optional[threading.Lock]]:
+    """
+    Run _prepare_build_dir in a thread.
+
+    If the caller is cancelled while the thread is still running (e.g. a
+    streaming client disconnected while waiting for its session lock), the
+    lock the thread eventually acquires is released rather than leaked.
+    """
+    prepare = asyncio.ensure_future(
+        asyncio.to_thread(_prepare_build_dir, files, session_id, is_n2t)
+    )
+    try:
+        return await asyncio.shield(prepare)
+    except asyncio.CancelledError:
+
+        def release(fut: asyncio.Future) -> None:
+            if not fut.cancelled() and fut.exception() is None:
+                _, _, slot_lock = fut.result()
+                if slot_lock is not None:
+                    slot_lock.release()
+
+        prepare.add_done_callback(release)
+        raise
+
+
+def _dune_env() -> dict[str, Optional[str]]:
+    """
+    Environment for dune builds: enables the shared dune cache.
 
-            # Set up project (copy template + write user files)
+    HARDCAML_VCD_PATH is never inherited from the API process; builds that
+    want VCD output set it to their own path (new_vcd_path).
+    """
+    return {
+        "DUNE_CACHE": "enabled",
+        "DUNE_CACHE_ROOT": DUNE_CACHE_ROOT,
+        "HARDCAML_VCD_PATH": None,
+    }
+
+
+def warm_workspace(workspace_path: Path, is_n2t: bool) -> None:
+    """
+    Build a pooled workspace once so a new session's first compile is incremental.
+
+    The build takes a build worker slot like any other, so refills never
+    add to the load the executor bounds. Build failures are logged, not
+    raised: the workspace is still a valid (cold) materialized template.
+
+    Raises:
+        BuildQueueFullError: If the build queue is full (the pool retries
+            on its next refill).
+    """
+    project_type = "n2t" if is_n2t else "standard"
+
+    async def build() -> tuple[CommandResult, int]:
+        async with get_build_executor().slot():
             t0 = time.time()
-            setup_project(build_dir, files, project_type=project_type)
-            log.info(f"[timing] setup_project: {int((time.time() - t0) * 1000)}ms")
+            command = await run_command_async(
+                ["dune", "build", "@runtest"],
+                cwd=workspace_path,
+                timeout=COMPILE_TIMEOUT_SECONDS,
+                env=_dune_env(),
+                max_output_bytes=COMPILE_OUTPUT_LIMIT_BYTES,
+            )
+            return command, int((time.time() - t0) * 1000)
 
-        # Set up VCD path if requested
-        vcd_path = None
-        dune_env = {}
-        if include_vcd:
-            vcd_path = build_dir / "waveform.vcd"
-            dune_env["HARDCAML_VCD_PATH"] = str(vcd_path)
+    command, elapsed_ms = asyncio.run(build())
+    if command.returncode != 0:
+        log.warning(
+            f"[pool] Warm-up build failed ({project_type}, {elapsed_ms}ms): "
+            f"{command.stderr[:500]}"
+        )
+    else:
+        log.info(f"[timing] warm_workspace ({project_type}): {elapsed_ms}ms")
 
-        # Enable dune shared cache for faster builds
-        dune_cache_root = os.getenv("DUNE_CACHE_ROOT", "/tmp/dune-cache")
-        dune_env["DUNE_CACHE"] = "enabled"
-        dune_env["DUNE_CACHE_ROOT"] = dune_cache_root
-
-        # Check dune cache state
-        dune_cache_path = Path(dune_cache_root)
-        cache_exists = dune_cache_path.exists()
-        cache_size = (
-            sum(f.stat().st_size for f in dune_cache_path.rglob("*") if f.is_file())
-            if cache_exists
-            else 0
+
+def _remove_build_dir(build_dir: Path) -> None:
+    """Best-effort removal of a temporary build directory (deleted in the background)."""
+    t0 = time.time()
+    try:
+        get_trash_reaper().discard(build_dir)
+    except Exception:
+        pass  # Best effort cleanup
+    log.info(f"[timing] cleanup: {int((time.time() - t0) * 1000)}ms")
+
+
+@dataclass
+class _DuneRun:
+    """One dune invocation of a build."""
+
+    command: CommandResult
+    parsed: ParsedOutput
+    elapsed_ms: int
+
+    @property
+    def succeeded(self) -> bool:
+        """Exited cleanly, without compile errors."""
+        return (
+            self.command.returncode == 0
+            and not self.command.timed_out
+            and not self.parsed.has_compile_error
         )
+
+
+async def _run_dune(
+    target: str,
+    build_dir: Path,
+    timeout_seconds: int,
+    env: dict[str, Optional[str]],
+    progress: ProgressCallback,
+) -> _DuneRun:
+    """
+    Run `dune build <target>`, parsing its output as it streams in.
+
+    stdout and stderr are parsed separately as lines arrive and never
+    rescanned afterwards. test, summary and compile_error progress events
+    are sent as they are seen.
+    """
+    parsers = {
+        "stdout": OutputParser(COMPILE_OUTPUT_LIMIT_BYTES),
+        "stderr": OutputParser(COMPILE_OUTPUT_LIMIT_BYTES, compile_errors=True),
+    }
+
+    def on_line(line: str, stream: str) -> None:
+        parser = parsers[stream]
+        kind = parser.feed(line)
+        if kind == "test":
+            progress("test", {"line": parser.test_lines[-1]})
+        elif kind == "summary":
+            progress(
+                "summary",
+                {"passed": parser.tests_passed, "failed": parser.tests_failed},
+            )
+        elif kind == "compile_error":
+            progress("compile_error", {"message": parser.compile_error})
+
+    # Note: No --force flag to allow dune's incremental build cache
+    # Note: No --auto-promote - we don't want to rewrite test files
+    log.info(f"[compile] Running: dune build {target} (cwd={build_dir})")
+    t0 = time.time()
+    command = await run_command_async(
+        ["dune", "build", target],
+        cwd=build_dir,
+        timeout=timeout_seconds,
+        env=env,
+        on_line=on_line,
+        max_output_bytes=COMPILE_OUTPUT_LIMIT_BYTES,
+    )
+    error = parsers["stderr"].finish()
+    if error:
+        progress("compile_error", {"message": error})
+    elapsed_ms = int((time.time() - t0) * 1000)
+    log.info(
+        f"[timing] dune build {target}: {elapsed_ms}ms (exit={command.returncode})"
+    )
+
+    # Log if there were any errors
+    if command.returncode != 0 and command.stderr:
+        # Just first 500 chars of error for debugging
+        log.info(f"[compile] dune stderr (first 500 chars): {command.stderr[:500]}")
+
+    parsed = _merge_parsed(parsers["stdout"].result(), parsers["stderr"].result())
+    return _DuneRun(command, parsed, elapsed_ms)
+
+
+async def _build_and_run(
+    files: dict[str, str],
+    timeout_seconds: int,
+    include_vcd: bool,
+    session_id: Optional[str],
+    project_type: Optional[str],
+    progress: ProgressCallback = _ignore_progress,
+    mode: str = "test",
+) -> tuple[CompileResult, Optional[EncodedBlob]]:
+    """
+    Build and test the user's files on a build worker slot.
+
+    1. Get or create build directory (cached if session_id provided)
+    2. Set up project with user files
+    3. Compile: dune build @all (@check in check mode), parsing output as
+       it streams in
+    4. In test mode, if that compiled, run the tests: dune build @runtest,
+       which only links the test runner and runs it
+    5. Classify and return results, with each phase's time
+
+    Returns:
+        Tuple of (result, vcd): the VCD the tests wrote, already in the
+        waveform store (see store_vcd_file), or None.
+    """
+    build_dir = None
+    slot_lock = None
+    use_temp_dir = session_id is None
+    cache_hit = False
+    total_start = time.time()
+
+    try:
+        # Determine project type
+        if project_type is None:
+            is_n2t = _is_n2t_project(files)
+        else:
+            is_n2t = project_type == "n2t"
+        project_type = "n2t" if is_n2t else "standard"
+        file_names = list(files.keys())
         log.info(
-            f"[compile] Dune cache: path={dune_cache_root}, exists={cache_exists}, size={cache_size // 1024}KB"
+            f"[compile] Starting: session={session_id[:8] if session_id else 'none'}, type={project_type}, files={file_names}"
         )
 
-        # Build and run tests
-        # Note: No --force flag to allow dune's incremental build cache
-        # Note: No --auto-promote - we don't want to rewrite test files
-        log.info(f"[compile] Running: dune build @runtest (cwd={build_dir})")
+        # Get or create build directory
         t0 = time.time()
-        returncode, stdout, stderr = run_command(
-            ["dune", "build", "@runtest"],
-            cwd=build_dir,
-            timeout=timeout_seconds,
-            env=dune_env,
+        build_dir, cache_hit, slot_lock = await _prepare_build_dir_async(
+            files, session_id, is_n2t
+        )
+        progress(
+            "workspace_ready",
+            {"cache_hit": cache_hit, "setup_ms": int((time.time() - t0) * 1000)},
         )
-        dune_time = int((time.time() - t0) * 1000)
-        log.info(f"[timing] dune build @runtest: {dune_time}ms (exit={returncode})")
 
-        # Log if there were any errors
-        if returncode != 0 and stderr:
-            # Just first 500 chars of error for debugging
-            log.info(f"[compile] dune stderr (first 500 chars): {stderr[:500]}")
+        # Set up VCD path if requested
+        vcd_path = None
+        # Enable dune shared cache for faster builds
+        dune_env = _dune_env()
+        if include_vcd:
+            vcd_path = await asyncio.to_thread(new_vcd_path, build_dir)
+            dune_env["HARDCAML_VCD_PATH"] = str(vcd_path)
 
-        # Parse output
-        t0 = time.time()
-        combined_output = stdout + "\n" + stderr
-        parsed = parse_output(combined_output)
-        log.info(f"[timing] parse_output: {int((time.time() - t0) * 1000)}ms")
+        # Dune cache state from the last background scan (never walked here)
+        dune_cache = get_dune_cache_stats().snapshot()
+        if dune_cache:
+            log.info(
+                f"[compile] Dune cache: path={DUNE_CACHE_ROOT}, exists={dune_cache.exists}, "
+                f"size={dune_cache.size_bytes // 1024}KB (scanned {int(time.time() - dune_cache.scanned_at)}s ago)"
+            )
 
-        # Read VCD file if it was generated
-        vcd = None
-        if include_vcd:
-            vcd = read_vcd_file(build_dir)
-            if vcd:
-                log.info(f"[timing] read VCD file: {len(vcd)} bytes")
+        # Compile first, then run the tests, timing each phase; check and
+        # build stop after compiling (see DUNE_TARGETS)
+        deadline = time.monotonic() + timeout_seconds
+        progress("dune_started", {})
+        compile_target = DUNE_TARGETS["build" if mode == "test" else mode]
+        compiled = await _run_dune(
+            compile_target, build_dir, timeout_seconds, dune_env, progress
+        )
+        compile_time = compiled.elapsed_ms
+        ran = None
+        if mode == "test" and compiled.succeeded:
+            progress("compiled", {"compile_time_ms": compile_time})
+            remaining = max(1, int(deadline - time.monotonic()))
+            ran = await _run_dune(
+                DUNE_TARGETS["test"], build_dir, remaining, dune_env, progress
+            )
+        run_time = ran.elapsed_ms if ran else None
+
+        last = ran or compiled
+        command, parsed = last.command, last.parsed
+        returncode, stdout, stderr = command.returncode, command.stdout, command.stderr
 
         total_time = int((time.time() - total_start) * 1000)
         log.info(
             f"[timing] total (before cleanup): {total_time}ms | "
             f"session={session_id[:8] if session_id else 'none'}, "
-            f"cache_hit={cache_hit}, dune={dune_time}ms"
+            f"cache_hit={cache_hit}, compile={compile_time}ms, run={run_time}ms"
         )
 
-        # Check for compile errors (as opposed to test failures)
-        has_compile_error = "Error:" in stderr and "File" in stderr and "line" in stderr
+        if command.timed_out:
+            return CompileResult(
+                success=False,
+                output=parsed.test_output if parsed.test_output else None,
+                waveform=parsed.waveform,
+                error_type="timeout_error",
+                error_message=f"Build timed out after {timeout_seconds} seconds",
+                stage="compile" if ran is None else "test",
+                compile_time_ms=compile_time,
+                run_time_ms=run_time,
+                tests_passed=parsed.tests_passed,
+                tests_failed=parsed.tests_failed,
+            ), None
 
-        if has_compile_error:
-            error_type, error_message = parse_error(stderr)
+        # Move the VCD file, if one was written, into the waveform store
+        vcd = None
+        if vcd_path is not None and ran is not None:
+            try:
+                vcd = await asyncio.to_thread(store_vcd_file, vcd_path)
+            except OSError as e:
+                log.warning(f"[compile] Failed to store VCD: {e}")
+            if vcd:
+                log.info(
+                    f"[timing] stored VCD file: {vcd.size} bytes ({len(vcd.data)} compressed)"
+                )
+
+        # Warnings can accompany any outcome
+        diagnostics = compiled.parsed.diagnostics + (ran.parsed.diagnostics if ran else [])
+        diagnostics = diagnostics or None
+
+        # Compile errors (as opposed to test failures), noted while parsing
+        if parsed.has_compile_error:
             return CompileResult(
                 success=False,
                 output=parsed.test_output if parsed.test_output else None,
                 waveform=parsed.waveform,
-                waveform_vcd=vcd,
-                error_type=error_type,
-                error_message=error_message,
+                error_type=parsed.error_type,
+                # Each distinct diagnostic once, rather than all of stderr
+                error_message=parsed.diagnostics_text or stderr,
                 stage="compile",
-                compile_time_ms=dune_time,
+                compile_time_ms=compile_time,
+                run_time_ms=run_time,
                 tests_passed=parsed.tests_passed,
                 tests_failed=parsed.tests_failed,
-            )
+                diagnostics=diagnostics,
+            ), vcd
+
+        # Only compiled (check/build, or the compile failed without
+        # recognizable errors): the exit status is the answer
+        if ran is None:
+            if returncode != 0:
+                # No compiler errors: dune missing, a killed compiler, ... -
+                # not a property of the files, so never cached
+                return CompileResult(
+                    success=False,
+                    error_type="internal_error",
+                    error_message=stderr or f"dune exited with status {returncode}",
+                    stage="compile",
+                    compile_time_ms=compile_time,
+                    diagnostics=diagnostics,
+                ), None
+            return CompileResult(
+                success=True, compile_time_ms=compile_time, diagnostics=diagnostics
+            ), None
 
         # Tests ran - report success based on test results
         if parsed.tests_failed is not None and parsed.tests_failed > 0:
@@ -687,54 +1300,43 @@ def compile_and_run(
                 success=False,
                 output=parsed.test_output,
                 waveform=parsed.waveform,
-                waveform_vcd=vcd,
                 error_type="test_failure",
                 error_message=f"{parsed.tests_failed} test(s) failed",
                 stage="test",
-                compile_time_ms=dune_time,
+                compile_time_ms=compile_time,
+                run_time_ms=run_time,
                 tests_passed=parsed.tests_passed,
                 tests_failed=parsed.tests_failed,
-            )
+                diagnostics=diagnostics,
+            ), vcd
 
         # Check for runtime exceptions (failwith, etc.) - returncode != 0 but no test counts
         if returncode != 0 and parsed.tests_passed is None:
-            # Extract exception message from output
-            exception_msg = None
-            for line in combined_output.split("\n"):
-                if "Failure" in line or "failwith" in line.lower():
-                    exception_msg = line.strip()
-                    break
-                if "Exception:" in line:
-                    exception_msg = line.strip()
-                    break
-
             return CompileResult(
                 success=False,
-                output=parsed.test_output if parsed.test_output else combined_output,
+                # Without test lines, show the (capped) raw output
+                output=parsed.test_output if parsed.test_output else stdout + "\n" + stderr,
                 waveform=parsed.waveform,
-                waveform_vcd=vcd,
                 error_type="runtime_error",
-                error_message=exception_msg or "Test crashed with an exception",
+                error_message=parsed.exception or "Test crashed with an exception",
                 stage="test",
-                compile_time_ms=dune_time,
+                compile_time_ms=compile_time,
+                run_time_ms=run_time,
                 tests_passed=0,
                 tests_failed=1,
-            )
+                diagnostics=diagnostics,
+            ), vcd
 
-        result = CompileResult(
+        return CompileResult(
             success=True,
             output=parsed.test_output,
             waveform=parsed.waveform,
-            waveform_vcd=vcd,
-            compile_time_ms=dune_time,
+            compile_time_ms=compile_time,
+            run_time_ms=run_time,
             tests_passed=parsed.tests_passed,
             tests_failed=parsed.tests_failed,
-        )
-
-        # Cache successful result
-        result_cache.put(cache_key_files, result)
-
-        return result
+            diagnostics=diagnostics,
+        ), vcd
 
     except Exception as e:
         return CompileResult(
@@ -742,14 +1344,12 @@ def compile_and_run(
             error_type="internal_error",
             error_message=str(e),
             stage="setup",
-        )
+        ), None
 
     finally:
+        # Let the session's next build (or an eviction) use the workspace
+        if slot_lock is not None:
+            slot_lock.release()
         # Cleanup build directory (only for temp dirs, not cached workspaces)
         if use_temp_dir and build_dir and build_dir.exists():
-            t0 = time.time()
-            try:
-                shutil.rmtree(build_dir)
-            except Exception:
-                pass  # Best effort cleanup
-            log.info(f"[timing] cleanup: {int((time.time() - t0) * 1000)}ms")
+            _remove_build_dir(build_dir)
@@ -18,11 +18,132 @@ try:
 except Exception:
     RESULT_CACHE_TTL = 3600
 
+# How long deterministic failures (compile errors, failing tests) stay
+# cached; 0 disables failure caching
+try:
+    RESULT_CACHE_FAILURE_TTL = int(os.environ.get("RESULT_CACHE_FAILURE_TTL", "600"))
+except Exception:
+    RESULT_CACHE_FAILURE_TTL = 600
+
+# Treat submissions that differ only in comments as identical (successful
+# results only; failures quote source lines)
+RESULT_CACHE_STRIP_COMMENTS = os.environ.get(
+    "RESULT_CACHE_STRIP_COMMENTS", ""
+).lower() in ("1", "true", "yes")
+
+# On-disk result store shared by all workers on the node ("" disables it)
+RESULT_STORE_PATH = os.environ.get(
+    "RESULT_STORE_PATH", "/tmp/hardcaml-results/results.db"
+)
+
+try:
+    RESULT_STORE_MAX_BYTES = int(
+        os.environ.get("RESULT_STORE_MAX_BYTES", str(256 * 1024 * 1024))
+    )
+except Exception:
+    RESULT_STORE_MAX_BYTES = 256 * 1024 * 1024
+
+try:
+    RESULT_STORE_TTL = int(os.environ.get("RESULT_STORE_TTL", "86400"))
+except Exception:
+    RESULT_STORE_TTL = 86400
+
+# Content-addressed waveform files served by GET /waveforms/{id}
+WAVEFORM_DIR = os.environ.get("WAVEFORM_DIR", "/tmp/hardcaml-waveforms")
+
+try:
+    WAVEFORM_STORE_MAX_BYTES = int(
+        os.environ.get("WAVEFORM_STORE_MAX_BYTES", str(512 * 1024 * 1024))
+    )
+except Exception:
+    WAVEFORM_STORE_MAX_BYTES = 512 * 1024 * 1024
+
+# Build the shipped examples into the result cache in the background at
+# startup (see result_seeder.py)
+RESULT_SEED_ON_STARTUP = os.environ.get("RESULT_SEED_ON_STARTUP", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
 try:
     COMPILE_TIMEOUT_SECONDS = int(os.environ.get("COMPILE_TIMEOUT_SECONDS", "300"))
 except Exception:
     COMPILE_TIMEOUT_SECONDS = 300
 
+try:
+    COMPILE_OUTPUT_LIMIT_BYTES = int(
+        os.environ.get("COMPILE_OUTPUT_LIMIT_BYTES", str(1024 * 1024))
+    )
+except Exception:
+    COMPILE_OUTPUT_LIMIT_BYTES = 1024 * 1024
+
+try:
+    BUILD_WORKERS = int(os.environ.get("BUILD_WORKERS", "2"))
+except Exception:
+    BUILD_WORKERS = 2
+
+try:
+    BUILD_QUEUE_SIZE = int(os.environ.get("BUILD_QUEUE_SIZE", "16"))
+except Exception:
+    BUILD_QUEUE_SIZE = 16
+
+try:
+    BUILD_QUEUE_RETRY_AFTER = int(os.environ.get("BUILD_QUEUE_RETRY_AFTER", "5"))
+except Exception:
+    BUILD_QUEUE_RETRY_AFTER = 5
+
+# Shared dune cache (also passed to dune as DUNE_CACHE_ROOT)
+DUNE_CACHE_ROOT = os.environ.get("DUNE_CACHE_ROOT", "/tmp/dune-cache")
+
+try:
+    DUNE_CACHE_STATS_INTERVAL = int(os.environ.get("DUNE_CACHE_STATS_INTERVAL", "300"))
+except Exception:
+    DUNE_CACHE_STATS_INTERVAL = 300
+
+# Deleted workspaces and build dirs are moved here and reaped in the background
+TRASH_DIR = os.environ.get("TRASH_DIR", "/tmp/hardcaml-trash")
+
+try:
+    TRASH_REAP_FILES_PER_SECOND = int(
+        os.environ.get("TRASH_REAP_FILES_PER_SECOND", "20000")
+    )
+except Exception:
+    TRASH_REAP_FILES_PER_SECOND = 20000
+
+try:
+    WORKSPACE_CACHE_MAX_SLOTS = int(os.environ.get("WORKSPACE_CACHE_MAX_SLOTS", "10"))
+except Exception:
+    WORKSPACE_CACHE_MAX_SLOTS = 10
+
+# Byte budget for all session workspaces (0 = unlimited). Only bytes that
+# evicting a workspace would free are counted (not hardlinked template files).
+try:
+    WORKSPACE_CACHE_MAX_BYTES = int(
+        os.environ.get("WORKSPACE_CACHE_MAX_BYTES", str(512 * 1024 * 1024))
+    )
+except Exception:
+    WORKSPACE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Evict workspaces while the cache filesystem has less free space than this
+try:
+    WORKSPACE_CACHE_MIN_FREE_BYTES = int(
+        os.environ.get("WORKSPACE_CACHE_MIN_FREE_BYTES", str(256 * 1024 * 1024))
+    )
+except Exception:
+    WORKSPACE_CACHE_MIN_FREE_BYTES = 256 * 1024 * 1024
+
+# Evict workspaces unused for this many seconds (0 = never)
+try:
+    WORKSPACE_CACHE_IDLE_TTL = int(os.environ.get("WORKSPACE_CACHE_IDLE_TTL", "0"))
+except Exception:
+    WORKSPACE_CACHE_IDLE_TTL = 0
+
+try:
+    WORKSPACE_POOL_SIZE = int(os.environ.get("WORKSPACE_POOL_SIZE", "2"))
+except Exception:
+    WORKSPACE_POOL_SIZE = 2
+
 # CORS Configuration
 # Comma-separated list of allowed origins
 # Default allows localhost for development
@@ -37,6 +158,14 @@ def validate_config():
     """Validate configuration on startup."""
     if RATE_LIMIT_PER_MINUTE <= 0:
         raise ValueError("RATE_LIMIT_PER_MINUTE must be positive")
+    if BUILD_WORKERS <= 0:
+        raise ValueError("BUILD_WORKERS must be positive")
+    if BUILD_QUEUE_SIZE < 0:
+        raise ValueError("BUILD_QUEUE_SIZE must not be negative")
+    if WORKSPACE_CACHE_MAX_SLOTS <= 0:
+        raise ValueError("WORKSPACE_CACHE_MAX_SLOTS must be positive")
+    if WORKSPACE_POOL_SIZE < 0:
+        raise ValueError("WORKSPACE_POOL_SIZE must not be negative")
     if COMPILE_TIMEOUT_SECONDS > 600:
         import logging
         log = logging.getLogger(__name__)
@@ -0,0 +1,172 @@
+"""
+Structured diagnostics from OCaml/dune compiler output.
+
+The compiler reports each error, warning or alert as a block:
+
+    File "circuit.ml", line 3, characters 4-10:
+    3 | let x = foo
+            ^^^
+    Error: Unbound value foo
+
+or, for a span over several lines, `File "circuit.ml", lines 3-5,
+characters 4-10:`. The message may continue on indented lines. dune often
+prints the same block more than once (e.g. when a module is compiled for
+bytecode and native code), so blocks are deduplicated by location and
+message.
+
+DiagnosticsParser turns a stream of stderr lines into Diagnostic records,
+so clients get locations without re-parsing the raw text.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+# Distinct diagnostics kept per build; later ones are counted in dropped
+MAX_DIAGNOSTICS = 50
+
+# Excerpt lines allowed between a location and its message
+MAX_EXCERPT_LINES = 20
+
+# Lines kept of one message (the first plus indented continuations)
+MAX_MESSAGE_LINES = 40
+
+_LOCATION_RE = re.compile(
+    r'File "([^"]+)", lines? (\d+)(?:-(\d+))?(?:, characters (\d+)-(\d+))?'
+)
+
+# "Error: ...", "Error (warning 32 [unused-value-declaration]): ...",
+# "Warning 32 [unused-value-declaration]: ...", "Alert deprecated: ..."
+_MESSAGE_RE = re.compile(r"(Error|Warning|Alert)\b[^:]*:\s*(.*)")
+
+# Error classes by message prefix; same names as compiler.parse_error()
+_ERROR_CLASSES = (
+    ("Unbound", "unbound_error"),
+    ("Syntax error", "syntax_error"),
+    ("This expression has type", "type_error"),
+)
+
+
+@dataclass
+class Diagnostic:
+    """A compiler error, warning or alert at a source location."""
+
+    file: str
+    line: int
+    end_line: int
+    # 0-based columns on line and end_line (end exclusive); None if the
+    # location has no character range
+    column: Optional[int]
+    end_column: Optional[int]
+    # "error", "warning" or "alert"; warnings turned into errors are errors
+    severity: str
+    message: str
+    # unbound_error, syntax_error, type_error or compile_error for errors;
+    # "warning" or "alert" otherwise
+    error_class: str
+
+
+def _error_class(severity: str, message: str) -> str:
+    """Classify a diagnostic by its severity and message."""
+    if severity != "error":
+        return severity
+    for prefix, error_class in _ERROR_CLASSES:
+        if message.startswith(prefix):
+            return error_class
+    return "compile_error"
+
+
+class DiagnosticsParser:
+    """
+    Collects diagnostics from compiler output, fed one line at a time.
+
+    Distinct diagnostics are kept in diagnostics, in order of appearance,
+    with the raw text of each block in blocks. Repeats are counted in
+    duplicates; distinct diagnostics beyond max_diagnostics in dropped.
+    """
+
+    def __init__(self, max_diagnostics: int = MAX_DIAGNOSTICS):
+        self.diagnostics: list[Diagnostic] = []
+        self.blocks: list[str] = []
+        self.duplicates = 0
+        self.dropped = 0
+        self._max_diagnostics = max_diagnostics
+        self._seen: set[tuple] = set()
+        # Block being read: its location, lines, and message lines once seen
+        self._location: Optional[re.Match] = None
+        self._block: list[str] = []
+        self._severity = ""
+        self._message: Optional[list[str]] = None
+
+    def feed(self, line: str) -> Optional[Diagnostic]:
+        """
+        Consume one line of output.
+
+        Returns the diagnostic the line completed, if it is new and kept.
+        """
+        completed = None
+        if self._message is not None:
+            if line.startswith((" ", "\t")) and len(self._message) < MAX_MESSAGE_LINES:
+                self._block.append(line)
+                self._message.append(line.strip())
+                return None
+            completed = self._complete()
+
+        if line.startswith('File "'):
+            location = _LOCATION_RE.match(line)
+            if location:
+                self._location = location
+                self._block = [line]
+                return completed
+        if self._location is not None:
+            self._block.append(line)
+            message = _MESSAGE_RE.match(line)
+            if message:
+                self._severity = message.group(1).lower()
+                self._message = [message.group(2)]
+            elif len(self._block) > MAX_EXCERPT_LINES:
+                self._location = None
+        return completed
+
+    def finish(self) -> Optional[Diagnostic]:
+        """
+        End of output: complete a block still open.
+
+        Returns the diagnostic if it is new and kept.
+        """
+        if self._message is None:
+            return None
+        return self._complete()
+
+    def text(self) -> str:
+        """The kept blocks as printed, separated by blank lines."""
+        return "\n\n".join(self.blocks)
+
+    def _complete(self) -> Optional[Diagnostic]:
+        """Turn the block just read into a Diagnostic; None if not kept."""
+        location, block, message = self._location, self._block, self._message
+        self._location, self._block, self._message = None, [], None
+
+        file, line, end_line, column, end_column = location.groups()
+        text = "\n".join(message).strip()
+        diagnostic = Diagnostic(
+            file=file,
+            line=int(line),
+            end_line=int(end_line or line),
+            column=int(column) if column is not None else None,
+            end_column=int(end_column) if end_column is not None else None,
+            severity=self._severity,
+            message=text,
+            error_class=_error_class(self._severity, text),
+        )
+        key = (file, line, end_line, column, end_column, self._severity, text)
+        if key in self._seen:
+            self.duplicates += 1
+            return None
+        self._seen.add(key)
+        if len(self.diagnostics) >= self._max_diagnostics:
+            self.dropped += 1
+            return None
+        self.diagnostics.append(diagnostic)
+        self.blocks.append("\n".join(block).rstrip())
+        return diagnostic
@@ -0,0 +1,147 @@
+"""
+Background statistics for the shared dune cache.
+
+Walking DUNE_CACHE_ROOT is expensive once the cache holds hundreds of
+thousands of files, so it is never done on the request path. A daemon
+thread rescans the cache on a timer and keeps the latest size, file count
+and growth rate for logs and the /cache/dune/stats endpoint. Rescans are
+incremental: cache entries are immutable, so only directories whose mtime
+changed are listed again.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from tree_size import TreeSizeTracker
+
+log = logging.getLogger(__name__)
+
+# Default configuration
+DEFAULT_CACHE_ROOT = Path("/tmp/dune-cache")
+DEFAULT_INTERVAL_SECONDS = 300
+
+
+@dataclass
+class DuneCacheSnapshot:
+    """Result of one scan of the dune cache."""
+
+    exists: bool
+    size_bytes: int
+    file_count: int
+    scanned_at: float
+    scan_ms: int
+    # Bytes per second since the previous scan (None until two scans exist)
+    growth_bytes_per_second: float | None = None
+
+
+def scan_tree(root: Path) -> tuple[int, int]:
+    """Total size and file count under root (one full scan)."""
+    return TreeSizeTracker(root).refresh()
+
+
+class DuneCacheStats:
+    """Keeps dune cache statistics fresh from a background thread."""
+
+    def __init__(
+        self,
+        cache_root: Path = DEFAULT_CACHE_ROOT,
+        interval_seconds: int = DEFAULT_INTERVAL_SECONDS,
+    ):
+        self.cache_root = cache_root
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._snapshot: DuneCacheSnapshot | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._tracker = TreeSizeTracker(cache_root)
+
+    def refresh(self) -> DuneCacheSnapshot:
+        """Rescan the cache now and record the result."""
+        t0 = time.time()
+        exists = self.cache_root.exists()
+        size, count = self._tracker.refresh() if exists else (0, 0)
+        now = time.time()
+
+        with self._lock:
+            previous = self._snapshot
+            growth = None
+            if previous is not None and now > previous.scanned_at:
+                growth = (size - previous.size_bytes) / (now - previous.scanned_at)
+            self._snapshot = DuneCacheSnapshot(
+                exists=exists,
+                size_bytes=size,
+                file_count=count,
+                scanned_at=now,
+                scan_ms=int((now - t0) * 1000),
+                growth_bytes_per_second=growth,
+            )
+            snapshot = self._snapshot
+
+        log.info(
+            f"Dune cache: path={self.cache_root}, files={count}, "
+            f"size={size // 1024}KB, scan={snapshot.scan_ms}ms "
+            f"({self._tracker.dirs_rescanned} dirs rescanned)"
+        )
+        return snapshot
+
+    def snapshot(self) -> DuneCacheSnapshot | None:
+        """Latest scan result, or None if no scan has finished yet."""
+        with self._lock:
+            return self._snapshot
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                log.warning(f"Dune cache scan failed: {e}")
+            self._stop.wait(self.interval_seconds)
+
+    def start(self) -> None:
+        """Start periodic background scans (first scan runs immediately)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="dune-cache-stats", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop background scans."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def get_stats(self) -> dict:
+        """Get cache statistics."""
+        snapshot = self.snapshot()
+        return {
+            "path": str(self.cache_root),
+            "interval_seconds": self.interval_seconds,
+            "last_scan": asdict(snapshot) if snapshot else None,
+        }
+
+
+# Global singleton instance
+_stats_instance: DuneCacheStats | None = None
+_stats_lock = threading.Lock()
+
+
+def get_dune_cache_stats() -> DuneCacheStats:
+    """Get the global dune cache statistics collector."""
+    global _stats_instance
+    if _stats_instance is None:
+        with _stats_lock:
+            if _stats_instance is None:
+                from config import DUNE_CACHE_ROOT, DUNE_CACHE_STATS_INTERVAL
+
+                _stats_instance = DuneCacheStats(
+                    cache_root=Path(DUNE_CACHE_ROOT),
+                    interval_seconds=DUNE_CACHE_STATS_INTERVAL,
+                )
+    return _stats_instance
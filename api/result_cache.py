@@ -2,54 +2,142 @@
 Result cache for compilation outputs keyed by content hash.
 
 Caches CompileResult objects by hashing the input files, enabling
-instant returns for repeated compilations of the same code.
+instant returns for repeated compilations of the same code. The in-memory
+LRU is the first level; an optional DiskResultStore shared by all workers
+on the node is the second.
+
+There is one entry per submission whether or not VCD output was requested.
+Waveform and VCD text live gzip-compressed in a separate content-addressed
+blob table (see waveform_blobs) so identical waveforms are held once, and
+hits are assembled from the entry and its blobs. An entry built with VCD
+also answers requests without it; the reverse is a miss, and the rebuilt
+result replaces the entry.
 """
 
 from __future__ import annotations
 
+import dataclasses
 import hashlib
 import logging
 import threading
 import time
 from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Optional
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from source_normalizer import normalize_files
+from waveform_blobs import EncodedBlob, decode_blob, encode_blob
+
+if TYPE_CHECKING:
+    from compiler import CompileResult
+    from result_store import DiskResultStore
 
 log = logging.getLogger(__name__)
 
 # Default configuration
 DEFAULT_MAX_SIZE = 100
 DEFAULT_TTL_SECONDS = 3600  # 1 hour
+DEFAULT_FAILURE_TTL_SECONDS = 600
+
+# Failures that are a pure function of the submitted files and so safe to
+# replay: compile errors (with error diagnostics) and failing tests.
+# Timeouts, runtime crashes and internal errors depend on load and
+# environment and are never cached.
+CACHEABLE_FAILURES = {
+    ("compile", "syntax_error"),
+    ("compile", "type_error"),
+    ("compile", "unbound_error"),
+    ("compile", "compile_error"),
+    ("test", "test_failure"),
+}
+
+
+def is_deterministic_failure(result: CompileResult) -> bool:
+    """Whether a failed result would come out the same if rebuilt."""
+    if (result.stage, result.error_type) not in CACHEABLE_FAILURES:
+        return False
+    # Only compile failures the compiler explained; a failed build without
+    # error diagnostics may be the environment's fault
+    if result.stage == "compile":
+        return any(d.severity == "error" for d in result.diagnostics or ())
+    return True
+
+
+@dataclass
+class _Blob:
+    blob: EncodedBlob
+    refs: int = 0
+
+
+@dataclass
+class _Hit:
+    """A cache hit's result and payloads, taken under the lock."""
+
+    result: CompileResult
+    waveform: Optional[EncodedBlob]
+    vcd: Optional[EncodedBlob]
 
 
 @dataclass
 class CacheEntry:
     """A cached compilation result."""
 
-    result: CompileResult  # type: ignore
+    # Without waveform and waveform_vcd; those are in the blob table
+    result: CompileResult
     created_at: float = field(default_factory=time.time)
+    # Hash of the submission as received, before normalization
+    raw_key: Optional[str] = None
+    waveform_id: Optional[str] = None
+    vcd_id: Optional[str] = None
+    # Built with VCD output requested (vcd_id may still be None if the
+    # build produced none)
+    includes_vcd: bool = False
 
 
 class ResultCache:
     """
     LRU cache of compilation results keyed by content hash.
 
-    Caches successful compilation results to avoid recompiling identical code.
-    When cache is full, evicts least recently used entries.
+    Caches successful compilation results, and deterministic failures for
+    failure_ttl_seconds, to avoid recompiling identical code. When cache is
+    full, evicts least recently used entries. Misses fall through to the
+    disk store (if any), and disk hits are promoted.
     """
 
     def __init__(
-        self, max_size: int = DEFAULT_MAX_SIZE, ttl_seconds: int = DEFAULT_TTL_SECONDS
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        store: DiskResultStore | None = None,
+        failure_ttl_seconds: int = DEFAULT_FAILURE_TTL_SECONDS,
+        strip_comments: bool = False,
     ):
         self.max_size = max_size
         self.ttl_seconds = ttl_seconds
+        # 0 disables failure caching (unlike ttl_seconds, where 0 means no expiry)
+        self.failure_ttl_seconds = failure_ttl_seconds
+        # Also treat submissions that differ only in comments as identical
+        self.strip_comments = strip_comments
+        self.store = store
         # OrderedDict maintains insertion order; we move items to end on access
         self._cache: OrderedDict[str, CacheEntry] = OrderedDict()
+        # Waveform/VCD text by content hash, refcounted by entries
+        self._blobs: dict[str, _Blob] = {}
         self._lock = threading.Lock()
-
-        log.info(f"ResultCache initialized: max_size={max_size}, ttl={ttl_seconds}s")
-
-    def _hash_files(self, files: dict[str, str]) -> str:
+        self._hits = 0
+        self._store_hits = 0
+        self._failure_hits = 0
+        self._normalization_hits = 0
+        self._misses = 0
+
+        log.info(
+            f"ResultCache initialized: max_size={max_size}, ttl={ttl_seconds}s, "
+            f"failure_ttl={failure_ttl_seconds}s, strip_comments={strip_comments}, "
+            f"store={store.path if store else None}"
+        )
+
+    def _hash_files(self, files: dict[str, str], mode: str = "test") -> str:
         """
         Generate a deterministic hash of the file contents.
 
@@ -59,71 +147,321 @@ class ResultCache:
         sorted_files = sorted(files.items())
         # Create a string representation: "filename1:content1\nfilename2:content2\n..."
         content = "\n".join(f"{name}:{content}" for name, content in sorted_files)
+        # Other modes are keyed apart; test keys predate modes
+        if mode != "test":
+            content = f"mode:{mode}\n{content}"
         # Hash the content
         return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
+    def _keys(self, files: dict[str, str], mode: str = "test") -> tuple[str, list[str], str]:
+        """
+        Cache keys for a submission.
+
+        Returns:
+            Tuple of (raw_key, lookup_keys, put_key_for_failures). lookup_keys
+            is the comment-insensitive key (successes only, if enabled)
+            followed by the normalized key.
+        """
+        raw_key = self._hash_files(files, mode)
+        key = self.key(files, mode)
+        if not self.strip_comments:
+            return raw_key, [key], key
+        token_key = self._hash_files(normalize_files(files, strip_comments=True), mode)
+        return raw_key, [token_key, key], key
+
+    def key(self, files: dict[str, str], mode: str = "test") -> str:
+        """
+        Content hash identifying a submission, after normalization.
+
+        Submissions with the same key build identically in the given build
+        mode (see compiler.DUNE_TARGETS).
+        """
+        return self._hash_files(normalize_files(files), mode)
+
+    def _put_key(
+        self, files: dict[str, str], result: CompileResult, mode: str = "test"
+    ) -> tuple[str, str]:
+        """Key a result is stored under, and the raw key of its submission."""
+        raw_key, lookup_keys, failure_key = self._keys(files, mode)
+        # Failures quote source lines and positions, so they are only shared
+        # between submissions that differ in whitespace, not in comments
+        return (lookup_keys[0] if result.success else failure_key), raw_key
+
     def _is_expired(self, entry: CacheEntry) -> bool:
         """Check if a cache entry has expired."""
-        if self.ttl_seconds <= 0:
+        ttl = self.ttl_seconds if entry.result.success else self.failure_ttl_seconds
+        if ttl <= 0:
             return False  # TTL disabled
-        return (time.time() - entry.created_at) > self.ttl_seconds
+        return (time.time() - entry.created_at) > ttl
 
-    def get(self, files: dict[str, str]) -> Optional[CompileResult]:
+    def _record_hit(
+        self, result: CompileResult, raw_key: str, entry_raw_key: Optional[str]
+    ) -> None:
+        """Update hit counters (caller holds the lock)."""
+        if not result.success:
+            self._failure_hits += 1
+        if entry_raw_key is not None and entry_raw_key != raw_key:
+            # Only found because of normalization
+            self._normalization_hits += 1
+
+    def get(
+        self,
+        files: dict[str, str],
+        include_vcd: bool = False,
+        inline_vcd: bool = True,
+        mode: str = "test",
+    ) -> Optional[CompileResult]:
         """
         Get a cached result for the given files, if available.
 
+        May read the disk store; call it off the event loop.
+
+        Args:
+            files: Submitted files
+            include_vcd: Whether the caller needs VCD output. Entries built
+                without it don't count as hits.
+            inline_vcd: Whether to decompress the VCD into waveform_vcd, or
+                only report its id and size (see get_blob)
+            mode: Build mode ("check", "build" or "test"), or
+                compiler.COMPILE_FAILURE_MODE; each is cached separately
+
         Returns:
-            Cached CompileResult if found and not expired, None otherwise.
+            Cached CompileResult (with waveform_vcd only if requested) if
+            found and not expired, None otherwise. It is a new object that
+            shares its text with the cache, so callers may set fields on it.
         """
-        key = self._hash_files(files)
+        raw_key, lookup_keys, _ = self._keys(files, mode)
 
+        # Blobs are decompressed after the lock is released, so a hit on a
+        # large waveform doesn't hold up other lookups
+        hit = None
         with self._lock:
-            if key not in self._cache:
-                return None
+            for key in lookup_keys:
+                entry = self._cache.get(key)
+                if entry is not None and self._is_expired(entry):
+                    self._remove(key)
+                    log.debug(f"Cache entry expired for key {key[:8]}...")
+                    entry = None
+
+                if entry is not None and (entry.includes_vcd or not include_vcd):
+                    # Move to end (most recently used)
+                    self._cache.move_to_end(key)
+                    self._hits += 1
+                    self._record_hit(entry.result, raw_key, entry.raw_key)
+                    log.debug(f"Cache hit for key {key[:8]}...")
+                    hit = self._pin(entry, include_vcd)
+                    break
+        if hit is not None:
+            return self._view(hit, inline_vcd)
+
+        if self.store is not None:
+            for key in lookup_keys:
+                found = self.store.lookup(key, include_vcd=include_vcd)
+                if found is None or (include_vcd and not found.includes_vcd):
+                    continue
+                with self._lock:
+                    self._store_hits += 1
+                    self._record_hit(found.result, raw_key, found.raw_key)
+                    entry = self._insert(
+                        key,
+                        found.result,
+                        found.raw_key,
+                        found.includes_vcd,
+                        found.waveform,
+                        found.vcd,
+                        # Keep the store's TTL rather than restarting it;
+                        # seeded rows never expire there
+                        created_at=None if found.seeded else found.created_at,
+                    )
+                    log.debug(f"Disk store hit for key {key[:8]}...")
+                    hit = self._pin(entry, include_vcd)
+                return self._view(hit, inline_vcd)
 
-            entry = self._cache[key]
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def _pin(self, entry: CacheEntry, include_vcd: bool) -> _Hit:
+        """Take what a hit needs from an entry (caller holds the lock)."""
+        waveform = self._blobs[entry.waveform_id].blob if entry.waveform_id else None
+        vcd = None
+        if include_vcd and entry.vcd_id:
+            vcd = self._blobs[entry.vcd_id].blob
+        return _Hit(entry.result, waveform, vcd)
+
+    def _view(self, hit: _Hit, inline_vcd: bool = True) -> CompileResult:
+        """
+        Assemble a hit, decompressing only the text returned inline.
 
-            # Check expiration
-            if self._is_expired(entry):
-                del self._cache[key]
-                log.debug(f"Cache entry expired for key {key[:8]}...")
-                return None
+        Called without the lock; encoded blobs are never modified.
+        """
+        waveform, vcd = hit.waveform, hit.vcd
+        return dataclasses.replace(
+            hit.result,
+            waveform=decode_blob(waveform.data) if waveform else None,
+            waveform_vcd=decode_blob(vcd.data) if vcd and inline_vcd else None,
+            waveform_id=waveform.id if waveform else None,
+            waveform_vcd_id=vcd.id if vcd else None,
+            waveform_size=waveform.size if waveform else None,
+            waveform_vcd_size=vcd.size if vcd else None,
+        )
+
+    def get_blob(self, key: str) -> Optional[EncodedBlob]:
+        """
+        Get a compressed waveform or VCD payload by id.
 
-            # Move to end (most recently used)
-            self._cache.move_to_end(key)
-            log.debug(f"Cache hit for key {key[:8]}...")
-            return entry.result
+        May read the disk store; call it off the event loop.
+        """
+        with self._lock:
+            blob = self._blobs.get(key)
+            if blob is not None:
+                return blob.blob
+        if self.store is not None:
+            return self.store.get_blob(key)
+        return None
+
+    def _acquire_blob(self, encoded: Optional[EncodedBlob]) -> Optional[str]:
+        """Reference a blob, adding it if new (caller holds the lock)."""
+        if encoded is None:
+            return None
+        blob = self._blobs.get(encoded.id)
+        if blob is None:
+            blob = self._blobs[encoded.id] = _Blob(encoded)
+        blob.refs += 1
+        return encoded.id
+
+    def _release_blob(self, key: Optional[str]) -> None:
+        """Drop a reference to a blob (caller holds the lock)."""
+        if key is None:
+            return
+        blob = self._blobs[key]
+        blob.refs -= 1
+        if blob.refs <= 0:
+            del self._blobs[key]
+
+    def _remove(self, key: str) -> None:
+        """Drop an entry and its blob references (caller holds the lock)."""
+        entry = self._cache.pop(key)
+        self._release_blob(entry.waveform_id)
+        self._release_blob(entry.vcd_id)
+
+    def _insert(
+        self,
+        key: str,
+        result: CompileResult,
+        raw_key: Optional[str] = None,
+        includes_vcd: bool = False,
+        waveform: Optional[EncodedBlob] = None,
+        vcd: Optional[EncodedBlob] = None,
+        created_at: Optional[float] = None,
+    ) -> CacheEntry:
+        """
+        Add an entry to the in-memory LRU (caller holds the lock).
 
-    def put(self, files: dict[str, str], result: CompileResult) -> None:
+        The result's own waveform text is ignored; waveform and vcd are its
+        encoded payloads. created_at defaults to now.
+        """
+        entry = CacheEntry(
+            result=dataclasses.replace(
+                result,
+                waveform=None,
+                waveform_vcd=None,
+                waveform_id=None,
+                waveform_vcd_id=None,
+                waveform_size=None,
+                waveform_vcd_size=None,
+            ),
+            raw_key=raw_key,
+            waveform_id=self._acquire_blob(waveform),
+            vcd_id=self._acquire_blob(vcd) if includes_vcd else None,
+            includes_vcd=includes_vcd,
+        )
+        if created_at is not None:
+            entry.created_at = created_at
+        if key in self._cache:
+            self._remove(key)
+        # Evict if at capacity
+        while len(self._cache) >= self.max_size:
+            # Remove oldest entry (first in OrderedDict)
+            oldest_key = next(iter(self._cache))
+            self._remove(oldest_key)
+            log.debug(f"Evicted cache entry for key {oldest_key[:8]}...")
+        self._cache[key] = entry
+        return entry
+
+    def put(
+        self,
+        files: dict[str, str],
+        result: CompileResult,
+        include_vcd: Optional[bool] = None,
+        mode: str = "test",
+        vcd: Optional[EncodedBlob] = None,
+        seeded: bool = False,
+    ) -> tuple[Optional[EncodedBlob], Optional[EncodedBlob]]:
         """
         Cache a compilation result.
 
-        Only caches successful compilations to avoid caching errors.
-        """
-        # Only cache successful results
-        if not result.success:
-            return
+        Successes are always cached; failures only if they are deterministic
+        (see CACHEABLE_FAILURES) and failure caching is enabled.
 
-        key = self._hash_files(files)
+        Args:
+            files: Submitted files
+            result: Result of building them
+            include_vcd: Whether VCD output was requested for the build
+                (default: whether the result has any)
+            mode: Build mode the result came from (see get)
+            vcd: The result's VCD, if already encoded (builds stream it into
+                the waveform store rather than setting waveform_vcd)
+            seeded: Keep it in the disk store regardless of its TTL (see
+                result_seeder)
+
+        Returns:
+            The cached waveform and VCD payloads (see get_blob), or None for
+            each that wasn't cached.
+        """
+        if not result.success and (
+            self.failure_ttl_seconds <= 0 or not is_deterministic_failure(result)
+        ):
+            return None, None
+
+        if include_vcd is None:
+            include_vcd = vcd is not None or result.waveform_vcd is not None
+        key, raw_key = self._put_key(files, result, mode)
+        # Compress once, outside the lock, for both levels
+        waveform = encode_blob(result.waveform) if result.waveform is not None else None
+        if not include_vcd:
+            vcd = None
+        elif vcd is None and result.waveform_vcd is not None:
+            vcd = encode_blob(result.waveform_vcd)
 
         with self._lock:
-            # Evict if at capacity
-            while len(self._cache) >= self.max_size:
-                # Remove oldest entry (first in OrderedDict)
-                oldest_key = next(iter(self._cache))
-                del self._cache[oldest_key]
-                log.debug(f"Evicted cache entry for key {oldest_key[:8]}...")
-
-            # Add new entry
-            self._cache[key] = CacheEntry(result=result)
-            log.debug(
-                f"Cached result for key {key[:8]}... (size: {len(self._cache)}/{self.max_size})"
+            existing = self._cache.get(key)
+            # Don't replace an entry that can answer more requests
+            if existing is None or include_vcd or not existing.includes_vcd:
+                self._insert(key, result, raw_key, include_vcd, waveform, vcd)
+                log.debug(
+                    f"Cached result for key {key[:8]}... (size: {len(self._cache)}/{self.max_size})"
+                )
+
+        if self.store is not None:
+            self.store.put(
+                key,
+                result,
+                raw_key,
+                includes_vcd=include_vcd,
+                waveform=waveform,
+                vcd=vcd,
+                seeded=seeded,
             )
+        return waveform, vcd
 
     def clear(self) -> None:
-        """Clear all cached results."""
+        """Clear all cached results (including the disk store)."""
         with self._lock:
             self._cache.clear()
+            self._blobs.clear()
+        if self.store is not None:
+            self.store.clear()
         log.info("Result cache cleared")
 
     def get_stats(self) -> dict:
@@ -137,6 +475,22 @@ class ResultCache:
                 "current_size": len(self._cache),
                 "ttl_seconds": self.ttl_seconds,
                 "expired_entries": expired_count,
+                "failure_ttl_seconds": self.failure_ttl_seconds,
+                "failure_entries": sum(
+                    1 for entry in self._cache.values() if not entry.result.success
+                ),
+                "blobs": len(self._blobs),
+                # Compressed, and as served inline
+                "blob_bytes": sum(len(b.blob.data) for b in self._blobs.values()),
+                "blob_raw_bytes": sum(b.blob.size for b in self._blobs.values()),
+                # Blobs referenced by more than one entry
+                "shared_blobs": sum(1 for b in self._blobs.values() if b.refs > 1),
+                "hits": self._hits,
+                "failure_hits": self._failure_hits,
+                "normalization_hits": self._normalization_hits,
+                "store_hits": self._store_hits,
+                "misses": self._misses,
+                "store": self.store.get_stats() if self.store is not None else None,
             }
 
 
@@ -151,9 +505,31 @@ def get_result_cache() -> ResultCache:
     if _cache_instance is None:
         with _cache_lock:
             if _cache_instance is None:
-                from config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+                from config import (
+                    RESULT_CACHE_FAILURE_TTL,
+                    RESULT_CACHE_SIZE,
+                    RESULT_CACHE_STRIP_COMMENTS,
+                    RESULT_CACHE_TTL,
+                    RESULT_STORE_MAX_BYTES,
+                    RESULT_STORE_PATH,
+                    RESULT_STORE_TTL,
+                )
+
+                store = None
+                if RESULT_STORE_PATH:
+                    from result_store import DiskResultStore
 
+                    store = DiskResultStore(
+                        path=Path(RESULT_STORE_PATH),
+                        max_bytes=RESULT_STORE_MAX_BYTES,
+                        ttl_seconds=RESULT_STORE_TTL,
+                        failure_ttl_seconds=RESULT_CACHE_FAILURE_TTL,
+                    )
                 _cache_instance = ResultCache(
-                    max_size=RESULT_CACHE_SIZE, ttl_seconds=RESULT_CACHE_TTL
+                    max_size=RESULT_CACHE_SIZE,
+                    ttl_seconds=RESULT_CACHE_TTL,
+                    store=store,
+                    failure_ttl_seconds=RESULT_CACHE_FAILURE_TTL,
+                    strip_comments=RESULT_CACHE_STRIP_COMMENTS,
                 )
     return _cache_instance
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Seeding of the result cache with the shipped examples.
+
+Every example the frontend offers (hardcaml/examples_manifest.py) is known
+when the image is built, and "open an example and hit Run" is the most
+common first action, so those results are computed ahead of time and kept
+in the persistent result store (RESULT_STORE_PATH):
+
+- at image build time, by running this module as a script
+- optionally at startup (RESULT_SEED_ON_STARTUP), from a background thread
+  that gives way whenever user builds are waiting for a worker
+
+Examples are built with VCD output, which also answers requests without it.
+Their rows are marked seeded, which exempts them from the store's TTL: the
+image's store is written when the image is built, and a TTL counted from
+then would expire results of an image deployed a day later. Examples that
+are already cached are marked rather than rebuilt.
+
+Usage:
+    uv run python result_seeder.py             # Seed all examples
+    uv run python result_seeder.py counter     # Seed specific examples
+"""
+
+import argparse
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+log = logging.getLogger(__name__)
+
+# Where to find hardcaml/examples_manifest.py (same order as the build
+# templates in compiler.py): dev volume mount, Docker image, repo checkout
+EXAMPLES_DIR_MOUNTED = Path("/hardcaml")
+EXAMPLES_DIR_DOCKER = Path("/opt/hardcaml")
+EXAMPLES_DIR_REPO = Path(__file__).parent.parent / "hardcaml"
+
+# How often a deferred seeder checks whether the build queue has drained
+DEFER_POLL_SECONDS = 1.0
+
+
+def load_examples() -> list:
+    """
+    Load every example the frontend exposes.
+
+    Returns:
+        List of examples_manifest.Example, or [] if no manifest is available.
+    """
+    for root in (EXAMPLES_DIR_MOUNTED, EXAMPLES_DIR_DOCKER, EXAMPLES_DIR_REPO):
+        if (root / "examples_manifest.py").exists():
+            break
+    else:
+        log.warning("No examples manifest found; nothing to seed")
+        return []
+
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
+    from examples_manifest import get_all_testable_examples
+
+    return get_all_testable_examples()
+
+
+@dataclass
+class SeedReport:
+    """Outcome of one seeding pass."""
+
+    seeded: int = 0
+    already_cached: int = 0
+    failed: list[str] = field(default_factory=list)
+    elapsed_ms: int = 0
+
+
+def seed_examples(
+    examples: list,
+    timeout_seconds: int = 300,
+    should_defer: Optional[Callable[[], bool]] = None,
+    stop: Optional[threading.Event] = None,
+) -> SeedReport:
+    """
+    Make sure the result cache holds a result for each example.
+
+    Args:
+        examples: examples_manifest.Example objects (id, files, project_type)
+        timeout_seconds: Build timeout per example
+        should_defer: Optional check called before each build; while it
+            returns True, seeding waits (e.g. user builds are queued)
+        stop: Optional event that ends seeding early
+
+    Returns:
+        SeedReport. Failing examples are listed but not retried.
+    """
+    # Lazy import: the compiler pulls in the build machinery
+    from compiler import compile_and_run
+    from result_cache import get_result_cache
+
+    cache = get_result_cache()
+    stop = stop or threading.Event()
+    report = SeedReport()
+    t0 = time.time()
+    for example in examples:
+        if stop.is_set():
+            break
+        cached = cache.get(example.files, include_vcd=True)
+        if cached is not None:
+            # Store it again, seeded
+            cache.put(example.files, cached, include_vcd=True, seeded=True)
+            report.already_cached += 1
+            continue
+
+        while should_defer is not None and should_defer():
+            if stop.wait(DEFER_POLL_SECONDS):
+                break
+        if stop.is_set():
+            break
+
+        result = compile_and_run(
+            files=example.files,
+            timeout_seconds=timeout_seconds,
+            include_vcd=True,
+            project_type=example.project_type,
+        )
+        if result.success:
+            cache.put(example.files, result, include_vcd=True, seeded=True)
+            report.seeded += 1
+        else:
+            # Failures that aren't deterministic (see result_cache) aren't
+            # cached, so the example will be retried on the next pass
+            log.warning(
+                f"[seed] {example.id} failed: {result.error_type} - {result.error_message}"
+            )
+            report.failed.append(example.id)
+    report.elapsed_ms = int((time.time() - t0) * 1000)
+    log.info(
+        f"[seed] {report.seeded} seeded, {report.already_cached} already cached, "
+        f"{len(report.failed)} failed in {report.elapsed_ms}ms"
+    )
+    return report
+
+
+class ResultSeeder:
+    """Seeds the result cache once from a background thread."""
+
+    def __init__(
+        self,
+        load: Callable[[], list] = load_examples,
+        timeout_seconds: int = 300,
+        should_defer: Optional[Callable[[], bool]] = None,
+    ):
+        self.load = load
+        self.timeout_seconds = timeout_seconds
+        self.should_defer = should_defer
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._running = False
+        self._report: Optional[SeedReport] = None
+
+    def _run(self) -> None:
+        self._running = True
+        try:
+            self._report = seed_examples(
+                self.load(),
+                timeout_seconds=self.timeout_seconds,
+                should_defer=self.should_defer,
+                stop=self._stop,
+            )
+        except Exception as e:
+            log.warning(f"[seed] Seeding failed: {e}")
+        finally:
+            self._running = False
+
+    def start(self) -> None:
+        """Start seeding in the background."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="result-seeder", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop after the build in progress, if any."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def get_stats(self) -> dict:
+        """Get seeding progress."""
+        report = self._report
+        return {
+            "running": self._running,
+            "seeded": report.seeded if report else None,
+            "already_cached": report.already_cached if report else None,
+            "failed": report.failed if report else None,
+            "elapsed_ms": report.elapsed_ms if report else None,
+        }
+
+
+# Global singleton instance
+_seeder_instance: Optional[ResultSeeder] = None
+_seeder_lock = threading.Lock()
+
+
+def get_result_seeder() -> Optional[ResultSeeder]:
+    """Get the global startup seeder, or None if startup seeding is disabled."""
+    global _seeder_instance
+    from config import COMPILE_TIMEOUT_SECONDS, RESULT_SEED_ON_STARTUP
+
+    if not RESULT_SEED_ON_STARTUP:
+        return None
+    if _seeder_instance is None:
+        with _seeder_lock:
+            if _seeder_instance is None:
+                from build_executor import get_build_executor
+
+                executor = get_build_executor()
+                _seeder_instance = ResultSeeder(
+                    timeout_seconds=COMPILE_TIMEOUT_SECONDS,
+                    # Only build while no user build is waiting for a worker
+                    should_defer=lambda: executor.get_stats()["waiting"] > 0,
+                )
+    return _seeder_instance
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pre-populate the result cache with the shipped examples"
+    )
+    parser.add_argument(
+        "examples",
+        nargs="*",
+        help="Specific example IDs to seed (default: all)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(name)s: %(message)s")
+    from config import COMPILE_TIMEOUT_SECONDS, RESULT_STORE_PATH
+    from trash_reaper import get_trash_reaper
+
+    if not RESULT_STORE_PATH:
+        print("RESULT_STORE_PATH is empty; seeded results would not be kept")
+        sys.exit(1)
+
+    examples = load_examples()
+    if args.examples:
+        examples = [e for e in examples if e.id in args.examples]
+
+    report = seed_examples(examples, timeout_seconds=COMPILE_TIMEOUT_SECONDS)
+
+    # Temporary build directories go to the trash; don't leave them behind
+    # (e.g. in an image layer)
+    reaper = get_trash_reaper()
+    reaper.stop()
+    while reaper.reap_one():
+        pass
+
+    print(
+        f"Seeded {report.seeded}, already cached {report.already_cached}, "
+        f"failed {len(report.failed)}: {', '.join(report.failed) or '-'}"
+    )
+    sys.exit(1 if report.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
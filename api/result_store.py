@@ -0,0 +1,431 @@
+"""
+On-disk result store shared by all workers on a node.
+
+The in-memory ResultCache is per process and empty after every restart.
+This store is the second level behind it: a single sqlite database (WAL
+mode, so readers never block the writer) keyed by the same content hash,
+with a TTL and a total size budget enforced by evicting least recently
+used rows. Seeded rows (the shipped examples, see result_seeder) don't
+expire; they are only evicted for space.
+
+Like the in-memory cache, waveform and VCD text are kept gzip-compressed in
+a separate content-addressed table shared by all rows that reference them;
+blobs no longer referenced by any row are dropped during eviction.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from diagnostics import Diagnostic
+from waveform_blobs import EncodedBlob, decode_blob, encode_blob
+
+if TYPE_CHECKING:
+    from compiler import CompileResult
+
+log = logging.getLogger(__name__)
+
+# Default configuration
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_FAILURE_TTL_SECONDS = 600
+
+# Don't rewrite a row's access time on every hit; LRU order only needs
+# to be roughly right
+ACCESS_TOUCH_INTERVAL = 60
+
+# Check the size budget after this many puts
+EVICT_CHECK_INTERVAL = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    raw_key TEXT,
+    waveform_id TEXT,
+    vcd_id TEXT,
+    includes_vcd INTEGER NOT NULL DEFAULT 0,
+    seeded INTEGER NOT NULL DEFAULT 0,
+    success INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at);
+CREATE TABLE IF NOT EXISTS blobs (
+    id TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    raw_size INTEGER
+);
+"""
+
+# Columns added after the first release, for migrating older stores
+_ADDED_COLUMNS = {
+    "raw_key": "raw_key TEXT",
+    "waveform_id": "waveform_id TEXT",
+    "vcd_id": "vcd_id TEXT",
+    "includes_vcd": "includes_vcd INTEGER NOT NULL DEFAULT 0",
+    "seeded": "seeded INTEGER NOT NULL DEFAULT 0",
+    # Rows written before this column are swept with the success TTL
+    "success": "success INTEGER NOT NULL DEFAULT 1",
+}
+_ADDED_BLOB_COLUMNS = {
+    # Uncompressed size; size is what the blob takes up in the store
+    "raw_size": "raw_size INTEGER",
+}
+
+
+@dataclasses.dataclass
+class StoredResult:
+    """A row read back from the store."""
+
+    # Without waveform text; see waveform and vcd
+    result: CompileResult
+    # Hash of the submission as received, before normalization
+    raw_key: Optional[str]
+    # Whether the row has the VCD output of a build that requested it
+    includes_vcd: bool
+    # When the result was stored; the TTL runs from here
+    created_at: float = 0.0
+    # Exempt from the TTL (see result_seeder)
+    seeded: bool = False
+    waveform: Optional[EncodedBlob] = None
+    vcd: Optional[EncodedBlob] = None
+
+
+def _encode(result: CompileResult) -> bytes:
+    # Waveform and VCD text are stored as blobs, and referenced by column
+    values = dataclasses.asdict(result)
+    for name in (
+        "waveform",
+        "waveform_vcd",
+        "waveform_id",
+        "waveform_vcd_id",
+        "waveform_size",
+        "waveform_vcd_size",
+    ):
+        values[name] = None
+    return json.dumps(values).encode("utf-8")
+
+
+def _decode(data: bytes) -> CompileResult:
+    # Lazy import: compiler imports the result cache
+    from compiler import CompileResult
+
+    fields = {f.name for f in dataclasses.fields(CompileResult)}
+    values = json.loads(data)
+    if values.get("diagnostics"):
+        values["diagnostics"] = [Diagnostic(**d) for d in values["diagnostics"]]
+    # Tolerate rows written by older or newer versions of CompileResult
+    return CompileResult(**{k: v for k, v in values.items() if k in fields})
+
+
+class DiskResultStore:
+    """Sqlite-backed CompileResult store with TTL and size-based eviction."""
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        failure_ttl_seconds: int = DEFAULT_FAILURE_TTL_SECONDS,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # Cached failures (see result_cache.CACHEABLE_FAILURES) expire sooner
+        self.failure_ttl_seconds = failure_ttl_seconds
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # sqlite connections can't be shared between threads
+        self._local = threading.local()
+        self._puts = 0
+        self._evicted = 0
+        self._lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+            for name, definition in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE results ADD COLUMN {definition}")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(blobs)")}
+            for name, definition in _ADDED_BLOB_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE blobs ADD COLUMN {definition}")
+
+        log.info(
+            f"DiskResultStore initialized: path={path}, "
+            f"max_bytes={max_bytes}, ttl={ttl_seconds}s, "
+            f"failure_ttl={failure_ttl_seconds}s"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created_at: float, now: float, success: bool = True) -> bool:
+        ttl = self.ttl_seconds if success else self.failure_ttl_seconds
+        return ttl > 0 and now - created_at > ttl
+
+    def get(self, key: str, include_vcd: bool = True) -> Optional[CompileResult]:
+        """Get a stored result, or None if missing or expired."""
+        found = self.lookup(key, include_vcd)
+        if found is None:
+            return None
+        result = found.result
+        if found.waveform is not None:
+            result.waveform = decode_blob(found.waveform.data)
+        if found.vcd is not None:
+            result.waveform_vcd = decode_blob(found.vcd.data)
+        return result
+
+    def lookup(self, key: str, include_vcd: bool = True) -> Optional[StoredResult]:
+        """
+        Get a stored result with the metadata it was stored with.
+
+        Args:
+            key: Content hash
+            include_vcd: Also read the VCD blob. If False, vcd is None and
+                includes_vcd is False.
+
+        Returns:
+            StoredResult, or None if missing or expired.
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT r.created_at, r.accessed_at, r.data, r.raw_key, "
+                "r.includes_vcd, r.seeded, w.id, w.data, COALESCE(w.raw_size, w.size), "
+                "v.id, CASE WHEN ? THEN v.data END, COALESCE(v.raw_size, v.size) "
+                "FROM results r "
+                "LEFT JOIN blobs w ON w.id = r.waveform_id "
+                "LEFT JOIN blobs v ON v.id = r.vcd_id "
+                "WHERE r.key = ?",
+                (include_vcd, key),
+            ).fetchone()
+            if row is None:
+                return None
+            created_at, accessed_at, data, raw_key, includes_vcd, seeded = row[:6]
+            waveform_id, waveform, waveform_size, vcd_id, vcd, vcd_size = row[6:]
+            result = _decode(data)
+            if not seeded and self._expired(created_at, now, result.success):
+                with conn:
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            if now - accessed_at > ACCESS_TOUCH_INTERVAL:
+                with conn:
+                    conn.execute(
+                        "UPDATE results SET accessed_at = ? WHERE key = ?", (now, key)
+                    )
+            return StoredResult(
+                result=result,
+                raw_key=raw_key,
+                includes_vcd=bool(includes_vcd) and include_vcd,
+                created_at=created_at,
+                seeded=bool(seeded),
+                waveform=(
+                    EncodedBlob(waveform_id, waveform, waveform_size)
+                    if waveform is not None
+                    else None
+                ),
+                vcd=EncodedBlob(vcd_id, vcd, vcd_size) if vcd is not None else None,
+            )
+        except (sqlite3.Error, ValueError, TypeError) as e:
+            log.warning(f"Result store read failed for key {key[:8]}...: {e}")
+            return None
+
+    def put(
+        self,
+        key: str,
+        result: CompileResult,
+        raw_key: Optional[str] = None,
+        includes_vcd: bool = False,
+        waveform: Optional[EncodedBlob] = None,
+        vcd: Optional[EncodedBlob] = None,
+        seeded: bool = False,
+    ) -> None:
+        """
+        Store a result, evicting old rows if the store is over budget.
+
+        A row that includes VCD output is not replaced by one that doesn't,
+        and a seeded row stays seeded.
+
+        Args:
+            key: Content hash
+            result: Result to store
+            raw_key: Hash of the submission before normalization
+            includes_vcd: Whether the build requested VCD output
+            waveform, vcd: The result's payloads, if the caller already
+                encoded them (otherwise they are encoded here)
+            seeded: Exempt the row from the TTL (see result_seeder)
+        """
+        data = _encode(result)
+        if waveform is None and result.waveform is not None:
+            waveform = encode_blob(result.waveform)
+        if vcd is None and includes_vcd and result.waveform_vcd is not None:
+            vcd = encode_blob(result.waveform_vcd)
+        if not includes_vcd:
+            vcd = None
+        blobs = [b for b in (waveform, vcd) if b is not None]
+        waveform_id = waveform.id if waveform is not None else None
+        vcd_id = vcd.id if vcd is not None else None
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO blobs (id, size, data, raw_size) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(b.id, len(b.data), b.data, b.size) for b in blobs],
+                )
+                conn.execute(
+                    "INSERT INTO results "
+                    "(key, created_at, accessed_at, size, data, raw_key, "
+                    "waveform_id, vcd_id, includes_vcd, seeded, success) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET "
+                    "created_at = excluded.created_at, "
+                    "accessed_at = excluded.accessed_at, size = excluded.size, "
+                    "data = excluded.data, raw_key = excluded.raw_key, "
+                    "waveform_id = excluded.waveform_id, vcd_id = excluded.vcd_id, "
+                    "includes_vcd = excluded.includes_vcd, "
+                    "seeded = MAX(results.seeded, excluded.seeded), "
+                    "success = excluded.success "
+                    "WHERE excluded.includes_vcd >= results.includes_vcd",
+                    (
+                        key,
+                        now,
+                        now,
+                        len(data),
+                        data,
+                        raw_key,
+                        waveform_id,
+                        vcd_id,
+                        int(includes_vcd),
+                        int(seeded),
+                        int(result.success),
+                    ),
+                )
+            with self._lock:
+                self._puts += 1
+                check = self._puts % EVICT_CHECK_INTERVAL == 1
+            if check:
+                self.evict()
+        except sqlite3.Error as e:
+            log.warning(f"Result store write failed for key {key[:8]}...: {e}")
+
+    def get_blob(self, blob_id: str) -> Optional[EncodedBlob]:
+        """Get a compressed waveform or VCD payload by id."""
+        try:
+            row = self._connect().execute(
+                "SELECT data, COALESCE(raw_size, size) FROM blobs WHERE id = ?",
+                (blob_id,),
+            ).fetchone()
+        except sqlite3.Error as e:
+            log.warning(f"Result store read failed for blob {blob_id[:8]}...: {e}")
+            return None
+        if row is None:
+            return None
+        return EncodedBlob(id=blob_id, data=row[0], size=row[1])
+
+    def _total_bytes(self, conn: sqlite3.Connection) -> int:
+        (total,) = conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM results) + "
+            "(SELECT COALESCE(SUM(size), 0) FROM blobs)"
+        ).fetchone()
+        return total
+
+    def evict(self) -> int:
+        """Drop expired rows, then LRU rows until under max_bytes. Returns rows removed."""
+        conn = self._connect()
+        removed = 0
+        with conn:
+            # Failures expire sooner; sweep them here too, or the ones never
+            # looked up again would sit on disk for the success TTL
+            now = time.time()
+            expiry = [
+                (success, now - ttl)
+                for success, ttl in ((1, self.ttl_seconds), (0, self.failure_ttl_seconds))
+                if ttl > 0
+            ]
+            if expiry:
+                cursor = conn.executemany(
+                    "DELETE FROM results "
+                    "WHERE success = ? AND created_at < ? AND seeded = 0",
+                    expiry,
+                )
+                removed += cursor.rowcount
+            if self.max_bytes > 0:
+                excess = self._total_bytes(conn) - self.max_bytes
+                if excess > 0:
+                    # Count each row's blobs in full; shared blobs make this
+                    # an overestimate, and the next check catches up
+                    victims = []
+                    for key, size in conn.execute(
+                        "SELECT r.key, r.size + COALESCE(w.size, 0) + COALESCE(v.size, 0) "
+                        "FROM results r "
+                        "LEFT JOIN blobs w ON w.id = r.waveform_id "
+                        "LEFT JOIN blobs v ON v.id = r.vcd_id "
+                        "ORDER BY r.accessed_at"
+                    ):
+                        if excess <= 0:
+                            break
+                        victims.append((key,))
+                        excess -= size
+                    conn.executemany("DELETE FROM results WHERE key = ?", victims)
+                    removed += len(victims)
+            conn.execute(
+                "DELETE FROM blobs WHERE id NOT IN ("
+                "SELECT waveform_id FROM results WHERE waveform_id IS NOT NULL "
+                "UNION SELECT vcd_id FROM results WHERE vcd_id IS NOT NULL)"
+            )
+        if removed:
+            with self._lock:
+                self._evicted += removed
+            log.info(f"Result store evicted {removed} entries")
+        return removed
+
+    def clear(self) -> None:
+        """Remove all stored results."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM results")
+            conn.execute("DELETE FROM blobs")
+
+    def get_stats(self) -> dict:
+        """Get store statistics."""
+        try:
+            conn = self._connect()
+            (count,) = conn.execute("SELECT COUNT(*) FROM results").fetchone()
+            blobs, blob_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs"
+            ).fetchone()
+            total = self._total_bytes(conn)
+        except sqlite3.Error:
+            count, total, blobs, blob_bytes = None, None, None, None
+        return {
+            "path": str(self.path),
+            "entries": count,
+            "size_bytes": total,
+            "blobs": blobs,
+            "blob_bytes": blob_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "failure_ttl_seconds": self.failure_ttl_seconds,
+            "evicted": self._evicted,
+        }
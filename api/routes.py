@@ -1,13 +1,47 @@
 """API route handlers."""
 
+import asyncio
+import dataclasses
+import json
+import math
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from build_executor import BuildQueueFullError, get_build_executor
 from config import COMPILE_TIMEOUT_SECONDS, RATE_LIMIT_PER_MINUTE
-from fastapi import APIRouter, HTTPException, Request
+from dune_cache_stats import get_dune_cache_stats
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from rate_limit import limiter
-from schemas import CompileRequest, CompileResponse
+from result_cache import get_result_cache
+from result_seeder import get_result_seeder
+from schemas import CompileRequest, CompileResponse, Diagnostic, WaveformRef
+from single_flight import get_single_flight
+from starlette.background import BackgroundTask
+from vcd_parser import open_vcd
+from waveform_blobs import decode_blob
+from waveform_columns import (
+    SUFFIX as COLUMNAR_SUFFIX,
+    ColumnarWaveform,
+    WaveformFormatError,
+    open_columnar,
+    vcd_to_columnar,
+)
+from waveform_store import get_waveform_store
 from workspace_cache import get_workspace_cache
 
 router = APIRouter()
 
+# Waveforms are sent to streaming clients in chunks of this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# GET /waveforms/{id} responses are immutable (the id is a content hash)
+WAVEFORM_CACHE_CONTROL = "public, max-age=31536000, immutable"
+WAVEFORM_MEDIA_TYPE = "text/plain; charset=utf-8"
+
+# Upper bound on points per signal in GET /waveforms/{id}/window
+WINDOW_MAX_POINTS = 10000
+
 
 @router.get("/health")
 async def health_check():
@@ -22,13 +56,225 @@ async def cache_stats():
     return cache.get_stats()
 
 
-@router.post("/compile", response_model=CompileResponse)
-@limiter.limit(f"{RATE_LIMIT_PER_MINUTE}/minute")
-async def compile_code(request: Request, compile_request: CompileRequest):
-    """Compile and run Hardcaml code."""
-    # Lazy import to avoid loading compiler module at startup
-    from compiler import compile_and_run
+@router.get("/cache/results/stats")
+async def result_cache_stats():
+    """Get result cache statistics (in-memory and on-disk levels)."""
+    seeder = get_result_seeder()
+    return {
+        **get_result_cache().get_stats(),
+        "seeding": seeder.get_stats() if seeder is not None else None,
+    }
+
+
+@router.get("/cache/dune/stats")
+async def dune_cache_stats():
+    """Get shared dune cache size and growth from the last background scan."""
+    return get_dune_cache_stats().get_stats()
+
+
+@router.get("/build/stats")
+async def build_stats():
+    """Get build executor statistics (for debugging)."""
+    return {
+        **get_build_executor().get_stats(),
+        "single_flight": get_single_flight().get_stats(),
+    }
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows a gzip-encoded response."""
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches an ETag (weak comparison)."""
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _is_payload_id(waveform_id: str) -> bool:
+    """Whether an id is a payload id (a sha256), and so safe in a store path."""
+    return len(waveform_id) == 64 and all(c in "0123456789abcdef" for c in waveform_id)
+
+
+def _payload_path(waveform_id: str) -> Optional[Path]:
+    """Path of a payload in the waveform store, or None if the id is unknown."""
+    if not _is_payload_id(waveform_id):
+        return None
+    store = get_waveform_store()
+    path = store.path(waveform_id)
+    if path is None:
+        # Evicted from disk (or written by another node); the result cache
+        # may still have it
+        blob = get_result_cache().get_blob(waveform_id)
+        if blob is None:
+            return None
+        path = store.put(blob)
+    return path
+
+
+def _pinned_payload(waveform_id: str) -> Optional[Path]:
+    """
+    Pin a payload in the waveform store (see WaveformStore.pin), so it can't
+    be evicted while it is sent.
+
+    Returns:
+        The pinned path, or None if the id is unknown.
+    """
+    store = get_waveform_store()
+    # A second try re-creates a payload evicted between the lookup and the pin
+    for _ in range(2):
+        if _payload_path(waveform_id) is None:
+            return None
+        pinned = store.pin(waveform_id)
+        if pinned is not None:
+            return pinned
+    return None
+
+
+def _load_columnar(waveform_id: str) -> ColumnarWaveform:
+    """
+    Get the columnar form of a VCD payload, converting it on first use.
+
+    Raises:
+        HTTPException: 404 for unknown ids, 422 if the payload isn't a VCD.
+    """
+    if not _is_payload_id(waveform_id):
+        raise HTTPException(status_code=404, detail="Unknown waveform")
+
+    def load() -> bytes:
+        store = get_waveform_store()
+        path = store.path(waveform_id, COLUMNAR_SUFFIX)
+        if path is not None:
+            try:
+                return path.read_bytes()
+            except FileNotFoundError:
+                pass  # Evicted meanwhile; convert again
+        vcd_path = _payload_path(waveform_id)
+        if vcd_path is None:
+            raise HTTPException(status_code=404, detail="Unknown waveform")
+        with open_vcd(vcd_path) as stream:
+            data = vcd_to_columnar(stream)
+        store.put_data(waveform_id, data, COLUMNAR_SUFFIX)
+        return data
+
+    try:
+        return open_columnar(waveform_id, load)
+    except WaveformFormatError as e:
+        raise HTTPException(status_code=422, detail=f"Not a VCD waveform: {e}")
+
+
+@router.get("/waveforms/{waveform_id}")
+async def get_waveform(waveform_id: str, request: Request):
+    """
+    Get a waveform or VCD payload by the id from a compile response.
+
+    The id is the sha256 of the payload, so responses never change and are
+    cacheable indefinitely. Payloads are stored gzip-compressed and the file
+    is sent as is (with Range support) to clients that accept gzip; others
+    get it decompressed.
+    """
+    path = await asyncio.to_thread(_pinned_payload, waveform_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown waveform")
+    store = get_waveform_store()
+
+    gzip_ok = _accepts_gzip(request.headers.get("accept-encoding", ""))
+    # Each encoding is a different representation, with its own ETag
+    etag = f'"{waveform_id}.gz"' if gzip_ok else f'"{waveform_id}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": WAVEFORM_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        store.unpin(path)
+        return Response(status_code=304, headers=headers)
+
+    if gzip_ok:
+        headers["Content-Encoding"] = "gzip"
+        return FileResponse(
+            path,
+            media_type=WAVEFORM_MEDIA_TYPE,
+            headers=headers,
+            background=BackgroundTask(store.unpin, path),
+        )
+    try:
+        data = await asyncio.to_thread(path.read_bytes)
+    finally:
+        store.unpin(path)
+    headers["Accept-Ranges"] = "none"
+    return Response(
+        content=decode_blob(data).encode("utf-8"),
+        media_type=WAVEFORM_MEDIA_TYPE,
+        headers=headers,
+    )
 
+
+@router.get("/waveforms/{waveform_id}/signals")
+async def get_waveform_signals(waveform_id: str):
+    """
+    List the signals of a VCD payload (name, width, number of changes) and
+    its end time.
+    """
+    waveform = await asyncio.to_thread(_load_columnar, waveform_id)
+    return Response(
+        content=json.dumps(waveform.describe()),
+        media_type="application/json",
+        headers={"Cache-Control": WAVEFORM_CACHE_CONTROL},
+    )
+
+
+@router.get("/waveforms/{waveform_id}/window")
+async def get_waveform_window(
+    waveform_id: str,
+    start: int = Query(0, ge=0),
+    end: Optional[int] = Query(None, ge=0),
+    points: int = Query(2000, ge=1, le=WINDOW_MAX_POINTS),
+    signals: Optional[str] = None,
+):
+    """
+    Get the value changes of a VCD payload between two times, downsampled
+    to at most `points` entries per signal.
+
+    Args:
+        start: First time of the window
+        end: Last time of the window (default: end of the waveform)
+        points: Width of the view; changes closer together than
+            (end - start) / points collapse into one entry
+        signals: Comma-separated signal names (default: all)
+    """
+    waveform = await asyncio.to_thread(_load_columnar, waveform_id)
+    if end is None:
+        end = waveform.end_time
+    if end < start:
+        raise HTTPException(status_code=400, detail="end is before start")
+    names = signals.split(",") if signals else None
+    resolution = max(1, math.ceil((end - start) / points))
+    try:
+        window = await asyncio.to_thread(waveform.window, start, end, resolution, names)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown signal: {e.args[0]}")
+    return Response(
+        content=json.dumps(window),
+        media_type="application/json",
+        headers={"Cache-Control": WAVEFORM_CACHE_CONTROL},
+    )
+
+
+def _validate_files(compile_request: CompileRequest) -> None:
+    """Reject requests missing the circuit or test file."""
     circuit_files = [
         f for f in compile_request.files.keys() if f.endswith(".ml") and f != "test.ml"
     ]
@@ -37,28 +283,67 @@ async def compile_code(request: Request, compile_request: CompileRequest):
     if "test.ml" not in compile_request.files:
         raise HTTPException(status_code=400, detail="Missing required file: test.ml")
 
+
+def _waveform_ref(waveform_id, size) -> WaveformRef | None:
+    """Reference to a payload served by GET /waveforms/{id}."""
+    if waveform_id is None:
+        return None
+    return WaveformRef(id=waveform_id, size=size, url=f"/waveforms/{waveform_id}")
+
+
+def _diagnostics(diagnostics) -> list[Diagnostic] | None:
+    """Response models for a CompileResult's diagnostics."""
+    if not diagnostics:
+        return None
+    return [Diagnostic(**dataclasses.asdict(d)) for d in diagnostics]
+
+
+def _to_response(result) -> CompileResponse:
+    """Convert a CompileResult into the API response model."""
+    return CompileResponse(
+        success=result.success,
+        output=result.output,
+        waveform=result.waveform,
+        waveform_vcd=result.waveform_vcd,
+        error_type=result.error_type,
+        error_message=result.error_message,
+        stage=result.stage,
+        compile_time_ms=result.compile_time_ms,
+        run_time_ms=result.run_time_ms,
+        tests_passed=result.tests_passed,
+        tests_failed=result.tests_failed,
+        queue_wait_ms=result.queue_wait_ms,
+        queue_depth=result.queue_depth,
+        waveform_ref=_waveform_ref(result.waveform_id, result.waveform_size),
+        waveform_vcd_ref=_waveform_ref(result.waveform_vcd_id, result.waveform_vcd_size),
+        diagnostics=_diagnostics(result.diagnostics),
+    )
+
+
+@router.post("/compile", response_model=CompileResponse)
+@limiter.limit(f"{RATE_LIMIT_PER_MINUTE}/minute")
+async def compile_code(request: Request, compile_request: CompileRequest):
+    """Compile and run Hardcaml code."""
+    # Lazy import to avoid loading compiler module at startup
+    from compiler import compile_and_run_async
+
+    _validate_files(compile_request)
+
     try:
         # Use environment variable timeout, but allow request to override if it's less
         timeout = min(compile_request.timeout_seconds, COMPILE_TIMEOUT_SECONDS)
-        result = compile_and_run(
+        # Builds wait for a worker slot; BuildQueueFullError becomes a 503
+        result = await compile_and_run_async(
             files=compile_request.files,
             timeout_seconds=timeout,
             include_vcd=compile_request.include_vcd,
             session_id=compile_request.session_id,
+            mode=compile_request.mode,
+            inline_vcd=compile_request.inline_vcd,
         )
-        return CompileResponse(
-            success=result.success,
-            output=result.output,
-            waveform=result.waveform,
-            waveform_vcd=result.waveform_vcd,
-            error_type=result.error_type,
-            error_message=result.error_message,
-            stage=result.stage,
-            compile_time_ms=result.compile_time_ms,
-            run_time_ms=result.run_time_ms,
-            tests_passed=result.tests_passed,
-            tests_failed=result.tests_failed,
-        )
+        return _to_response(result)
+    except BuildQueueFullError:
+        raise
     except Exception as e:
         return CompileResponse(
             success=False,
@@ -66,3 +351,109 @@ async def compile_code(request: Request, compile_request: CompileRequest):
             error_message=str(e),
             stage="unknown",
         )
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/compile/stream")
+@limiter.limit(f"{RATE_LIMIT_PER_MINUTE}/minute")
+async def compile_code_stream(request: Request, compile_request: CompileRequest):
+    """
+    Compile and run Hardcaml code, streaming progress as server-sent events.
+
+    Events, in order: queued, started, workspace_ready, dune_started, then
+    compile_error as dune prints it, compiled once the sources compiled,
+    test / summary as the tests print them, then result (the
+    CompileResponse without waveforms), waveform_chunk events, and done.
+    Cache hits skip straight from cache_hit to result; requests that join an
+    identical build already in flight get coalesced, then that build's
+    remaining events. If the build queue
+    is full a single error event is sent instead.
+    """
+    from compiler import compile_and_run_async
+
+    _validate_files(compile_request)
+
+    timeout = min(compile_request.timeout_seconds, COMPILE_TIMEOUT_SECONDS)
+    events: asyncio.Queue[tuple[str, object]] = asyncio.Queue()
+
+    def on_progress(event: str, data: dict) -> None:
+        events.put_nowait((event, data))
+
+    async def build() -> None:
+        try:
+            result = await compile_and_run_async(
+                files=compile_request.files,
+                timeout_seconds=timeout,
+                include_vcd=compile_request.include_vcd,
+                session_id=compile_request.session_id,
+                mode=compile_request.mode,
+                on_progress=on_progress,
+                inline_vcd=compile_request.inline_vcd,
+            )
+            events.put_nowait(("__result__", _to_response(result)))
+        except BuildQueueFullError as e:
+            events.put_nowait(
+                (
+                    "__error__",
+                    {
+                        "success": False,
+                        "error_type": "server_busy",
+                        "error_message": str(e),
+                        "retry_after": e.retry_after,
+                    },
+                )
+            )
+        except Exception as e:
+            events.put_nowait(
+                (
+                    "__result__",
+                    CompileResponse(
+                        success=False,
+                        error_type="internal_error",
+                        error_message=str(e),
+                        stage="unknown",
+                    ),
+                )
+            )
+
+    async def stream() -> AsyncIterator[str]:
+        task = asyncio.create_task(build())
+        try:
+            while True:
+                event, data = await events.get()
+                if event == "__error__":
+                    yield _sse("error", data)
+                    return
+                if event == "__result__":
+                    break
+                yield _sse(event, data)
+
+            response: CompileResponse = data
+            yield _sse(
+                "result",
+                response.model_dump(exclude={"waveform", "waveform_vcd"}),
+            )
+            for kind in ("waveform", "waveform_vcd"):
+                text = getattr(response, kind)
+                if not text:
+                    continue
+                for offset in range(0, len(text), STREAM_CHUNK_SIZE):
+                    yield _sse(
+                        "waveform_chunk",
+                        {"kind": kind, "data": text[offset : offset + STREAM_CHUNK_SIZE]},
+                    )
+            yield _sse("done", {})
+        finally:
+            # Client went away mid-build: cancelling kills the dune process group
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,5 +1,7 @@
 """Pydantic request/response schemas for the API."""
 
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
@@ -21,6 +23,45 @@ class CompileRequest(BaseModel):
         default=None,
         description="Browser session ID for workspace caching (enables fast incremental builds)",
     )
+    inline_vcd: bool = Field(
+        default=True,
+        description="Include the VCD text in the response; if false, fetch it from waveform_vcd_ref.url",
+    )
+    mode: Literal["check", "build", "test"] = Field(
+        default="test",
+        description=(
+            "check: type-check only (dune @check); build: also compile and link; "
+            "test: build and run the tests. check and build return diagnostics "
+            "but no test output or waveforms"
+        ),
+    )
+
+
+class WaveformRef(BaseModel):
+    """A waveform or VCD payload served by GET /waveforms/{id}."""
+
+    # sha256 of the payload; also its ETag
+    id: str
+    # Uncompressed size in bytes
+    size: int
+    url: str
+
+
+class Diagnostic(BaseModel):
+    """A compiler error, warning or alert at a source location."""
+
+    file: str
+    line: int
+    end_line: int
+    # 0-based columns on line and end_line, end exclusive; None if not given
+    column: int | None = None
+    end_column: int | None = None
+    # "error", "warning" or "alert"
+    severity: str
+    message: str
+    # unbound_error, syntax_error, type_error or compile_error for errors;
+    # "warning" or "alert" otherwise
+    error_class: str
 
 
 class CompileResponse(BaseModel):
@@ -37,3 +78,9 @@ class CompileResponse(BaseModel):
     run_time_ms: int | None = None
     tests_passed: int | None = None
     tests_failed: int | None = None
+    queue_wait_ms: int | None = None
+    queue_depth: int | None = None
+    waveform_ref: WaveformRef | None = None
+    waveform_vcd_ref: WaveformRef | None = None
+    # Distinct compiler diagnostics, in the order dune printed them
+    diagnostics: list[Diagnostic] | None = None
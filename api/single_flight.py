@@ -0,0 +1,188 @@
+"""
+Coalescing of identical concurrent builds.
+
+When a class clicks Run on the same example at once, every request misses
+the result cache, because it is only filled when the first build finishes.
+SingleFlight runs one build per key and lets later identical requests wait
+for it instead of starting their own.
+
+The build runs as its own task, so a waiter going away (client disconnect,
+timeout) doesn't cancel it for the others; it is only cancelled once nobody
+is waiting for it any more.
+"""
+
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Hashable, Optional, TypeVar
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ProgressCallback = Callable[[str, dict], None]
+
+
+@dataclass
+class _Flight:
+    """A build in progress and the callers waiting for it."""
+
+    task: asyncio.Task
+    loop: asyncio.AbstractEventLoop
+    # Longest the build itself may take (None: unbounded)
+    timeout: Optional[float]
+    listeners: list[ProgressCallback] = field(default_factory=list)
+    waiters: int = 0
+    # The last waiter left and the task was cancelled; it only becomes
+    # done() on the loop's next iteration, so don't join it meanwhile
+    abandoned: bool = False
+
+
+class SingleFlight:
+    """At most one in-flight build per key; identical callers share its result."""
+
+    def __init__(self):
+        self._flights: dict[Hashable, _Flight] = {}
+        # Flights may be started from several event loops (the blocking
+        # compile_and_run wrapper runs one per call)
+        self._lock = threading.Lock()
+        self._started = 0
+        self._joined = 0
+        self._wait_timeouts = 0
+
+    async def run(
+        self,
+        key: Hashable,
+        start: Callable[[ProgressCallback], Awaitable[T]],
+        join_keys: Optional[list[Hashable]] = None,
+        progress: Optional[ProgressCallback] = None,
+        timeout: Optional[float] = None,
+    ) -> T:
+        """
+        Run start() unless an equivalent build is already in flight, and wait for it.
+
+        Args:
+            key: Key to register a new build under
+            start: Starts the build; receives a progress callback that fans
+                out to every waiter
+            join_keys: Keys of in-flight builds whose result also answers this
+                call, in order of preference (default: [key])
+            progress: Optional progress callback for this caller. A caller that
+                joins a build gets a "coalesced" event, then the events that
+                build reports from then on.
+            timeout: How long this caller allows the build to take. Joining a
+                build that allows itself longer waits at most this long.
+
+        Raises:
+            asyncio.TimeoutError: if a joined build outlasted timeout. The
+                build keeps running for the other waiters.
+            Whatever the build raised.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            flight = None
+            for candidate in join_keys or [key]:
+                found = self._flights.get(candidate)
+                if (
+                    found is not None
+                    and found.loop is loop
+                    and not found.abandoned
+                    and not found.task.done()
+                ):
+                    flight = found
+                    break
+            joined = flight is not None
+            if joined:
+                self._joined += 1
+            else:
+                listeners: list[ProgressCallback] = []
+
+                def fan_out(event: str, data: dict) -> None:
+                    for listener in list(listeners):
+                        listener(event, data)
+
+                flight = _Flight(
+                    task=loop.create_task(start(fan_out)),
+                    loop=loop,
+                    timeout=timeout,
+                    listeners=listeners,
+                )
+                self._flights[key] = flight
+                flight.task.add_done_callback(
+                    lambda _, flight=flight: self._finish(key, flight)
+                )
+                self._started += 1
+            flight.waiters += 1
+            if progress is not None:
+                flight.listeners.append(progress)
+
+        if joined:
+            log.info(f"[single-flight] Joined in-flight build ({flight.waiters} waiting)")
+            if progress is not None:
+                progress("coalesced", {"waiters": flight.waiters})
+
+        # Only a joined build can run longer than this caller allows; a
+        # build we started enforces our timeout itself
+        wait_timeout = None
+        if joined and timeout is not None:
+            if flight.timeout is None or flight.timeout > timeout:
+                wait_timeout = timeout
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight.task), wait_timeout)
+        except asyncio.TimeoutError:
+            if flight.task.done():
+                raise
+            with self._lock:
+                self._wait_timeouts += 1
+            raise
+        finally:
+            self._leave(flight, progress)
+
+    def _leave(self, flight: _Flight, progress: Optional[ProgressCallback]) -> None:
+        """Stop waiting for a flight, cancelling it if nobody else is."""
+        with self._lock:
+            flight.waiters -= 1
+            if progress is not None and progress in flight.listeners:
+                flight.listeners.remove(progress)
+            if flight.waiters == 0 and not flight.task.done():
+                flight.abandoned = True
+            abandoned = flight.abandoned
+        if abandoned:
+            log.info("[single-flight] Cancelling build nobody is waiting for")
+            flight.task.cancel()
+
+    def _finish(self, key: Hashable, flight: _Flight) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        if not flight.task.cancelled():
+            # Retrieve the exception so an unawaited failure isn't logged as such
+            flight.task.exception()
+
+    def get_stats(self) -> dict:
+        """Get coalescing statistics."""
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "waiting": sum(f.waiters for f in self._flights.values()),
+                "started": self._started,
+                "joined": self._joined,
+                "wait_timeouts": self._wait_timeouts,
+            }
+
+
+# Global singleton instance
+_flight_instance: Optional[SingleFlight] = None
+_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Get the global build coalescer."""
+    global _flight_instance
+    if _flight_instance is None:
+        with _flight_lock:
+            if _flight_instance is None:
+                _flight_instance = SingleFlight()
+    return _flight_instance
@@ -0,0 +1,121 @@
+"""
+Canonical form of submitted sources, for result-cache keys.
+
+Two submissions that differ only in line endings or trailing whitespace
+build identically, but hash differently. This module rewrites them into a
+canonical form before hashing:
+
+- CRLF line endings become LF (OCaml's lexer does the same inside string
+  literals, so literal values are unchanged)
+- trailing spaces and tabs are removed, except inside string literals and
+  quoted strings ({|...|}, {id|...|id}), which is where expect-test output
+  lives and where whitespace matters; the whitespace before the end of the
+  file is kept, since it decides where end-of-file errors are reported
+- files the build never sees are dropped (only .ml, .mli and input.txt are
+  written to the workspace); input.txt is data and is kept byte for byte
+- optionally, comments are removed (newlines inside them are kept so line
+  numbers don't move)
+
+No step adds or removes lines, so diagnostics cached under a normalized key
+point at the same locations for every submission sharing that key.
+"""
+
+import re
+
+# Files written into the workspace (see workspace_cache.write_workspace_files)
+SOURCE_SUFFIXES = (".ml", ".mli")
+DATA_FILES = ("input.txt",)
+
+_TOKEN = re.compile(
+    r"""
+    (?P<string>"(?:[^"\\]|\\.)*")
+    | (?P<quoted>\{(?P<qid>[a-z_]*)\|.*?\|(?P=qid)\})
+    | (?P<quoted_ext>\{%%?[A-Za-z_][\w.]*\|.*?\|\})
+    | (?P<quoted_ext_id>\{%%?[A-Za-z_][\w.]*[ \t\n]+(?P<eid>[a-z_]*)\|.*?\|(?P=eid)\})
+    | (?P<char>'(?:[^\\'\n]|\\(?:[\\'"ntbr ]|[0-9]{3}|x[0-9a-fA-F]{2}|o[0-7]{3}))')
+    | (?P<open>\(\*)
+    | (?P<close>\*\))
+    | (?P<other>[^"{'(*]+|.)
+    """,
+    re.S | re.X,
+)
+
+_LITERALS = ("string", "quoted", "quoted_ext", "quoted_ext_id", "char")
+_TRAILING_WS = re.compile(r"[ \t]+(?=\n)")
+
+
+def normalize_ocaml(text: str, strip_comments: bool = False) -> str:
+    """
+    Canonicalize OCaml source without changing what it compiles to.
+
+    Args:
+        text: Source file contents
+        strip_comments: Also remove comments (keeps their newlines)
+
+    Returns:
+        Normalized source text.
+    """
+    text = text.replace("\r\n", "\n")
+
+    # Pieces of output; literal text is protected from whitespace stripping
+    pieces: list[tuple[str, bool]] = []
+    depth = 0
+    comment: list[str] = []
+    for match in _TOKEN.finditer(text):
+        kind = match.lastgroup
+        token = match.group()
+        if kind == "open":
+            depth += 1
+        elif kind == "close" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                comment.append(token)
+                body = "".join(comment)
+                comment = []
+                if strip_comments:
+                    pieces.append(("\n" * body.count("\n") or " ", False))
+                else:
+                    pieces.append((body, False))
+                continue
+        if depth > 0:
+            comment.append(token)
+        else:
+            pieces.append((token, kind in _LITERALS))
+    if comment:
+        # Unterminated comment: a compile error either way, keep it as is
+        pieces.append(("".join(comment), False))
+
+    out: list[str] = []
+    run: list[str] = []
+    for piece, protected in pieces:
+        if protected:
+            out.append(_TRAILING_WS.sub("", "".join(run)))
+            run = []
+            out.append(piece)
+        else:
+            run.append(piece)
+    out.append(_TRAILING_WS.sub("", "".join(run)))
+
+    return "".join(out)
+
+
+def normalize_files(
+    files: dict[str, str], strip_comments: bool = False
+) -> dict[str, str]:
+    """
+    Canonicalize a submission for hashing.
+
+    Args:
+        files: Filename to contents
+        strip_comments: Also remove comments from OCaml sources
+
+    Returns:
+        The files the build uses, with OCaml sources normalized.
+    """
+    normalized = {}
+    for name, content in files.items():
+        if name in DATA_FILES:
+            normalized[name] = content
+        elif name.endswith(SOURCE_SUFFIXES):
+            normalized[name] = normalize_ocaml(content, strip_comments)
+    return normalized
@@ -1,5 +1,73 @@
 """Pytest configuration - runs before any test imports."""
 
 import os
+import stat
+import sys
+import textwrap
+
+import pytest
 
 os.environ["RATE_LIMIT_PER_MINUTE"] = "2"
+# Tests create workspaces on demand; no background warm-up builds
+os.environ["WORKSPACE_POOL_SIZE"] = "0"
+# Keep result caching in memory so test runs don't see each other's results
+os.environ["RESULT_STORE_PATH"] = ""
+
+# Stand-in for `dune build`, for tests that exercise the compile pipeline
+# without an OCaml toolchain. It replays the user's files as dune output:
+# - if circuit.ml contains a `File "` line, circuit.ml is printed to stderr
+#   and the build fails (a compile error)
+# - if circuit.ml contains DUNE_CRASH, the build fails without compiler
+#   errors (as when dune is killed)
+# - otherwise the build succeeds, and for @runtest test.ml is printed to
+#   stdout and circuit.ml written into $HARDCAML_VCD_PATH when VCD output is
+#   requested (unless circuit.ml contains NO_VCD); other targets print nothing.
+# $FAKE_DUNE_SLEEP makes each build take that many seconds, and each build
+# appends its arguments ("build @runtest") to $FAKE_DUNE_LOG, if set.
+FAKE_DUNE = textwrap.dedent(
+    """\
+    #!{python}
+    import os
+    import pathlib
+    import sys
+    import time
+
+    if os.environ.get("FAKE_DUNE_LOG"):
+        with open(os.environ["FAKE_DUNE_LOG"], "a") as log:
+            log.write(" ".join(sys.argv[1:]) + "\\n")
+    time.sleep(float(os.environ.get("FAKE_DUNE_SLEEP", "0")))
+
+    circuit = pathlib.Path("circuit.ml").read_text()
+    if "DUNE_CRASH" in circuit:
+        sys.stderr.write("Killed\\n")
+        sys.exit(137)
+    if 'File "' in circuit:
+        sys.stderr.write(circuit)
+        sys.exit(1)
+    if "@runtest" not in sys.argv:
+        sys.exit(0)
+    sys.stdout.write(pathlib.Path("test.ml").read_text())
+    vcd_path = os.environ.get("HARDCAML_VCD_PATH")
+    if vcd_path and "NO_VCD" not in circuit:
+        pathlib.Path(vcd_path).write_text("$comment " + circuit + " $end\\n")
+    """
+)
+
+
+@pytest.fixture
+def fake_dune(tmp_path, monkeypatch):
+    """Put a fake `dune` executable first on PATH and reset the result cache."""
+    from command_runner import OPAM_BIN
+    from result_cache import get_result_cache
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    dune = bin_dir / "dune"
+    dune.write_text(FAKE_DUNE.format(python=sys.executable))
+    dune.chmod(dune.stat().st_mode | stat.S_IEXEC)
+    # Include OPAM_BIN after the fake so the runner does not put real dune first
+    monkeypatch.setenv("PATH", f"{bin_dir}:{OPAM_BIN}:{os.environ.get('PATH', '')}")
+
+    get_result_cache().clear()
+    yield dune
+    get_result_cache().clear()
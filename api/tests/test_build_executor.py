@@ -0,0 +1,151 @@
+"""Tests for the bounded build executor."""
+
+import asyncio
+import inspect
+import threading
+import time
+
+import pytest
+from build_executor import BuildExecutor, BuildQueueFullError
+
+
+@pytest.fixture
+def executor():
+    """Create a small executor (1 worker, 1 queue slot) for testing."""
+    return BuildExecutor(workers=1, queue_size=1, retry_after=3)
+
+
+async def run(executor, fn, *args, **kwargs):
+    """Run a build in a worker slot, as compile_and_run does."""
+    async with executor.slot() as ticket:
+        if inspect.iscoroutinefunction(fn):
+            result = await fn(*args, **kwargs)
+        else:
+            result = await asyncio.to_thread(fn, *args, **kwargs)
+    return result, ticket
+
+
+def test_run_returns_result_and_ticket(executor):
+    """Test that a build runs on a worker and returns its result."""
+
+    async def main():
+        return await run(executor, lambda a, b=0: a + b, 1, b=2)
+
+    result, ticket = asyncio.run(main())
+
+    assert result == 3
+    assert ticket.queue_depth == 0
+    assert ticket.wait_ms >= 0
+    assert executor.get_stats()["completed"] == 1
+
+
+def test_event_loop_not_blocked(executor):
+    """Test that other coroutines keep running while a build is in progress."""
+    release = threading.Event()
+
+    async def main():
+        build = asyncio.create_task(run(executor, release.wait, 5))
+        # The loop must still schedule other work while the build blocks
+        t0 = time.time()
+        await asyncio.sleep(0.05)
+        elapsed = time.time() - t0
+        release.set()
+        await build
+        return elapsed
+
+    assert asyncio.run(main()) < 1
+
+
+def test_rejects_when_queue_full(executor):
+    """Test that builds beyond workers + queue_size are rejected."""
+    release = threading.Event()
+
+    async def main():
+        running = asyncio.create_task(run(executor, release.wait, 5))
+        queued = asyncio.create_task(run(executor, lambda: "queued"))
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(BuildQueueFullError) as exc_info:
+            await run(executor, lambda: "rejected")
+
+        release.set()
+        await running
+        result, ticket = await queued
+        return exc_info.value, result, ticket
+
+    error, result, ticket = asyncio.run(main())
+
+    assert error.retry_after == 3
+    assert error.queue_depth == 1
+    assert result == "queued"
+    assert ticket.queue_depth == 1
+    assert ticket.wait_ms > 0
+    assert executor.get_stats()["rejected"] == 1
+
+
+def test_stats_reflect_running_builds(executor):
+    """Test that stats report running and waiting builds."""
+    started = threading.Event()
+    release = threading.Event()
+
+    def build():
+        started.set()
+        release.wait(5)
+
+    async def main():
+        task = asyncio.create_task(run(executor, build))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        stats = executor.get_stats()
+        release.set()
+        await task
+        return stats
+
+    stats = asyncio.run(main())
+
+    assert stats["running"] == 1
+    assert stats["waiting"] == 0
+    assert executor.get_stats()["running"] == 0
+
+
+def test_coroutine_builds_share_worker_slots(executor):
+    """Test that coroutine builds hold a slot and queue in FIFO order."""
+    order = []
+
+    async def build(name):
+        order.append(f"start {name}")
+        await asyncio.sleep(0.02)
+        order.append(f"end {name}")
+        return name
+
+    async def main():
+        first = asyncio.create_task(run(executor, build, "a"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(run(executor, build, "b"))
+        return await first, await second
+
+    (a, _), (b, ticket_b) = asyncio.run(main())
+
+    assert (a, b) == ("a", "b")
+    # Only one worker: the second build starts after the first one ends
+    assert order == ["start a", "end a", "start b", "end b"]
+    assert ticket_b.wait_ms > 0
+
+
+def test_cancelled_waiter_releases_queue_slot(executor):
+    """Test that a build cancelled while queued gives its place back."""
+    release = threading.Event()
+
+    async def main():
+        running = asyncio.create_task(run(executor, release.wait, 5))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(run(executor, lambda: "never"))
+        await asyncio.sleep(0.01)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        waiting = executor.get_stats()["waiting"]
+        release.set()
+        await running
+        return waiting
+
+    assert asyncio.run(main()) == 0
+    assert executor.get_stats()["running"] == 0
@@ -0,0 +1,106 @@
+"""Tests for check/build/test request modes."""
+
+from app import app
+from compiler import compile_and_run
+from fastapi.testclient import TestClient
+from rate_limit import limiter
+
+FILES = {"circuit.ml": "let x = 1", "test.ml": "PASS: one\n"}
+
+COMPILE_ERROR = 'File "circuit.ml", line 1, characters 8-11:\nError: Unbound value foo\n'
+
+
+def test_check_runs_only_the_check_target(fake_dune, tmp_path, monkeypatch):
+    """Test that check mode type-checks without running tests or writing a VCD."""
+    log = tmp_path / "dune.log"
+    monkeypatch.setenv("FAKE_DUNE_LOG", str(log))
+
+    result = compile_and_run(FILES, timeout_seconds=10, include_vcd=True, mode="check")
+
+    assert result.success
+    assert result.output is None and result.tests_passed is None
+    assert result.waveform_vcd is None and result.waveform_vcd_id is None
+    assert log.read_text() == "build @check\n"
+
+
+def test_modes_cached_separately(fake_dune, tmp_path, monkeypatch):
+    """Test that a check result never answers a test request, and is itself cached."""
+    log = tmp_path / "dune.log"
+    monkeypatch.setenv("FAKE_DUNE_LOG", str(log))
+
+    compile_and_run(FILES, timeout_seconds=10, mode="check")
+    tested = compile_and_run(FILES, timeout_seconds=10, mode="test")
+    checked = compile_and_run(FILES, timeout_seconds=10, mode="check")
+
+    assert tested.output == "PASS: one"
+    assert checked.output is None
+    assert log.read_text().split("\n") == ["build @check", "build @all", "build @runtest", ""]
+
+
+def test_test_mode_times_compile_and_run_separately(fake_dune, tmp_path, monkeypatch):
+    """Test that a test build compiles, then runs the tests, and times each."""
+    log = tmp_path / "dune.log"
+    monkeypatch.setenv("FAKE_DUNE_LOG", str(log))
+    monkeypatch.setenv("FAKE_DUNE_SLEEP", "0.1")
+
+    result = compile_and_run(FILES, timeout_seconds=10)
+
+    assert result.success and result.output == "PASS: one"
+    assert result.compile_time_ms >= 100 and result.run_time_ms >= 100
+    assert log.read_text() == "build @all\nbuild @runtest\n"
+
+
+def test_compile_failure_cached_regardless_of_input(fake_dune, tmp_path, monkeypatch):
+    """Test that a compile failure answers later builds that change only input.txt."""
+    log = tmp_path / "dune.log"
+    monkeypatch.setenv("FAKE_DUNE_LOG", str(log))
+    broken = {"circuit.ml": COMPILE_ERROR, "test.ml": "PASS: one"}
+
+    first = compile_and_run({**broken, "input.txt": "1"}, timeout_seconds=10)
+    second = compile_and_run({**broken, "input.txt": "2"}, timeout_seconds=10)
+    # Sources that compile still run the tests for every input
+    compile_and_run({**FILES, "input.txt": "1"}, timeout_seconds=10)
+    compile_and_run({**FILES, "input.txt": "2"}, timeout_seconds=10)
+
+    assert (first.stage, first.error_type, first.run_time_ms) == ("compile", "unbound_error", None)
+    assert second.error_message == first.error_message
+    assert second.compile_time_ms == 0
+    assert log.read_text().count("build @all") == 3
+    assert log.read_text().count("build @runtest") == 2
+
+
+def test_failed_build_without_errors_not_cached(fake_dune, tmp_path, monkeypatch):
+    """Test that a build that fails without compiler errors is an uncached internal error."""
+    log = tmp_path / "dune.log"
+    monkeypatch.setenv("FAKE_DUNE_LOG", str(log))
+    crashed = {"circuit.ml": "let x = 1 (* DUNE_CRASH *)", "test.ml": "PASS: one"}
+
+    first = compile_and_run({**crashed, "input.txt": "1"}, timeout_seconds=10)
+    second = compile_and_run({**crashed, "input.txt": "2"}, timeout_seconds=10)
+    again = compile_and_run({**crashed, "input.txt": "2"}, timeout_seconds=10)
+
+    assert (first.error_type, first.error_message) == ("internal_error", "Killed")
+    assert second.error_type == again.error_type == "internal_error"
+    assert again.compile_time_ms > 0
+    assert log.read_text().count("build @all") == 3
+
+
+def test_check_request_returns_diagnostics(fake_dune):
+    """Test that /compile with mode=check reports compile errors as diagnostics."""
+    limiter.reset()
+    with TestClient(app) as client:
+        response = client.post(
+            "/compile",
+            json={
+                "files": {"circuit.ml": COMPILE_ERROR, "test.ml": "PASS: one"},
+                "mode": "check",
+            },
+        )
+
+    result = response.json()
+    assert response.status_code == 200
+    assert (result["success"], result["stage"]) == (False, "compile")
+    assert result["error_type"] == "unbound_error"
+    assert [(d["file"], d["line"], d["message"]) for d in result["diagnostics"]] == [
+        ("circuit.ml", 1, "Unbound value foo")
+    ]
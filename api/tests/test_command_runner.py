@@ -0,0 +1,100 @@
+"""Tests for the asyncio subprocess runner."""
+
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from command_runner import run_command_async
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_captures_stdout_and_stderr(tmp_path):
+    """Test that both streams are captured with the exit code."""
+    result = run(
+        run_command_async(
+            ["sh", "-c", "echo out; echo err >&2; exit 3"], cwd=tmp_path, timeout=10
+        )
+    )
+
+    assert result.returncode == 3
+    assert result.stdout == "out"
+    assert result.stderr == "err"
+    assert not result.timed_out
+
+
+def test_lines_streamed_to_callback(tmp_path):
+    """Test that every line reaches the callback tagged with its stream."""
+    seen = []
+    run(
+        run_command_async(
+            ["sh", "-c", "echo a; echo b >&2; printf c"],
+            cwd=tmp_path,
+            timeout=10,
+            on_line=lambda line, stream: seen.append((stream, line)),
+        )
+    )
+
+    assert sorted(seen) == [("stderr", "b"), ("stdout", "a"), ("stdout", "c")]
+
+
+def test_output_is_capped(tmp_path):
+    """Test that retained output stops at the cap but lines are still streamed."""
+    seen = []
+    result = run(
+        run_command_async(
+            [sys.executable, "-c", "for i in range(1000): print('x' * 99)"],
+            cwd=tmp_path,
+            timeout=10,
+            on_line=lambda line, stream: seen.append(line),
+            max_output_bytes=1000,
+        )
+    )
+
+    assert result.truncated
+    assert len(result.stdout) < 1200
+    assert "output truncated" in result.stdout
+    assert len(seen) == 1000
+
+
+def test_timeout_kills_process_group(tmp_path):
+    """Test that a timeout kills the command and the processes it spawned."""
+    pid_file = tmp_path / "child.pid"
+    t0 = time.time()
+    result = run(
+        run_command_async(
+            ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"],
+            cwd=tmp_path,
+            timeout=1,
+        )
+    )
+
+    assert time.time() - t0 < 10
+    assert result.timed_out
+    assert result.returncode == -1
+    assert "timed out" in result.stderr
+
+    child_pid = int(Path(pid_file).read_text())
+    time.sleep(0.1)
+    try:
+        os.kill(child_pid, 0)
+        child_alive = Path(f"/proc/{child_pid}").exists() and "Z" not in (
+            Path(f"/proc/{child_pid}/stat").read_text().split()[2]
+        )
+    except ProcessLookupError:
+        child_alive = False
+    assert not child_alive
+
+
+def test_missing_command(tmp_path):
+    """Test that a missing executable is reported as a failed command."""
+    result = run(
+        run_command_async(["definitely-not-a-command"], cwd=tmp_path, timeout=5)
+    )
+
+    assert result.returncode == -1
+    assert result.stderr
@@ -0,0 +1,126 @@
+"""Tests for the streaming compile endpoint."""
+
+import json
+
+import pytest
+from app import app
+from fastapi.testclient import TestClient
+from rate_limit import limiter
+
+PASSING_TEST = "\n".join(
+    [
+        "PASS: first",
+        "FAIL: second",
+        "===WAVEFORM_START===",
+        "clock  _-_-_-",
+        "===WAVEFORM_END===",
+        "===TEST_SUMMARY===",
+        "TESTS: 1 passed, 1 failed",
+    ]
+)
+
+COMPILE_ERROR = "\n".join(
+    [
+        'File "circuit.ml", line 1, characters 8-11:',
+        "1 | let x = foo",
+        "            ^^^",
+        "Error: Unbound value foo",
+    ]
+)
+
+
+@pytest.fixture(scope="function")
+def client():
+    """Create a fresh test client with rate limit state reset."""
+    limiter.reset()
+    with TestClient(app, raise_server_exceptions=False) as client:
+        yield client
+
+
+def read_events(response) -> list[tuple[str, dict]]:
+    """Parse a text/event-stream body into (event, data) pairs."""
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_reports_stages_in_order(client: TestClient, fake_dune):
+    """Test that progress events arrive in pipeline order before the result."""
+    response = client.post(
+        "/compile/stream",
+        json={
+            "files": {
+                "circuit.ml": "let x = 1 (* stream order *)",
+                "test.ml": PASSING_TEST,
+            },
+            "timeout_seconds": 10,
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = read_events(response)
+    names = [name for name, _ in events]
+
+    assert names[:4] == ["queued", "started", "workspace_ready", "dune_started"]
+    assert [data["line"] for name, data in events if name == "test"] == [
+        "PASS: first",
+        "FAIL: second",
+    ]
+    assert ("summary", {"passed": 1, "failed": 1}) in events
+    assert names.index("summary") < names.index("result")
+
+    result = dict(events)["result"]
+    assert result["tests_failed"] == 1
+    assert "waveform" not in result
+    waveform = "".join(
+        data["data"]
+        for name, data in events
+        if name == "waveform_chunk" and data["kind"] == "waveform"
+    )
+    assert waveform == "clock  _-_-_-"
+    assert names[-1] == "done"
+
+
+def test_stream_reports_first_compile_error(client: TestClient, fake_dune):
+    """Test that the first compiler error is sent as its own event."""
+    response = client.post(
+        "/compile/stream",
+        json={
+            "files": {"circuit.ml": COMPILE_ERROR, "test.ml": PASSING_TEST},
+            "timeout_seconds": 10,
+        },
+    )
+
+    events = read_events(response)
+    errors = [data["message"] for name, data in events if name == "compile_error"]
+
+    assert errors == [COMPILE_ERROR]
+    result = dict(events)["result"]
+    assert result["success"] is False
+    assert result["stage"] == "compile"
+    assert result["error_type"] == "unbound_error"
+    assert result["error_message"] == COMPILE_ERROR
+    assert result["diagnostics"] == [
+        {
+            "file": "circuit.ml",
+            "line": 1,
+            "end_line": 1,
+            "column": 8,
+            "end_column": 11,
+            "severity": "error",
+            "message": "Unbound value foo",
+            "error_class": "unbound_error",
+        }
+    ]
+
+
+def test_stream_rejects_missing_test_file(client: TestClient):
+    """Test that validation errors are returned before streaming starts."""
+    response = client.post(
+        "/compile/stream", json={"files": {"circuit.ml": "let x = 1"}}
+    )
+
+    assert response.status_code == 400
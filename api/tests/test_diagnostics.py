@@ -0,0 +1,94 @@
+"""Tests for structured compiler diagnostics."""
+
+from compiler import parse_error
+from diagnostics import Diagnostic, DiagnosticsParser
+
+UNBOUND = [
+    'File "circuit.ml", line 3, characters 8-11:',
+    "3 | let x = foo",
+    "            ^^^",
+    "Error: Unbound value foo",
+]
+
+STDERR = [
+    "File \"dune\", line 1, characters 0-0:",
+    *UNBOUND,
+    'File "test.ml", lines 4-6, characters 2-9:',
+    "4 | ..",
+    "Error: This expression has type int",
+    "       but an expression was expected of type bool",
+    # dune repeats errors it hit for several targets
+    *UNBOUND,
+    'File "circuit.ml", line 7, characters 4-5:',
+    "Error (warning 32 [unused-value-declaration]): unused value y.",
+    'File "circuit.ml", line 9:',
+    "Alert deprecated: Foo.bar",
+    "Hint: use baz",
+    "Done: 120/121 (jobs: 1)",
+]
+
+
+def parse(lines: list[str]) -> DiagnosticsParser:
+    parser = DiagnosticsParser()
+    for line in lines:
+        parser.feed(line)
+    parser.finish()
+    return parser
+
+
+def test_locations_severities_and_classes():
+    """Test that each block becomes one record with its location and class."""
+    parser = parse(STDERR)
+
+    assert parser.diagnostics == [
+        Diagnostic("circuit.ml", 3, 3, 8, 11, "error", "Unbound value foo", "unbound_error"),
+        Diagnostic(
+            "test.ml",
+            4,
+            6,
+            2,
+            9,
+            "error",
+            "This expression has type int\nbut an expression was expected of type bool",
+            "type_error",
+        ),
+        Diagnostic(
+            "circuit.ml", 7, 7, 4, 5, "error", "unused value y.", "compile_error"
+        ),
+        Diagnostic("circuit.ml", 9, 9, None, None, "alert", "Foo.bar", "alert"),
+    ]
+
+
+def test_duplicates_removed_and_blocks_kept():
+    """Test that repeated blocks are dropped and the rest kept as printed."""
+    parser = parse(STDERR)
+
+    assert parser.duplicates == 1
+    assert parser.blocks[0] == "\n".join(UNBOUND)
+    assert parser.text().count("Unbound value foo") == 1
+    assert "Done:" not in parser.text() and "Hint:" not in parser.text()
+
+
+def test_cap_and_completion_on_next_line():
+    """Test the diagnostic cap, and that a block completes at its first unindented line."""
+    parser = DiagnosticsParser(max_diagnostics=1)
+    assert [parser.feed(line) for line in UNBOUND] == [None] * 4
+    completed = parser.feed('File "circuit.ml", line 5, characters 0-1:')
+    assert completed.message == "Unbound value foo"
+    parser.feed("Error: Syntax error")
+
+    assert parser.finish() is None
+    assert (len(parser.diagnostics), parser.dropped) == (1, 1)
+
+
+def test_parse_error_returns_deduplicated_diagnostics():
+    """Test that parse_error classifies by diagnostics and drops repeated text."""
+    error_type, message = parse_error("\n".join(UNBOUND + UNBOUND))
+
+    assert error_type == "unbound_error"
+    assert message == "\n".join(UNBOUND)
+    # Without recognizable blocks, fall back to the text
+    assert parse_error("Error: Unbound module Foo") == (
+        "unbound_error",
+        "Error: Unbound module Foo",
+    )
@@ -0,0 +1,56 @@
+"""Tests for the background dune cache statistics collector."""
+
+from dune_cache_stats import DuneCacheStats, scan_tree
+
+
+def test_scan_tree_counts_nested_files(tmp_path):
+    """Test that scan_tree sums sizes of files in nested directories."""
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "top.txt").write_text("x" * 10)
+    (tmp_path / "a" / "b" / "deep.txt").write_text("y" * 5)
+
+    assert scan_tree(tmp_path) == (15, 2)
+
+
+def test_refresh_tracks_growth(tmp_path):
+    """Test that successive scans report a growth rate."""
+    stats = DuneCacheStats(cache_root=tmp_path, interval_seconds=60)
+    (tmp_path / "one").write_text("x" * 100)
+
+    first = stats.refresh()
+    assert first.size_bytes == 100
+    assert first.file_count == 1
+    assert first.growth_bytes_per_second is None
+
+    (tmp_path / "two").write_text("x" * 100)
+    second = stats.refresh()
+    assert second.size_bytes == 200
+    assert second.growth_bytes_per_second > 0
+
+
+def test_missing_cache_root(tmp_path):
+    """Test that a missing cache directory reports zeros."""
+    stats = DuneCacheStats(cache_root=tmp_path / "missing")
+
+    snapshot = stats.refresh()
+
+    assert not snapshot.exists
+    assert snapshot.size_bytes == 0
+    assert stats.get_stats()["last_scan"]["file_count"] == 0
+
+
+def test_background_thread_scans(tmp_path):
+    """Test that start() performs a scan without blocking the caller."""
+    (tmp_path / "file").write_text("data")
+    stats = DuneCacheStats(cache_root=tmp_path, interval_seconds=60)
+
+    stats.start()
+    try:
+        for _ in range(100):
+            if stats.snapshot() is not None:
+                break
+            stats._stop.wait(0.01)
+    finally:
+        stats.stop()
+
+    assert stats.snapshot().size_bytes == 4
@@ -0,0 +1,86 @@
+"""Tests for the single-pass dune output parser."""
+
+from compiler import OutputParser, _merge_parsed, parse_error
+
+STDOUT = [
+    "+    PASS: first",
+    "|    FAIL: second",
+    "===WAVEFORM_START===",
+    "clock  _-_-_-",
+    "PASS: not a test line",
+    "===WAVEFORM_END===",
+    "===TEST_SUMMARY===",
+    "TESTS: 1 passed, 1 failed",
+]
+
+STDERR = [
+    'File "circuit.ml", line 1, characters 8-11:',
+    "1 | let x = foo",
+    "            ^^^",
+    "Error: This expression has type int",
+    "       but an expression was expected of type bool",
+    'File "circuit.ml", line 2:',
+    "Error: Unbound value foo",
+]
+
+
+def feed(parser: OutputParser, lines: list[str]) -> list:
+    return [parser.feed(line) for line in lines]
+
+
+def test_tests_summary_and_waveform():
+    """Test that markers, prefixes and test lines are handled in one pass."""
+    parser = OutputParser()
+
+    kinds = feed(parser, STDOUT)
+    parsed = parser.result()
+
+    assert kinds == ["test", "test", None, None, None, None, None, "summary"]
+    assert parsed.test_output == "PASS: first\nFAIL: second\nTESTS: 1 passed, 1 failed"
+    assert parsed.waveform == "clock  _-_-_-\nPASS: not a test line"
+    assert (parsed.tests_passed, parsed.tests_failed) == (1, 1)
+    assert not parsed.has_compile_error and not parsed.truncated
+
+
+def test_compile_errors():
+    """Test that the first error block and the error kind come out of the stream."""
+    parser = OutputParser(compile_errors=True)
+
+    kinds = feed(parser, STDERR)
+    parsed = parser.result()
+
+    assert kinds.index("compile_error") == 5
+    assert parsed.compile_error == "\n".join(STDERR[:5])
+    assert parsed.has_compile_error
+    # Same answer as classifying the whole text: Unbound is most specific
+    assert parsed.error_type == "unbound_error"
+    assert parse_error("\n".join(STDERR))[0] == "unbound_error"
+    assert parser.finish() is None
+
+
+def test_exceptions_first_in_stdout_then_stderr():
+    """Test that the exception line is the first across stdout, then stderr."""
+    stdout, stderr = OutputParser(), OutputParser(compile_errors=True)
+    feed(stdout, ["PASS: a", 'Exception: (Failure "bad input")'])
+    feed(stderr, ["Uncaught exception:", "  (Failure boom)"])
+
+    parsed = _merge_parsed(stdout.result(), stderr.result())
+
+    assert parsed.exception == 'Exception: (Failure "bad input")'
+    assert parsed.test_output == "PASS: a"
+    assert not parsed.has_compile_error
+
+
+def test_output_capped_with_markers():
+    """Test that test lines and the waveform are capped with a truncation marker."""
+    parser = OutputParser(max_bytes=100)
+    feed(parser, [f"PASS: test {i}" for i in range(50)])
+    feed(parser, ["===WAVEFORM_START===", *("_-" * 30 for _ in range(10)), "===WAVEFORM_END==="])
+
+    parsed = parser.result()
+
+    assert parsed.truncated
+    assert len(parsed.test_output) < 200
+    assert parsed.test_output.endswith("bytes omitted]")
+    assert "[test output truncated:" in parsed.test_output
+    assert "[waveform truncated:" in parsed.waveform
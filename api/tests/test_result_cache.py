@@ -0,0 +1,165 @@
+"""Tests for the result cache's caching policy."""
+
+import time
+
+import pytest
+from compiler import CompileResult, compile_and_run
+from diagnostics import Diagnostic
+import result_cache
+from result_cache import ResultCache, get_result_cache
+from waveform_blobs import decode_blob
+
+FILES = {"circuit.ml": "let x = foo", "test.ml": "let () = ()"}
+
+ERROR = Diagnostic("circuit.ml", 1, 1, 8, 11, "error", "boom", "compile_error")
+
+
+def failure(error_type: str, stage: str, **kwargs) -> CompileResult:
+    if stage == "compile":
+        kwargs.setdefault("diagnostics", [ERROR])
+    return CompileResult(
+        success=False, error_type=error_type, error_message="boom", stage=stage, **kwargs
+    )
+
+
+@pytest.mark.parametrize(
+    "error_type,stage",
+    [
+        ("syntax_error", "compile"),
+        ("type_error", "compile"),
+        ("unbound_error", "compile"),
+        ("compile_error", "compile"),
+        ("test_failure", "test"),
+    ],
+)
+def test_deterministic_failures_cached(error_type, stage):
+    """Test that compile errors and failing tests are cached."""
+    cache = ResultCache()
+    cache.put(FILES, failure(error_type, stage))
+
+    assert cache.get(FILES) == failure(error_type, stage)
+    assert cache.get_stats()["failure_hits"] == 1
+
+
+@pytest.mark.parametrize(
+    "error_type,stage",
+    [
+        ("timeout_error", "compile"),
+        ("internal_error", "setup"),
+        ("runtime_error", "test"),
+    ],
+)
+def test_nondeterministic_failures_not_cached(error_type, stage):
+    """Test that timeouts, crashes and internal errors are never cached."""
+    cache = ResultCache()
+    cache.put(FILES, failure(error_type, stage))
+
+    assert cache.get(FILES) is None
+
+
+def test_compile_failures_without_error_diagnostics_not_cached():
+    """Test that a failed build the compiler didn't explain is never replayed."""
+    cache = ResultCache()
+    warning = Diagnostic("circuit.ml", 1, 1, 4, 5, "warning", "unused", "warning")
+    cache.put(FILES, failure("compile_error", "compile", diagnostics=None))
+    cache.put({**FILES, "test.ml": ""}, failure("compile_error", "compile", diagnostics=[warning]))
+
+    assert cache.get(FILES) is None
+    assert cache.get({**FILES, "test.ml": ""}) is None
+
+
+def test_failures_expire_on_their_own_ttl():
+    """Test that failures use failure_ttl_seconds, successes ttl_seconds."""
+    cache = ResultCache(ttl_seconds=3600, failure_ttl_seconds=60)
+    ok_files = {**FILES, "circuit.ml": "let x = 1"}
+    cache.put(FILES, failure("type_error", "compile"))
+    cache.put(ok_files, CompileResult(success=True))
+    for entry in cache._cache.values():
+        entry.created_at -= 120
+
+    assert cache.get(FILES) is None
+    assert cache.get(ok_files) is not None
+
+
+def test_failure_caching_can_be_disabled():
+    """Test that failure_ttl_seconds=0 turns failure caching off."""
+    cache = ResultCache(failure_ttl_seconds=0)
+    cache.put(FILES, failure("type_error", "compile"))
+
+    assert cache.get(FILES) is None
+
+
+def test_one_entry_serves_both_vcd_variants():
+    """Test that an entry built with VCD answers requests with and without it."""
+    cache = ResultCache()
+    cache.put(FILES, CompileResult(success=True, waveform="w", waveform_vcd="$var"))
+
+    assert cache.get(FILES, include_vcd=True).waveform_vcd == "$var"
+    without = cache.get(FILES, include_vcd=False)
+    assert without.waveform == "w" and without.waveform_vcd is None
+    assert cache.get_stats()["current_size"] == 1
+
+
+def test_hits_decompress_outside_the_lock(monkeypatch):
+    """Test that payloads are decoded after the lock is released, and only if inlined."""
+    cache = ResultCache()
+    cache.put(FILES, CompileResult(success=True, waveform="w", waveform_vcd="$var"))
+    decoded = []
+
+    def decode(data):
+        assert not cache._lock.locked()
+        decoded.append(decode_blob(data))
+        return decoded[-1]
+
+    monkeypatch.setattr(result_cache, "decode_blob", decode)
+
+    hit = cache.get(FILES, include_vcd=True, inline_vcd=False)
+
+    assert decoded == ["w"]
+    assert hit.waveform_vcd is None and hit.waveform_vcd_size == len("$var")
+
+
+def test_vcd_request_misses_entry_without_vcd():
+    """Test that a VCD request rebuilds, and the result upgrades the entry."""
+    cache = ResultCache()
+    cache.put(FILES, CompileResult(success=True, waveform="w"), include_vcd=False)
+    assert cache.get(FILES, include_vcd=True) is None
+
+    cache.put(FILES, CompileResult(success=True, waveform="w", waveform_vcd="$var"))
+    cache.put(FILES, CompileResult(success=True, waveform="w"), include_vcd=False)
+
+    assert cache.get(FILES, include_vcd=True).waveform_vcd == "$var"
+
+
+def test_waveform_blobs_shared_between_entries():
+    """Test that identical waveforms are held once and released on eviction."""
+    cache = ResultCache(max_size=2)
+    for i in range(2):
+        files = {**FILES, "circuit.ml": f"let x = {i}"}
+        cache.put(files, CompileResult(success=True, output=str(i), waveform="w"))
+    stats = cache.get_stats()
+    assert (stats["blobs"], stats["shared_blobs"]) == (1, 1)
+
+    for i in range(2, 4):
+        files = {**FILES, "circuit.ml": f"let x = {i}"}
+        cache.put(files, CompileResult(success=True, waveform=f"w{i}"))
+
+    assert cache.get_stats()["blobs"] == 2
+
+
+def test_repeated_compile_error_served_from_cache(fake_dune):
+    """Test that resubmitting the same broken file doesn't rebuild."""
+    files = {
+        "circuit.ml": 'File "circuit.ml", line 1, characters 8-11:\nError: Unbound value foo',
+        "test.ml": "",
+    }
+
+    hits_before = get_result_cache().get_stats()["failure_hits"]
+    first = compile_and_run(files, timeout_seconds=10)
+    t0 = time.time()
+    second = compile_and_run(files, timeout_seconds=10)
+
+    assert first.error_type == second.error_type == "unbound_error"
+    assert second.compile_time_ms == 0
+    assert get_result_cache().get_stats()["failure_hits"] == hits_before + 1
+    assert time.time() - t0 < 1
@@ -0,0 +1,76 @@
+"""Tests for seeding the result cache with the shipped examples."""
+
+import threading
+
+from compiler import compile_and_run
+from result_cache import get_result_cache
+from result_seeder import ResultSeeder, load_examples, seed_examples
+from tests.examples import Example
+
+
+def make_examples(count: int) -> list[Example]:
+    return [
+        Example(
+            id=f"ex{i}",
+            files={"circuit.ml": f"let x = {i}", "test.ml": f"PASS: ex{i}"},
+            project_type="standard",
+        )
+        for i in range(count)
+    ]
+
+
+def test_load_examples_finds_manifest():
+    """Test that the repo's examples are found."""
+    ids = {example.id for example in load_examples()}
+
+    assert "counter" in ids
+    assert any(i.startswith("n2t_") for i in ids)
+
+
+def test_seeded_examples_are_cache_hits(fake_dune, tmp_path, monkeypatch):
+    """Test that seeding builds each example once and later runs hit the cache."""
+    log = tmp_path / "dune.log"
+    monkeypatch.setenv("FAKE_DUNE_LOG", str(log))
+    examples = make_examples(2)
+
+    report = seed_examples(examples, timeout_seconds=10)
+    assert (report.seeded, report.already_cached, report.failed) == (2, 0, [])
+
+    # A request without VCD is answered by the seeded (VCD) entry
+    result = compile_and_run(examples[0].files, timeout_seconds=10, include_vcd=False)
+    assert result.success and result.compile_time_ms == 0
+
+    report = seed_examples(examples, timeout_seconds=10)
+    assert (report.seeded, report.already_cached) == (0, 2)
+    assert log.read_text().count("build @runtest") == 2
+
+
+def test_failures_reported(fake_dune):
+    """Test that examples that fail to build are listed."""
+    broken = Example(
+        id="broken",
+        files={"circuit.ml": 'File "circuit.ml", line 1:\nError: x', "test.ml": ""},
+        project_type="standard",
+    )
+
+    report = seed_examples([broken, *make_examples(1)], timeout_seconds=10)
+
+    assert report.failed == ["broken"]
+    assert report.seeded == 1
+
+
+def test_seeder_waits_while_deferred(fake_dune):
+    """Test that the background seeder doesn't build while told to defer."""
+    defer = threading.Event()
+    defer.set()
+    seeder = ResultSeeder(load=lambda: make_examples(1), should_defer=defer.is_set)
+
+    seeder.start()
+    try:
+        assert not seeder._stop.wait(0.3)
+        assert seeder.get_stats()["running"]
+        assert get_result_cache().get_stats()["current_size"] == 0
+    finally:
+        seeder.stop()
+
+    assert seeder.get_stats()["seeded"] == 0
@@ -0,0 +1,181 @@
+"""Tests for the on-disk result store and its use as a second cache level."""
+
+import time
+
+import pytest
+from compiler import CompileResult
+from diagnostics import Diagnostic
+from result_cache import ResultCache
+from result_store import DiskResultStore
+
+FILES = {"circuit.ml": "let x = 1", "test.ml": "let () = ()"}
+
+
+def make_result(output="ok", **kwargs) -> CompileResult:
+    return CompileResult(success=True, output=output, tests_passed=1, **kwargs)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "results" / "results.db"
+
+
+def test_shared_between_instances(db_path):
+    """Test that a result stored by one worker is visible to another."""
+    DiskResultStore(db_path).put("key", make_result(waveform="clock _-_-"))
+
+    result = DiskResultStore(db_path).get("key")
+
+    assert result == make_result(waveform="clock _-_-")
+    assert DiskResultStore(db_path).get("other") is None
+
+
+def test_diagnostics_round_trip(db_path):
+    """Test that diagnostics come back as Diagnostic records."""
+    diagnostic = Diagnostic("circuit.ml", 1, 1, 8, 11, "error", "Unbound value foo", "unbound_error")
+    DiskResultStore(db_path).put("key", make_result(diagnostics=[diagnostic]))
+
+    assert DiskResultStore(db_path).get("key").diagnostics == [diagnostic]
+
+
+def test_expired_entries_not_returned(db_path):
+    """Test that entries older than the TTL are dropped."""
+    store = DiskResultStore(db_path, ttl_seconds=60)
+    store.put("key", make_result())
+    store._connect().execute("UPDATE results SET created_at = ?", (time.time() - 120,))
+
+    assert store.get("key") is None
+    assert store.get_stats()["entries"] == 0
+
+
+def test_seeded_entries_do_not_expire(db_path):
+    """Test that seeded entries outlive the TTL, even after an unseeded put."""
+    store = DiskResultStore(db_path, ttl_seconds=60)
+    store.put("seeded", make_result(), seeded=True)
+    store.put("seeded", make_result())
+    store.put("key", make_result())
+    store._connect().execute("UPDATE results SET created_at = ?", (time.time() - 120,))
+
+    assert store.evict() == 1
+    assert store.get("seeded") == make_result()
+    assert store.get("key") is None
+
+
+def test_failures_swept_with_failure_ttl(db_path):
+    """Test that eviction drops failures past the failure TTL, not the success TTL."""
+    store = DiskResultStore(db_path, ttl_seconds=3600, failure_ttl_seconds=60)
+    store.put("failure", CompileResult(success=False, error_type="type_error"))
+    store.put("success", make_result())
+    store._connect().execute("UPDATE results SET created_at = ?", (time.time() - 120,))
+
+    assert store.evict() == 1
+    assert store.get("failure") is None
+    assert store.get("success") == make_result()
+
+
+def test_size_budget_evicts_least_recently_used(db_path):
+    """Test that eviction removes the oldest-accessed rows first."""
+    store = DiskResultStore(db_path, max_bytes=0)
+    for i in range(3):
+        store.put(f"key{i}", make_result(output="x" * 1000))
+    conn = store._connect()
+    with conn:
+        for i, accessed in enumerate([30, 10, 20]):
+            conn.execute(
+                "UPDATE results SET accessed_at = ? WHERE key = ?", (accessed, f"key{i}")
+            )
+
+    (size,) = conn.execute("SELECT size FROM results WHERE key = 'key0'").fetchone()
+    store.max_bytes = 2 * size
+    assert store.evict() == 1
+
+    assert store.get("key1") is None
+    assert store.get("key0") is not None
+    assert store.get("key2") is not None
+
+
+def test_result_cache_falls_through_to_store(db_path):
+    """Test that an L1 miss is served from disk and promoted."""
+    DiskResultStore(db_path)  # Create the schema
+    first = ResultCache(store=DiskResultStore(db_path))
+    first.put(FILES, make_result())
+
+    # A fresh process: empty memory, same disk store
+    second = ResultCache(store=DiskResultStore(db_path))
+    assert second.get(FILES) == make_result()
+    assert second.get(FILES) == make_result()
+
+    stats = second.get_stats()
+    assert stats["store_hits"] == 1
+    assert stats["hits"] == 1
+    assert stats["current_size"] == 1
+
+
+def test_promotion_keeps_store_ttl(db_path):
+    """Test that a store hit promoted to memory doesn't restart its TTL."""
+    store = DiskResultStore(db_path, ttl_seconds=60)
+    ResultCache(store=store).put(FILES, make_result())
+    created_at = time.time() - 50
+    store._connect().execute("UPDATE results SET created_at = ?", (created_at,))
+
+    cache = ResultCache(ttl_seconds=60, store=store)
+    assert cache.get(FILES) == make_result()
+    (entry,) = cache._cache.values()
+    assert entry.created_at == created_at
+
+
+def test_unknown_fields_ignored(db_path):
+    """Test that rows written by a newer CompileResult still load."""
+    store = DiskResultStore(db_path)
+    data = b'{"success": true, "output": "ok", "future_field": 1}'
+    conn = store._connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO results (key, created_at, accessed_at, size, data) "
+            "VALUES ('key', ?, ?, ?, ?)",
+            (time.time(), time.time(), len(data), data),
+        )
+
+    assert store.get("key") == CompileResult(success=True, output="ok")
+
+
+def test_old_schema_migrated(db_path):
+    """Test that a store created before raw keys were recorded still works."""
+    import sqlite3
+
+    db_path.parent.mkdir(parents=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE results (key TEXT PRIMARY KEY, created_at REAL NOT NULL, "
+        "accessed_at REAL NOT NULL, size INTEGER NOT NULL, data BLOB NOT NULL)"
+    )
+    conn.close()
+
+    store = DiskResultStore(db_path)
+    store.put("key", make_result(), raw_key="raw")
+
+    found = store.lookup("key")
+    assert (found.result, found.raw_key) == (make_result(), "raw")
+
+
+def test_vcd_row_not_replaced_by_vcd_less_build(db_path):
+    """Test that a row with VCD output survives a later put without it."""
+    store = DiskResultStore(db_path)
+    store.put("key", make_result(waveform_vcd="$var"), includes_vcd=True)
+    store.put("key", make_result(), includes_vcd=False)
+
+    assert store.get("key").waveform_vcd == "$var"
+    assert store.lookup("key", include_vcd=False).result.waveform_vcd is None
+
+
+def test_blobs_shared_and_collected(db_path):
+    """Test that rows share identical waveforms and unused blobs are dropped."""
+    store = DiskResultStore(db_path, ttl_seconds=60)
+    store.put("a", make_result(waveform="clock _-_-"))
+    store.put("b", make_result(output="other", waveform="clock _-_-"))
+    assert store.get_stats()["blobs"] == 1
+
+    store._connect().execute("UPDATE results SET created_at = ?", (time.time() - 120,))
+    store.evict()
+
+    assert store.get_stats()["blobs"] == 0
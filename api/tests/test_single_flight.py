@@ -0,0 +1,147 @@
+"""Tests for coalescing identical concurrent builds."""
+
+import asyncio
+
+import pytest
+from compiler import compile_and_run_async
+from single_flight import SingleFlight
+
+
+def counting_build(calls: list, delay: float = 0.05, result="done"):
+    async def start(progress):
+        calls.append(1)
+        progress("started", {})
+        await asyncio.sleep(delay)
+        return result
+
+    return start
+
+
+def test_identical_calls_share_one_build():
+    """Test that concurrent calls with the same key run the build once."""
+    flight = SingleFlight()
+    calls = []
+    events = []
+
+    async def main():
+        return await asyncio.gather(
+            flight.run("key", counting_build(calls)),
+            *(
+                flight.run(
+                    "key",
+                    counting_build(calls),
+                    progress=lambda e, d: events.append(e),
+                )
+                for _ in range(4)
+            ),
+        )
+
+    assert asyncio.run(main()) == ["done"] * 5
+    assert len(calls) == 1
+    assert events.count("coalesced") == 4
+    assert flight.get_stats()["joined"] == 4
+    assert flight.get_stats()["in_flight"] == 0
+
+
+def test_join_keys_and_errors():
+    """Test that join_keys pick compatible builds and errors reach every waiter."""
+    flight = SingleFlight()
+    calls = []
+
+    async def failing(progress):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("boom")
+
+    async def main():
+        return await asyncio.gather(
+            flight.run(("k", True), failing),
+            flight.run(("k", False), failing, join_keys=[("k", False), ("k", True)]),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert [str(r) for r in results] == ["boom", "boom"]
+    assert len(calls) == 1
+
+
+def test_cancelled_waiter_does_not_cancel_shared_build():
+    """Test that one waiter leaving doesn't affect the others, but the last does."""
+    flight = SingleFlight()
+    calls = []
+
+    async def main():
+        first = asyncio.create_task(flight.run("key", counting_build(calls, 0.2)))
+        second = asyncio.create_task(flight.run("key", counting_build(calls, 0.2)))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        assert await second == "done"
+
+        lone = asyncio.create_task(flight.run("other", counting_build(calls, 10)))
+        await asyncio.sleep(0.05)
+        build = flight._flights["other"].task
+        lone.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await lone
+        await asyncio.sleep(0)
+        return build
+
+    build = asyncio.run(main())
+    assert build.cancelled()
+    assert len(calls) == 2
+
+
+def test_abandoned_build_not_joined():
+    """Test that a call right after the last waiter left starts a new build."""
+    flight = SingleFlight()
+    calls = []
+
+    async def main():
+        with pytest.raises(TimeoutError):
+            async with asyncio.timeout(0.05):
+                await flight.run("key", counting_build(calls, 10))
+        # The abandoned build is cancelled but not done until the next iteration
+        return await flight.run("key", counting_build(calls, 0.01, "second"))
+
+    assert asyncio.run(main()) == "second"
+    assert len(calls) == 2
+
+
+def test_joined_waiter_times_out_on_its_own_budget():
+    """Test that a waiter allowing less time than the build gives up alone."""
+    flight = SingleFlight()
+    calls = []
+
+    async def main():
+        leader = asyncio.create_task(
+            flight.run("key", counting_build(calls, 0.3), timeout=30)
+        )
+        await asyncio.sleep(0.01)
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.run("key", counting_build(calls), timeout=0.05)
+        return await leader
+
+    assert asyncio.run(main()) == "done"
+    assert flight.get_stats()["wait_timeouts"] == 1
+
+
+def test_concurrent_identical_compiles_build_once(fake_dune, tmp_path, monkeypatch):
+    """Test that a burst of identical compiles runs dune once."""
+    log = tmp_path / "dune.log"
+    monkeypatch.setenv("FAKE_DUNE_LOG", str(log))
+    monkeypatch.setenv("FAKE_DUNE_SLEEP", "0.5")
+    files = {"circuit.ml": "let x = 1", "test.ml": "PASS: burst"}
+
+    async def main():
+        return await asyncio.gather(
+            *(
+                compile_and_run_async(files, timeout_seconds=10, include_vcd=False)
+                for _ in range(6)
+            )
+        )
+
+    results = asyncio.run(main())
+
+    assert all(r.success for r in results)
+    assert len({id(r) for r in results}) == 6
+    assert log.read_text().count("build @runtest") == 1
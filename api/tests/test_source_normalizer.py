@@ -0,0 +1,88 @@
+"""Tests for source canonicalization before result-cache hashing."""
+
+from compiler import CompileResult
+from diagnostics import Diagnostic
+from result_cache import ResultCache
+from source_normalizer import normalize_files, normalize_ocaml
+
+
+def test_line_endings_and_trailing_whitespace():
+    """Test that CRLF and trailing whitespace don't change the normal form."""
+    assert normalize_ocaml("let x = 1  \r\nlet y = 2\t\r\n  \r\n") == (
+        "let x = 1\nlet y = 2\n\n"
+    )
+
+
+def test_line_count_preserved():
+    """Test that trailing blank lines and a missing final newline are kept."""
+    # End-of-file syntax errors are reported at the last line and column
+    assert normalize_ocaml("let x =\n\n\n") == "let x =\n\n\n"
+    assert normalize_ocaml("let x =") == "let x ="
+    assert normalize_ocaml("let x = 1  ") == "let x = 1  "
+
+
+def test_string_literals_preserved():
+    """Test that whitespace inside string literals is kept."""
+    source = 'let s = "a  \n b  "  \nlet c = \'"\'  \n'
+
+    assert normalize_ocaml(source) == 'let s = "a  \n b  "\nlet c = \'"\'\n'
+
+
+def test_expect_blocks_preserved():
+    """Test that quoted-string expect output keeps its whitespace."""
+    source = 'let%expect_test "t" =\n  [%expect {| out   \n  |}]   \n'
+
+    assert normalize_ocaml(source) == 'let%expect_test "t" =\n  [%expect {| out   \n  |}]\n'
+    assert normalize_ocaml("{id|a  \n|}  \n|id}") == "{id|a  \n|}  \n|id}"
+
+
+def test_comments_kept_by_default_and_stripped_on_request():
+    """Test comment handling, including nesting and strings inside comments."""
+    source = 'let x = 1 (* a (* nested *) "*)"\n more *)\nlet y = 2\n'
+
+    assert normalize_ocaml(source) == source
+    # Newlines inside the comment are kept so line numbers don't move
+    assert normalize_ocaml(source, strip_comments=True) == "let x = 1\n\nlet y = 2\n"
+
+
+def test_normalize_files_drops_ignored_files():
+    """Test that files the build doesn't use are dropped and data is untouched."""
+    files = {
+        "circuit.ml": "let x = 1  \n",
+        "notes.md": "ignored",
+        "input.txt": "1 2  \r\n",
+        "__include_vcd__": "True",
+    }
+
+    assert normalize_files(files) == {
+        "circuit.ml": "let x = 1\n",
+        "input.txt": "1 2  \r\n",
+    }
+
+
+def test_result_cache_counts_normalization_hits():
+    """Test that hits only possible because of normalization are reported."""
+    cache = ResultCache()
+    cache.put({"circuit.ml": "let x = 1\n"}, CompileResult(success=True))
+
+    assert cache.get({"circuit.ml": "let x = 1\n"}) is not None
+    assert cache.get({"circuit.ml": "let x = 1   \r\n"}) is not None
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 2
+    assert stats["normalization_hits"] == 1
+
+
+def test_comment_insensitive_keys_only_for_successes():
+    """Test that failures aren't shared between submissions with different comments."""
+    cache = ResultCache(strip_comments=True)
+    error = Diagnostic("circuit.ml", 1, 1, 8, 9, "error", "Unbound value y", "unbound_error")
+    failure = CompileResult(
+        success=False, error_type="type_error", stage="compile", diagnostics=[error]
+    )
+    cache.put({"circuit.ml": "let x = 1 (* a *)"}, CompileResult(success=True))
+    cache.put({"circuit.ml": "let x = y (* a *)\n"}, failure)
+
+    assert cache.get({"circuit.ml": "let x = 1 (* b *)"}) is not None
+    assert cache.get({"circuit.ml": "let x = y (* b *)"}) is None
+    assert cache.get({"circuit.ml": "let x = y (* a *)  \r\n"}) == failure
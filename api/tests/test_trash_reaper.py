@@ -0,0 +1,136 @@
+"""Tests for deferred directory deletion."""
+
+import errno
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+from trash_reaper import TrashReaper
+from workspace_cache import WorkspaceCache
+
+
+@pytest.fixture
+def root():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield Path(tmpdir)
+
+
+def make_tree(path: Path, files: int = 3) -> Path:
+    """Create a small _build-like tree with a symlink."""
+    (path / "_build" / "default").mkdir(parents=True)
+    for i in range(files):
+        (path / "_build" / "default" / f"f{i}.cmx").write_text("x")
+    (path / "circuit.ml").write_text("let x = 1")
+    os.symlink("_build/default", path / "link")
+    return path
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_discard_moves_directory_out_of_place(root):
+    """Test that discard removes the path immediately and queues it."""
+    reaper = TrashReaper(trash_root=root / "trash")
+    victim = make_tree(root / "workspace")
+
+    # Queue without a running reaper thread
+    reaper._ensure_started = lambda: None
+    assert reaper.discard(victim)
+
+    assert not victim.exists()
+    assert reaper.get_stats()["pending"] == 1
+    assert len(list((root / "trash").iterdir())) == 1
+
+
+def test_reaper_deletes_in_background(root):
+    """Test that discarded trees are eventually deleted."""
+    reaper = TrashReaper(trash_root=root / "trash")
+    try:
+        reaper.discard(make_tree(root / "a"))
+        reaper.discard(make_tree(root / "b"))
+
+        assert wait_for(lambda: reaper.get_stats()["reaped"] == 2)
+        assert list((root / "trash").iterdir()) == []
+        assert reaper.get_stats()["files_deleted"] == 2 * 5
+    finally:
+        reaper.stop()
+
+
+def test_discard_missing_path(root):
+    """Test that discarding a missing directory is a no-op."""
+    reaper = TrashReaper(trash_root=root / "trash")
+
+    assert not reaper.discard(root / "missing")
+    assert reaper.get_stats()["pending"] == 0
+
+
+def test_deletion_rate_is_limited(root):
+    """Test that the reaper pauses to stay under its file rate."""
+    reaper = TrashReaper(trash_root=root / "trash", files_per_second=2000)
+    reaper._ensure_started = lambda: None
+    reaper.discard(make_tree(root / "big", files=512))
+
+    t0 = time.time()
+    assert reaper.reap_one()
+
+    # 512 files at 2000/s: at least one pause after the first batch
+    assert time.time() - t0 >= 0.2
+    assert not any((root / "trash").iterdir())
+
+
+def test_start_reaps_leftovers(root):
+    """Test that trash left by a previous process is deleted at startup."""
+    make_tree(root / "trash" / "old-workspace")
+    reaper = TrashReaper(trash_root=root / "trash")
+    try:
+        reaper.start()
+        assert wait_for(lambda: not any((root / "trash").iterdir()))
+    finally:
+        reaper.stop()
+
+
+def test_start_reaps_leftovers_on_other_filesystems(root, monkeypatch):
+    """Test that directories hidden next to their original path are found at startup."""
+    rename = os.rename
+
+    def cross_device_rename(src, dst):
+        if Path(dst).parent == root / "trash":
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        rename(src, dst)
+
+    monkeypatch.setattr(os, "rename", cross_device_rename)
+    first = TrashReaper(trash_root=root / "trash")
+    first._ensure_started = lambda: None
+    first.discard(make_tree(root / "other" / "workspace"))
+    hidden = list((root / "other").iterdir())
+    assert [p.name.startswith(".trash-workspace-") for p in hidden] == [True]
+
+    # A later process knows nothing of the first one's queue
+    reaper = TrashReaper(trash_root=root / "trash")
+    try:
+        reaper.start()
+        assert wait_for(lambda: not any((root / "other").iterdir()))
+    finally:
+        reaper.stop()
+
+
+def test_workspace_eviction_uses_trash(root):
+    """Test that evicted workspaces go to the trash instead of rmtree."""
+    template = root / "template"
+    template.mkdir()
+    (template / "dune-project").write_text("(lang dune 3.11)")
+    reaper = TrashReaper(trash_root=root / "trash")
+    reaper._ensure_started = lambda: None
+    cache = WorkspaceCache(max_slots=1, cache_root=root / "cache", trash=reaper)
+
+    path1, _ = cache.get_or_create("session-1", False, template)
+    cache.get_or_create("session-2", False, template)
+
+    assert not path1.exists()
+    assert reaper.get_stats()["pending"] == 1
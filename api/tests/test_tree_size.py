@@ -0,0 +1,59 @@
+"""Tests for incremental tree size accounting."""
+
+import os
+
+from tree_size import TreeSizeTracker
+
+
+def age(*paths):
+    """Backdate directory mtimes so the tracker trusts cached listings."""
+    for path in paths:
+        os.utime(path, (1_000_000_000, 1_000_000_000))
+
+
+def test_counts_nested_files(tmp_path):
+    """Test that refresh sums file sizes in nested directories."""
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "top.txt").write_text("x" * 10)
+    (tmp_path / "a" / "b" / "deep.txt").write_text("y" * 5)
+
+    assert TreeSizeTracker(tmp_path).refresh() == (15, 2)
+
+
+def test_only_changed_directories_rescanned(tmp_path):
+    """Test that unchanged directories are served from the cached listing."""
+    for name in ("a", "b", "c"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "file").write_text("x" * 10)
+    age(tmp_path, tmp_path / "a", tmp_path / "b", tmp_path / "c")
+    tracker = TreeSizeTracker(tmp_path)
+    tracker.refresh()
+    assert tracker.dirs_rescanned == 4
+
+    (tmp_path / "b" / "new").write_text("y" * 7)
+    assert tracker.refresh() == (37, 4)
+    assert tracker.dirs_rescanned == 1
+
+
+def test_removed_directories_drop_out(tmp_path):
+    """Test that deleted subtrees no longer count."""
+    (tmp_path / "gone").mkdir()
+    (tmp_path / "gone" / "file").write_text("x" * 10)
+    (tmp_path / "kept").write_text("x" * 3)
+    tracker = TreeSizeTracker(tmp_path)
+    assert tracker.refresh() == (13, 2)
+
+    (tmp_path / "gone" / "file").unlink()
+    (tmp_path / "gone").rmdir()
+    assert tracker.refresh() == (3, 1)
+
+
+def test_split_hardlinks_shares_linked_files(tmp_path):
+    """Test that a hardlinked file counts for its share of the links."""
+    (tmp_path / "template").write_text("x" * 100)
+    (tmp_path / "tree").mkdir()
+    os.link(tmp_path / "template", tmp_path / "tree" / "linked")
+    (tmp_path / "tree" / "own").write_text("y" * 5)
+
+    assert TreeSizeTracker(tmp_path / "tree").refresh() == (105, 2)
+    assert TreeSizeTracker(tmp_path / "tree", split_hardlinks=True).refresh() == (55, 2)
@@ -0,0 +1,88 @@
+"""Tests for per-build VCD output."""
+
+import asyncio
+
+import compiler
+from compiler import compile_and_run_async
+from waveform_blobs import decode_blob
+from waveform_store import get_waveform_store
+
+
+def vcd_files(name: str) -> dict[str, str]:
+    return {"circuit.ml": f"let {name} = 1", "test.ml": f"PASS: {name}"}
+
+
+def test_concurrent_builds_get_their_own_vcd(fake_dune, monkeypatch):
+    """Test that parallel builds (temp dirs and sessions) each read their own VCD."""
+    monkeypatch.setenv("FAKE_DUNE_SLEEP", "0.1")
+    names = [f"circuit_{i}" for i in range(12)]
+
+    async def main():
+        return await asyncio.gather(
+            *(
+                compile_and_run_async(
+                    vcd_files(name),
+                    timeout_seconds=10,
+                    include_vcd=True,
+                    session_id=f"vcd-session-{name}" if i % 2 else None,
+                )
+                for i, name in enumerate(names)
+            )
+        )
+
+    results = asyncio.run(main())
+
+    for name, result in zip(names, results):
+        assert result.success
+        assert result.waveform_vcd == f"$comment let {name} = 1 $end\n"
+
+
+def test_no_stale_or_inherited_vcd(fake_dune, tmp_path, monkeypatch):
+    """Test that a build without VCD output never returns an earlier one."""
+    inherited = tmp_path / "global.vcd"
+    monkeypatch.setenv("HARDCAML_VCD_PATH", str(inherited))
+    session = "vcd-session-stale"
+
+    first = asyncio.run(
+        compile_and_run_async(
+            vcd_files("first"), timeout_seconds=10, include_vcd=True, session_id=session
+        )
+    )
+    assert first.waveform_vcd == "$comment let first = 1 $end\n"
+
+    # Same workspace, but this test writes no VCD
+    files = vcd_files("second")
+    files["circuit.ml"] += " (* NO_VCD *)"
+    second = asyncio.run(
+        compile_and_run_async(files, timeout_seconds=10, include_vcd=True, session_id=session)
+    )
+    assert second.success
+    assert second.waveform_vcd is None
+
+    # Builds without VCD don't see the API process's HARDCAML_VCD_PATH
+    third = asyncio.run(
+        compile_and_run_async(vcd_files("third"), timeout_seconds=10, include_vcd=False)
+    )
+    assert third.success
+    assert not inherited.exists()
+
+
+def test_vcd_stored_without_loading_its_text(fake_dune, monkeypatch):
+    """Test that inline_vcd=False streams the VCD to the store and never decodes it."""
+
+    def load_vcd_text(vcd_id):
+        raise AssertionError("VCD decoded")
+
+    monkeypatch.setattr(compiler, "load_vcd_text", load_vcd_text)
+
+    result = asyncio.run(
+        compile_and_run_async(
+            vcd_files("streamed"), timeout_seconds=10, include_vcd=True, inline_vcd=False
+        )
+    )
+
+    vcd = "$comment let streamed = 1 $end\n"
+    assert result.success and result.waveform_vcd is None
+    assert result.waveform_vcd_size == len(vcd)
+    path = get_waveform_store().path(result.waveform_vcd_id)
+    assert decode_blob(path.read_bytes()) == vcd
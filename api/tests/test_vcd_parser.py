@@ -0,0 +1,126 @@
+"""Tests for the streaming VCD parser."""
+
+import gzip
+import io
+
+import pytest
+import vcd_parser
+from vcd_parser import (
+    VcdFormatError,
+    build_index,
+    iter_changes,
+    iter_signal_changes,
+    open_vcd,
+    read_header,
+)
+
+VCD = b"""$date
+    today
+$end
+$timescale
+    1ns
+$end
+$comment $var wire 1 ? not_a_var $end
+$scope module traces $end
+$var wire 1 ! clock $end
+$scope module sub $end
+$var wire 4 " state $end
+$var wire 4 " state_alias $end
+$upscope $end
+$upscope $end
+$enddefinitions $end
+$dumpvars
+x!
+bxxxx "
+$end
+#0 1! b0001 "
+#5
+0!
+$comment #7 1! $end
+#10
+1!
+b0010 "
+r1.5 ?
+"""
+
+
+def test_read_header():
+    """Test scopes, aliases and multi-line blocks in the definitions."""
+    stream = io.BytesIO(VCD)
+    header = read_header(stream)
+
+    assert header.timescale == "1ns"
+    assert [(v.name, v.width, v.code) for v in header.variables] == [
+        ("clock", 1, b"!"),
+        ("sub.state", 4, b'"'),
+        ("sub.state_alias", 4, b'"'),
+    ]
+    assert header.data_offset == VCD.index(b"$dumpvars")
+    assert stream.read(9) == b"$dumpvars"
+
+
+def test_iter_changes():
+    """Test that changes come in file order, several per line, skipping comments."""
+    stream = io.BytesIO(VCD)
+    read_header(stream)
+
+    assert list(iter_changes(stream)) == [
+        (0, b"!", b"x"),
+        (0, b'"', b"xxxx"),
+        (0, b"!", b"1"),
+        (0, b'"', b"0001"),
+        (5, b"!", b"0"),
+        (10, b"!", b"1"),
+        (10, b'"', b"0010"),
+    ]
+
+
+def test_build_index_and_resume_from_checkpoint(monkeypatch):
+    """Test per-signal summaries, and that a checkpoint is a valid place to resume."""
+    monkeypatch.setattr(vcd_parser, "CHECKPOINT_BYTES", 1)
+    index = build_index(io.BytesIO(VCD))
+
+    assert (index.min_time, index.max_time, index.changes) == (0, 10, 7)
+    clock = index.signals[b"!"]
+    assert (clock.count, clock.first_time, clock.last_time) == (4, 0, 10)
+    assert [time for time, _ in index.checkpoints] == [0, 5, 10]
+
+    time, offset = index.checkpoints[-1]
+    stream = io.BytesIO(VCD)
+    stream.seek(offset)
+    assert list(iter_changes(stream)) == [(10, b"!", b"1"), (10, b'"', b"0010")]
+
+
+def test_signal_offsets_seek_to_changes(monkeypatch):
+    """Test per-signal offsets, and reading one signal from a time on."""
+    monkeypatch.setattr(vcd_parser, "CHECKPOINT_BYTES", 1)
+    vcd = VCD.replace(b'#10\n1!\nb0010 "', b'#10\n1!\n#20\nb0010 "')
+    index = build_index(io.BytesIO(vcd))
+
+    state = index.signals[b'"']
+    assert state.first_offset == VCD.index(b"$dumpvars")
+    assert state.offsets[-1] == (20, vcd.index(b"#20"))
+
+    stream = io.BytesIO(vcd)
+    assert list(iter_signal_changes(stream, index, b'"', 12)) == [
+        (0, b"0001"),
+        (20, b"0010"),
+    ]
+    assert list(iter_signal_changes(stream, index, b"!", 7)) == [
+        (5, b"0"),
+        (10, b"1"),
+    ]
+    assert list(iter_signal_changes(stream, index, b"?")) == []
+
+
+def test_open_vcd_gzip_and_errors(tmp_path):
+    """Test that stored (gzipped) and plain files read the same, and non-VCDs fail."""
+    (tmp_path / "plain.vcd").write_bytes(VCD)
+    (tmp_path / "stored.gz").write_bytes(gzip.compress(VCD))
+
+    for name in ("plain.vcd", "stored.gz"):
+        with open_vcd(tmp_path / name) as stream:
+            assert build_index(stream).changes == 7
+
+    with pytest.raises(VcdFormatError):
+        read_header(io.BytesIO(b"clock  _-_-_-\n"))
@@ -0,0 +1,135 @@
+"""Tests for columnar waveforms and GET /waveforms/{id}/window."""
+
+import io
+
+import pytest
+from app import app
+from fastapi.testclient import TestClient
+from waveform_blobs import encode_blob
+from waveform_columns import (
+    INDEX_STRIDE,
+    SUFFIX,
+    ColumnarWaveform,
+    WaveformFormatError,
+    vcd_to_columnar,
+)
+from waveform_store import get_waveform_store
+
+CYCLES = 1000
+
+
+def make_vcd(cycles: int = CYCLES) -> str:
+    """A VCD as Hardcaml writes it: a clock and a counter, 10 time units per cycle."""
+    lines = [
+        "$date today $end",
+        "$timescale 1ns $end",
+        "$scope module traces $end",
+        "$var wire 1 ! clock $end",
+        '$var wire 8 " count $end',
+        "$upscope $end",
+        "$enddefinitions $end",
+        "$dumpvars",
+        "x!",
+        'bxxxxxxxx "',
+        "$end",
+    ]
+    for cycle in range(cycles):
+        lines += [f"#{cycle * 10}", "1!", f'b{cycle % 256:08b} "', f"#{cycle * 10 + 5}", "0!"]
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture(scope="module")
+def waveform():
+    return ColumnarWaveform(vcd_to_columnar(io.BytesIO(make_vcd().encode())))
+
+
+def test_describe(waveform):
+    """Test that signals and their change counts are listed."""
+    assert waveform.describe() == {
+        "end_time": (CYCLES - 1) * 10 + 5,
+        "timescale": "1ns",
+        "signals": [
+            {"name": "clock", "width": 1, "changes": 2 * CYCLES},
+            {"name": "count", "width": 8, "changes": CYCLES},
+        ],
+    }
+
+
+def test_window_matches_vcd(waveform):
+    """Test a window far from the start, across index entries."""
+    start = INDEX_STRIDE * 10 * 3 + 2
+    window = waveform.window(start, start + 30, names=["count", "clock"])
+
+    count, clock = window["signals"]
+    cycle = start // 10
+    assert count["initial"] == format(cycle, "x")
+    assert count["changes"] == [[(cycle + k) * 10, format(cycle + k, "x")] for k in (1, 2, 3)]
+    assert clock["initial"] == "1"
+    assert [value for _, value in clock["changes"]] == ["0", "1"] * 3
+
+
+def test_window_downsampled(waveform):
+    """Test that changes closer than the resolution collapse into one entry."""
+    window = waveform.window(0, 1000, resolution=100, names=["count"])
+
+    (count,) = window["signals"]
+    # The value at time 0 replaced the dumpvars x
+    assert count["initial"] == "0"
+    assert count["changes"][0] == [10, "a", 10]
+    assert len(count["changes"]) == 10
+
+
+def test_unknown_values_and_errors():
+    """Test x values before the first cycle, and non-VCD input."""
+    vcd = make_vcd(2).replace("#0\n", "#3\n")
+    waveform = ColumnarWaveform(vcd_to_columnar(io.BytesIO(vcd.encode())))
+
+    assert waveform.window(0, 1)["signals"][1]["initial"] == "x"
+    with pytest.raises(KeyError):
+        waveform.window(0, 1, names=["missing"])
+    with pytest.raises(WaveformFormatError):
+        vcd_to_columnar(io.BytesIO(b"clock  _-_-_-"))
+
+
+def test_window_endpoint():
+    """Test that a stored VCD is converted on first use and queried by window."""
+    blob = encode_blob(make_vcd())
+    get_waveform_store().put(blob)
+    client = TestClient(app)
+
+    signals = client.get(f"/waveforms/{blob.id}/signals").json()
+    assert [s["name"] for s in signals["signals"]] == ["clock", "count"]
+
+    response = client.get(
+        f"/waveforms/{blob.id}/window",
+        params={"start": 100, "end": 200, "points": 5, "signals": "count"},
+    )
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+    (count,) = response.json()["signals"]
+    # Two cycles per point: the first change's time, the second's value
+    assert count["changes"] == [
+        [110, "c", 2],
+        [130, "e", 2],
+        [150, "10", 2],
+        [170, "12", 2],
+        [190, "14", 2],
+    ]
+
+    missing = client.get(f"/waveforms/{blob.id}/window", params={"signals": "nope"})
+    assert missing.status_code == 404
+    ascii_blob = encode_blob("clock  _-_-_-")
+    get_waveform_store().put(ascii_blob)
+    assert client.get(f"/waveforms/{ascii_blob.id}/window").status_code == 422
+
+
+def test_window_endpoint_rejects_malformed_ids():
+    """Test that ids that aren't sha256 never reach the store, even for derived files."""
+    store = get_waveform_store()
+    path = store._path("zz", SUFFIX)
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(vcd_to_columnar(io.BytesIO(make_vcd().encode())))
+    client = TestClient(app)
+
+    assert client.get("/waveforms/zz/signals").status_code == 404
+    assert client.get("/waveforms/zz/window").status_code == 404
@@ -0,0 +1,253 @@
+"""Tests for compressed, content-addressed waveforms and GET /waveforms/{id}."""
+
+import pytest
+from app import app
+from compiler import CompileResult
+from fastapi.testclient import TestClient
+from rate_limit import limiter
+from result_cache import ResultCache
+from result_store import DiskResultStore
+from routes import _accepts_gzip
+from waveform_blobs import decode_blob, encode_blob
+from waveform_store import WaveformStore
+
+WAVEFORM = "clock  " + "_-" * 5000
+
+TEST_WITH_WAVEFORM = "\n".join(
+    [
+        "PASS: waves",
+        "===WAVEFORM_START===",
+        WAVEFORM,
+        "===WAVEFORM_END===",
+    ]
+)
+
+
+@pytest.fixture(scope="function")
+def client():
+    limiter.reset()
+    with TestClient(app, raise_server_exceptions=False) as client:
+        yield client
+
+
+def test_blobs_compressed_and_reproducible():
+    """Test that payloads shrink, round-trip, and encode to the same bytes."""
+    blob = encode_blob(WAVEFORM)
+
+    assert len(blob.data) < blob.size // 10
+    assert decode_blob(blob.data) == WAVEFORM
+    assert encode_blob(WAVEFORM) == blob
+    # Plain text (stores written before compression) passes through
+    assert decode_blob(b"clock _-") == "clock _-"
+
+
+def test_cache_and_store_keep_payloads_compressed(tmp_path):
+    """Test that both cache levels hold compressed bytes and serve them by id."""
+    store = DiskResultStore(tmp_path / "results.db")
+    cache = ResultCache(store=store)
+    files = {"circuit.ml": "let x = 1", "test.ml": ""}
+
+    waveform, _ = cache.put(files, CompileResult(success=True, waveform=WAVEFORM))
+    waveform_id = waveform.id
+
+    stats = cache.get_stats()
+    assert stats["blob_bytes"] < stats["blob_raw_bytes"] // 10
+    assert store.get_stats()["blob_bytes"] < len(WAVEFORM) // 10
+    assert cache.get(files).waveform_id == waveform_id
+    fresh = ResultCache(store=DiskResultStore(tmp_path / "results.db"))
+    assert decode_blob(fresh.get_blob(waveform_id).data) == WAVEFORM
+
+
+def test_vcd_can_be_left_out_of_hits():
+    """Test that inline_vcd=False reports the VCD's id and size without its text."""
+    cache = ResultCache()
+    files = {"circuit.ml": "let x = 1", "test.ml": ""}
+    cache.put(files, CompileResult(success=True, waveform_vcd="$var wire 1 ! clock $end"))
+
+    result = cache.get(files, include_vcd=True, inline_vcd=False)
+
+    assert result.waveform_vcd is None
+    assert result.waveform_vcd_id == encode_blob("$var wire 1 ! clock $end").id
+    assert result.waveform_vcd_size == len("$var wire 1 ! clock $end")
+
+
+def test_waveform_store_evicts_least_recently_used(tmp_path):
+    """Test that the disk store stays under budget, dropping the oldest files."""
+    blobs = [encode_blob(f"{i}" * 1000 + WAVEFORM[:i]) for i in range(3)]
+    store = WaveformStore(tmp_path / "waves", max_bytes=0)
+    for blob in blobs:
+        store.put(blob)
+    store.put(blobs[0])  # Touch: now most recently used
+
+    store.max_bytes = len(blobs[0].data) + len(blobs[2].data)
+    assert store.evict() == 2
+
+    # Down to the low-water mark, not just under max_bytes
+    assert store.path(blobs[1].id) is None and store.path(blobs[2].id) is None
+    assert store.path(blobs[0].id).read_bytes() == blobs[0].data
+    # A new instance picks up what is on disk
+    size = WaveformStore(tmp_path / "waves").get_stats()["size_bytes"]
+    assert size == store.get_stats()["size_bytes"] == len(blobs[0].data)
+
+
+def test_waveform_store_puts_at_budget_do_not_scan(tmp_path, monkeypatch):
+    """Test that a full store evicts in batches, from its in-memory index."""
+    blobs = [encode_blob(f"{i:03}" + WAVEFORM) for i in range(60)]
+    store = WaveformStore(tmp_path / "waves", max_bytes=len(blobs[0].data) * 20)
+    monkeypatch.setattr(store, "_scan", lambda: pytest.fail("store rescanned"))
+    evictions = []
+    evict = store.evict
+    monkeypatch.setattr(store, "evict", lambda: evictions.append(evict()))
+
+    for blob in blobs:
+        store.put(blob)
+
+    assert 0 < store.get_stats()["size_bytes"] <= store.max_bytes
+    # Each eviction makes room for several more puts
+    assert len(evictions) < sum(evictions) / 2
+    assert store.path(blobs[-1].id) is not None and store.path(blobs[0].id) is None
+
+
+def test_waveform_store_lookups_count_as_use(tmp_path):
+    """Test that a file that keeps being read isn't evicted as idle."""
+    blobs = [encode_blob(f"{i}" * 1000 + WAVEFORM) for i in range(3)]
+    store = WaveformStore(tmp_path / "waves", max_bytes=0)
+    for blob in blobs:
+        store.put(blob)
+    assert store.path(blobs[0].id) is not None
+
+    store.max_bytes = len(blobs[0].data) * 2
+    store.evict()
+
+    assert store.path(blobs[0].id) is not None
+    assert store.path(blobs[1].id) is None
+
+
+def test_pinned_files_survive_eviction(tmp_path):
+    """Test that a pinned file stays readable after it is evicted."""
+    blob = encode_blob(WAVEFORM)
+    store = WaveformStore(tmp_path / "waves", max_bytes=0)
+    store.put(blob)
+
+    pinned = store.pin(blob.id)
+    store.max_bytes = 1
+    assert store.evict() == 1
+
+    assert store.path(blob.id) is None and store.pin(blob.id) is None
+    assert pinned.read_bytes() == blob.data
+    store.unpin(pinned)
+    assert not pinned.exists()
+
+
+def test_files_stream_into_store(tmp_path):
+    """Test that put_file stores the same blob as encoding the file's text."""
+    src = tmp_path / "wave.vcd"
+    src.write_text(WAVEFORM)
+    store = WaveformStore(tmp_path / "waves", max_bytes=0)
+
+    blob = store.put_file(src)
+
+    assert blob == encode_blob(WAVEFORM)
+    assert store.path(blob.id).read_bytes() == blob.data
+    # Storing it again only touches it; no temporary files are left behind
+    assert store.put_file(src) == blob
+    assert [p.name for p in (tmp_path / "waves").iterdir()] == [blob.id[:2]]
+    assert store.get_stats()["size_bytes"] == len(blob.data)
+
+
+@pytest.mark.parametrize(
+    "header,expected",
+    [
+        ("gzip, deflate, br", True),
+        ("br;q=1.0, gzip;q=0.8", True),
+        ("gzip;q=0", False),
+        ("*", True),
+        ("identity", False),
+        ("", False),
+    ],
+)
+def test_accepts_gzip(header, expected):
+    assert _accepts_gzip(header) == expected
+
+
+def compile_with_waveform(client) -> dict:
+    response = client.post(
+        "/compile",
+        json={
+            "files": {"circuit.ml": "let x = 1", "test.ml": TEST_WITH_WAVEFORM},
+            "include_vcd": False,
+        },
+    )
+    return response.json()["waveform_ref"]
+
+
+def test_waveform_endpoint_negotiates_encoding(client, fake_dune):
+    """Test that compressed bytes are sent as is to gzip clients only."""
+    ref = compile_with_waveform(client)
+    assert ref["size"] == len(WAVEFORM)
+    assert ref["url"] == f"/waveforms/{ref['id']}"
+
+    gzipped = client.get(ref["url"], headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert int(gzipped.headers["content-length"]) < len(WAVEFORM) // 10
+    assert gzipped.text == WAVEFORM
+
+    plain = client.get(ref["url"], headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.text == WAVEFORM
+    assert plain.headers["etag"] != gzipped.headers["etag"]
+
+    assert client.get("/waveforms/" + "0" * 64).status_code == 404
+    assert client.get("/waveforms/not-an-id").status_code == 404
+
+
+def test_waveform_endpoint_caching_and_ranges(client, fake_dune):
+    """Test ETag revalidation, long-lived cache headers and Range requests."""
+    ref = compile_with_waveform(client)
+    headers = {"Accept-Encoding": "gzip"}
+
+    full = client.get(ref["url"], headers=headers)
+    assert full.headers["etag"] == f'"{ref["id"]}.gz"'
+    assert "immutable" in full.headers["cache-control"]
+
+    revalidated = client.get(
+        ref["url"], headers={**headers, "If-None-Match": full.headers["etag"]}
+    )
+    assert revalidated.status_code == 304
+
+    partial = client.get(ref["url"], headers={**headers, "Range": "bytes=0-9"})
+    assert partial.status_code == 206
+    assert partial.headers["content-range"].startswith("bytes 0-9/")
+
+
+def test_waveform_recreated_from_result_cache(client, fake_dune):
+    """Test that a payload evicted from disk is served again from the cache."""
+    from waveform_store import get_waveform_store
+
+    ref = compile_with_waveform(client)
+    get_waveform_store().path(ref["id"]).unlink()
+
+    response = client.get(ref["url"], headers={"Accept-Encoding": "identity"})
+
+    assert response.text == WAVEFORM
+
+
+def test_waveform_served_after_concurrent_eviction(client, fake_dune, monkeypatch):
+    """Test that a file evicted after the lookup is still sent, not a 500."""
+    from waveform_store import get_waveform_store
+
+    ref = compile_with_waveform(client)
+    store = get_waveform_store()
+    pin = store.pin
+
+    def pin_then_evict(blob_id, *args):
+        link = pin(blob_id, *args)
+        store._path(blob_id).unlink()
+        return link
+
+    monkeypatch.setattr(store, "pin", pin_then_evict)
+    response = client.get(ref["url"], headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.text == WAVEFORM
+    assert not list(store.root.glob(".pinned.*"))
@@ -1,10 +1,15 @@
 """Tests for the workspace cache."""
 
+import json
+import os
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
-from workspace_cache import WorkspaceCache
+from workspace_cache import ORPHAN_GRACE_SECONDS, WorkspaceCache
 
 
 @pytest.fixture
@@ -167,3 +172,291 @@ def test_get_stats(cache):
     assert stats["max_slots"] == 3
     assert stats["used_slots"] == 2
     assert len(stats["slots"]) == 2
+
+
+def slow_materialize(monkeypatch, delay):
+    """Make workspace creation take `delay` seconds."""
+    import workspace_cache
+
+    original = workspace_cache.materialize_workspace
+
+    def materialize(template_dir, workspace_path):
+        time.sleep(delay)
+        return original(template_dir, workspace_path)
+
+    monkeypatch.setattr(workspace_cache, "materialize_workspace", materialize)
+
+
+def test_cold_setup_does_not_block_cache_hits(cache, monkeypatch):
+    """Test that a slow new session doesn't delay another session's cache hit."""
+    workspace_cache, template = cache
+    workspace_cache.get_or_create("warm", is_n2t=False, template_dir=template)
+    slow_materialize(monkeypatch, 0.5)
+
+    cold = threading.Thread(
+        target=workspace_cache.get_or_create, args=("cold", False, template)
+    )
+    cold.start()
+    time.sleep(0.05)  # Let the cold session start creating
+
+    t0 = time.time()
+    _, is_hit = workspace_cache.get_or_create("warm", False, template)
+    elapsed = time.time() - t0
+    cold.join()
+
+    assert is_hit
+    assert elapsed < 0.25
+
+
+def test_concurrent_new_sessions_do_not_serialize(cache, monkeypatch):
+    """Test that two new sessions create their workspaces in parallel."""
+    workspace_cache, template = cache
+    slow_materialize(monkeypatch, 0.3)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        t0 = time.time()
+        futures = [
+            pool.submit(workspace_cache.get_or_create, name, False, template)
+            for name in ("session-1", "session-2")
+        ]
+        paths = [f.result()[0] for f in futures]
+        elapsed = time.time() - t0
+
+    assert all(path.exists() for path in paths)
+    assert elapsed < 0.55
+
+
+def test_concurrent_requests_share_new_workspace(cache, monkeypatch):
+    """Test that concurrent requests for a new session create it only once."""
+    workspace_cache, template = cache
+    slow_materialize(monkeypatch, 0.2)
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [
+            pool.submit(workspace_cache.get_or_create, "session-1", False, template)
+            for _ in range(3)
+        ]
+        paths = {f.result()[0] for f in futures}
+
+    assert len(paths) == 1
+    assert workspace_cache.get_stats()["used_slots"] == 1
+
+
+def test_checkout_serializes_builds_within_session(cache):
+    """Test that the slot lock is held between checkout and release."""
+    workspace_cache, template = cache
+    slot, _ = workspace_cache.checkout("session-1", False, template)
+
+    second = ThreadPoolExecutor(max_workers=1)
+    future = second.submit(workspace_cache.checkout, "session-1", False, template)
+    time.sleep(0.05)
+    assert not future.done()
+
+    slot.lock.release()
+    slot2, is_hit = future.result(timeout=5)
+    slot2.lock.release()
+    second.shutdown()
+
+    assert slot2 is slot
+    assert is_hit
+
+
+def test_eviction_skips_running_build(cache):
+    """Test that a workspace in use is passed over for the next idle one."""
+    workspace_cache, template = cache
+    slot, _ = workspace_cache.checkout("session-1", False, template)
+    path2, _ = workspace_cache.get_or_create("session-2", False, template)
+    workspace_cache.get_or_create("session-3", False, template)
+
+    # session-1 is LRU but building: creating session-4 evicts session-2
+    workspace_cache.get_or_create("session-4", False, template)
+    assert slot.path.exists()
+    assert not path2.exists()
+    slot.lock.release()
+
+    # Once idle, it is the next to go
+    workspace_cache.get_or_create("session-5", False, template)
+    assert not slot.path.exists()
+
+
+def test_all_busy_goes_over_max_slots(cache):
+    """Test that a new session gets a workspace even when every slot is in use."""
+    workspace_cache, template = cache
+    slots = [workspace_cache.checkout(f"session-{i}", False, template)[0] for i in range(3)]
+
+    path, _ = workspace_cache.get_or_create("session-4", False, template)
+
+    assert path.exists() and all(slot.path.exists() for slot in slots)
+    assert workspace_cache.get_stats()["used_slots"] == 4
+    for slot in slots:
+        slot.lock.release()
+
+
+def test_byte_budget_evicts_lru(temp_template_dir):
+    """Test that workspaces are evicted once their total size exceeds the budget."""
+    with tempfile.TemporaryDirectory() as cache_root:
+        workspace_cache = WorkspaceCache(
+            max_slots=10, cache_root=Path(cache_root), max_bytes=2500
+        )
+        path1, _ = workspace_cache.get_or_create("session-1", False, temp_template_dir)
+        (path1 / "big").write_text("x" * 1000)
+        path2, _ = workspace_cache.get_or_create("session-2", False, temp_template_dir)
+        (path2 / "big").write_text("x" * 1000)
+
+        # Re-accessing session-2 measures it: 2 x ~1000 bytes still fits
+        workspace_cache.get_or_create("session-2", False, temp_template_dir)
+        workspace_cache.get_or_create("session-1", False, temp_template_dir)
+        assert path1.exists() and path2.exists()
+
+        (path1 / "bigger").write_text("x" * 1000)
+        workspace_cache.get_or_create("session-1", False, temp_template_dir)
+
+        # session-2 is now LRU and goes; the session in use is kept
+        assert path1.exists()
+        assert not path2.exists()
+        assert workspace_cache.get_stats()["used_slots"] == 1
+
+
+def test_size_budget_counts_hardlinked_build_outputs(temp_template_dir):
+    """Test that _build files linked from the dune cache count against the budget."""
+    with tempfile.TemporaryDirectory() as cache_root, tempfile.TemporaryDirectory() as dune_cache:
+        workspace_cache = WorkspaceCache(
+            max_slots=10, cache_root=Path(cache_root), max_bytes=1500
+        )
+        paths = []
+        for i in range(2):
+            path, _ = workspace_cache.get_or_create(f"session-{i}", False, temp_template_dir)
+            # Dune stores the artifact in its cache and hardlinks it into _build
+            artifact = Path(dune_cache) / f"artifact-{i}"
+            artifact.write_text("x" * 2000)
+            (path / "_build" / "default").mkdir(parents=True, exist_ok=True)
+            os.link(artifact, path / "_build" / "default" / f"out-{i}.cmx")
+            paths.append(path)
+
+        # Each workspace is charged half of its 2000-byte artifact
+        workspace_cache.get_or_create("session-0", False, temp_template_dir)
+        assert paths[1].exists()
+        workspace_cache.get_or_create("session-1", False, temp_template_dir)
+
+        assert not paths[0].exists()
+        assert paths[1].exists()
+
+
+def test_free_space_floor_evicts(temp_template_dir):
+    """Test that a free-space floor the disk can't meet evicts other sessions."""
+    with tempfile.TemporaryDirectory() as cache_root:
+        workspace_cache = WorkspaceCache(
+            max_slots=10, cache_root=Path(cache_root), min_free_bytes=2**62
+        )
+        path1, _ = workspace_cache.get_or_create("session-1", False, temp_template_dir)
+        path2, _ = workspace_cache.get_or_create("session-2", False, temp_template_dir)
+
+        assert not path1.exists()
+        assert path2.exists()
+
+
+def test_idle_ttl_expires_workspaces(temp_template_dir):
+    """Test that idle workspaces are evicted after the TTL."""
+    with tempfile.TemporaryDirectory() as cache_root:
+        workspace_cache = WorkspaceCache(
+            max_slots=10, cache_root=Path(cache_root), idle_ttl=60
+        )
+        path1, _ = workspace_cache.get_or_create("session-1", False, temp_template_dir)
+        workspace_cache._slots["session-1"].last_accessed -= 120
+
+        workspace_cache.get_or_create("session-2", False, temp_template_dir)
+
+        assert not path1.exists()
+        assert workspace_cache.get_stats()["used_slots"] == 1
+
+
+def test_workspaces_survive_restart(temp_template_dir):
+    """Test that a new cache instance re-adopts workspaces from the index."""
+    with tempfile.TemporaryDirectory() as cache_root:
+        first = WorkspaceCache(max_slots=3, cache_root=Path(cache_root))
+        path1, _ = first.get_or_create("session-1", False, temp_template_dir)
+        path2, _ = first.get_or_create("session-2", True, temp_template_dir)
+        (path1 / "_build").mkdir()
+        # session-1 becomes most recently used
+        first.get_or_create("session-1", False, temp_template_dir)
+
+        second = WorkspaceCache(max_slots=3, cache_root=Path(cache_root))
+        again, is_hit = second.get_or_create("session-1", False, temp_template_dir)
+
+        assert is_hit
+        assert again == path1
+        assert (path1 / "_build").exists()
+        assert [s["is_n2t"] for s in second.get_stats()["slots"]] == [True, False]
+
+
+def test_invalid_and_orphaned_workspaces_removed(temp_template_dir):
+    """Test that unusable index entries and unknown directories are dropped."""
+    with tempfile.TemporaryDirectory() as cache_root:
+        root = Path(cache_root)
+        first = WorkspaceCache(max_slots=3, cache_root=root)
+        path1, _ = first.get_or_create("session-1", False, temp_template_dir)
+        path2, _ = first.get_or_create("session-2", False, temp_template_dir)
+        (path2 / "dune-project").unlink()  # No longer a valid workspace
+        (root / "stray-dir").mkdir()
+        old = time.time() - ORPHAN_GRACE_SECONDS - 1
+        os.utime(root / "stray-dir", (old, old))
+        # Possibly another worker's, not indexed yet
+        (root / "young-dir").mkdir()
+        (root / ".pool").mkdir()
+
+        second = WorkspaceCache(max_slots=3, cache_root=root)
+
+        assert second.get_stats()["used_slots"] == 1
+        assert path1.exists()
+        assert not path2.exists()
+        assert not (root / "stray-dir").exists()
+        assert (root / "young-dir").exists()
+        assert (root / ".pool").exists()
+
+
+def test_other_workers_workspaces_left_alone(temp_template_dir):
+    """Test that a live process's index entries are neither adopted nor dropped."""
+    with tempfile.TemporaryDirectory() as cache_root:
+        root = Path(cache_root)
+        first = WorkspaceCache(max_slots=3, cache_root=root)
+        path1, _ = first.get_or_create("session-1", False, temp_template_dir)
+        # Make the entry another running worker's (our parent process)
+        index = json.loads((root / "index.json").read_text())
+        index["slots"][0]["pid"] = os.getppid()
+        (root / "index.json").write_text(json.dumps(index))
+
+        second = WorkspaceCache(max_slots=3, cache_root=root)
+        path2, _ = second.get_or_create("session-2", False, temp_template_dir)
+        second.clear()
+
+        assert second.get_stats()["used_slots"] == 0
+        assert path1.exists() and not path2.exists()
+        slots = json.loads((root / "index.json").read_text())["slots"]
+        assert [(e["dir"], e["pid"]) for e in slots] == [(path1.name, os.getppid())]
+
+
+def test_cache_hits_do_not_rewrite_index(cache, monkeypatch):
+    """Test that the index is only written when the slot map changes."""
+    workspace_cache, template = cache
+    workspace_cache.get_or_create("session-1", False, template)
+    saves = []
+    monkeypatch.setattr(workspace_cache, "_save_index", lambda: saves.append(1))
+
+    for _ in range(3):
+        workspace_cache.get_or_create("session-1", False, template)
+    workspace_cache.get_or_create("session-2", False, template)
+
+    assert len(saves) == 1
+
+
+def test_corrupt_index_ignored(temp_template_dir):
+    """Test that an unreadable index starts an empty cache."""
+    with tempfile.TemporaryDirectory() as cache_root:
+        root = Path(cache_root)
+        (root / "index.json").write_text("{not json")
+
+        cache = WorkspaceCache(max_slots=3, cache_root=root)
+        _, is_hit = cache.get_or_create("session-1", False, temp_template_dir)
+
+        assert not is_hit
+        assert cache.get_stats()["used_slots"] == 1
@@ -0,0 +1,105 @@
+"""Tests for template materialization (reflink / hardlink / copy)."""
+
+import os
+from pathlib import Path
+
+import pytest
+from workspace_materializer import materialize_tree
+
+
+@pytest.fixture
+def template(tmp_path):
+    """A template with sources, dune state files and nested build artifacts."""
+    root = tmp_path / "template"
+    (root / "_build" / "default" / ".user_circuit.objs").mkdir(parents=True)
+    (root / "test").mkdir()
+    (root / "dune-project").write_text("(lang dune 3.11)")
+    (root / "test" / "harness_utils.ml").write_text("let x = ()")
+    (root / "_build" / ".db").write_text("dune state")
+    (root / "_build" / "log").write_text("dune log")
+    artifact = root / "_build" / "default" / ".user_circuit.objs" / "circuit.cmx"
+    artifact.write_bytes(b"\x00" * 4096)
+    (root / "_build" / "default" / "circuit.ml").write_text("let x = 1")
+    os.symlink("default/circuit.ml", root / "_build" / "link.ml")
+    return root
+
+
+def shares_storage(a: Path, b: Path) -> bool:
+    """Same inode means a hardlink (reflinks get their own inode)."""
+    return os.stat(a).st_ino == os.stat(b).st_ino
+
+
+def test_materializes_full_tree(template, tmp_path):
+    """Test that every file and symlink is recreated with the same content."""
+    dest = tmp_path / "workspace"
+    stats = materialize_tree(template, dest)
+
+    assert (dest / "dune-project").read_text() == "(lang dune 3.11)"
+    assert (dest / "_build" / ".db").read_text() == "dune state"
+    assert (
+        dest / "_build" / "default" / ".user_circuit.objs" / "circuit.cmx"
+    ).read_bytes() == b"\x00" * 4096
+    assert os.readlink(dest / "_build" / "link.ml") == "default/circuit.ml"
+    assert stats.files == 6
+    assert stats.cloned + stats.linked + stats.copied == stats.files
+
+
+def test_skip_top_level_entries(template, tmp_path):
+    """Test that skipped top-level directories are not materialized."""
+    dest = tmp_path / "workspace"
+    materialize_tree(template, dest, skip={"test"})
+
+    assert not (dest / "test").exists()
+    assert (dest / "dune-project").exists()
+
+
+def test_mutable_files_never_share_inodes(template, tmp_path):
+    """Test that sources and dune's state files are private to the workspace."""
+    dest = tmp_path / "workspace"
+    materialize_tree(template, dest)
+
+    for rel in ["dune-project", "_build/.db", "_build/log"]:
+        assert not shares_storage(template / rel, dest / rel), rel
+
+    # Writing to a workspace source must not touch the template
+    (dest / "dune-project").write_text("changed")
+    assert (template / "dune-project").read_text() == "(lang dune 3.11)"
+
+
+def test_build_artifacts_are_not_copied(template, tmp_path):
+    """Test that build artifacts are cloned or hardlinked instead of copied."""
+    dest = tmp_path / "workspace"
+    stats = materialize_tree(template, dest)
+
+    artifact = Path("_build/default/.user_circuit.objs/circuit.cmx")
+    if stats.cloned == 0:
+        assert shares_storage(template / artifact, dest / artifact)
+    # dune-project, .db and log must be real copies (or clones)
+    assert stats.linked <= 2
+
+
+def test_no_hardlinks_when_disabled(template, tmp_path):
+    """Test that link_build=False never hardlinks."""
+    dest = tmp_path / "workspace"
+    stats = materialize_tree(template, dest, link_build=False)
+
+    assert stats.linked == 0
+
+
+def test_materialize_into_existing_dir_does_not_write_through(template, tmp_path):
+    """Test that materializing over an existing hardlinked tree replaces files."""
+    dest = tmp_path / "workspace"
+    materialize_tree(template, dest)
+    materialize_tree(template, dest)
+
+    artifact = Path("_build/default/.user_circuit.objs/circuit.cmx")
+    assert (template / artifact).read_bytes() == b"\x00" * 4096
+    assert (dest / artifact).read_bytes() == b"\x00" * 4096
+
+
+def test_build_subtree_with_rel_root(template, tmp_path):
+    """Test that rel_root marks a materialized _build tree's state files as mutable."""
+    dest = tmp_path / "workspace" / "_build"
+    materialize_tree(template / "_build", dest, rel_root=("_build",))
+
+    assert not shares_storage(template / "_build" / ".db", dest / ".db")
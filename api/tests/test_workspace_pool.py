@@ -0,0 +1,182 @@
+"""Tests for the pre-warmed workspace pool."""
+
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import compiler
+import pytest
+from build_executor import BuildExecutor
+from trash_reaper import TrashReaper
+from workspace_cache import WorkspaceCache
+from workspace_pool import WorkspacePool
+
+
+@pytest.fixture
+def template_dir():
+    """Create a minimal template with a pre-built _build/ artifact."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        template = Path(tmpdir) / "template"
+        (template / "test").mkdir(parents=True)
+        (template / "dune-project").write_text("(lang dune 3.11)")
+        (template / "test" / "harness_utils.ml").write_text("let x = ()")
+        (template / "_build" / "default").mkdir(parents=True)
+        (template / "_build" / "default" / "lib.cmx").write_text("artifact")
+        yield template
+
+
+@pytest.fixture
+def cache_root():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield Path(tmpdir)
+
+
+def make_pool(cache_root, template_dir, **kwargs):
+    """Create a pool whose warm-up build just records what it was given."""
+    builds = []
+
+    def warm_build(path, is_n2t):
+        builds.append((path.name, is_n2t, sorted(p.name for p in path.iterdir())))
+        (path / "_build" / "default" / "warm.stamp").write_text("built")
+
+    pool = WorkspacePool(
+        pool_root=cache_root / ".pool",
+        template_dir_for=lambda is_n2t: template_dir,
+        warm_build=warm_build,
+        **kwargs,
+    )
+    return pool, builds
+
+
+def test_refill_prepares_both_project_types(cache_root, template_dir):
+    """Test that refill tops up standard and N2T pools to the target."""
+    pool, builds = make_pool(cache_root, template_dir, target_size=2)
+
+    assert pool.refill() == 4
+    assert pool.get_stats()["ready"] == {"standard": 2, "n2t": 2}
+    assert [is_n2t for _, is_n2t, _ in builds] == [False, False, True, True]
+    # Warm-up builds run against placeholder sources and a generated dune file
+    _, _, names = builds[0]
+    assert {"circuit.ml", "test.ml", "dune", "harness_utils.ml"} <= set(names)
+
+    # Already full: nothing more to do
+    assert pool.refill() == 0
+
+
+def test_claim_moves_warm_workspace(cache_root, template_dir):
+    """Test that a claimed workspace keeps its build state but not placeholders."""
+    pool, _ = make_pool(cache_root, template_dir, target_size=1)
+    pool.refill()
+
+    dest = cache_root / "session-1"
+    assert pool.claim(False, dest)
+
+    assert (dest / "_build" / "default" / "warm.stamp").read_text() == "built"
+    assert (dest / "harness_utils.ml").exists()
+    assert not (dest / "circuit.ml").exists()
+    assert not (dest / "circuit.mli").exists()
+    assert pool.get_stats()["ready"]["standard"] == 0
+    assert pool.get_stats()["claimed"] == 1
+
+
+def test_claim_from_empty_pool_misses(cache_root, template_dir):
+    """Test that claiming from an empty pool reports a miss."""
+    pool, _ = make_pool(cache_root, template_dir, target_size=1)
+
+    assert not pool.claim(True, cache_root / "session-1")
+    assert not (cache_root / "session-1").exists()
+    assert pool.get_stats()["misses"] == 1
+
+
+def test_refill_defers_to_user_builds(cache_root, template_dir):
+    """Test that refill stops while user builds are waiting."""
+    pool, builds = make_pool(
+        cache_root, template_dir, target_size=2, should_defer=lambda: True
+    )
+
+    assert pool.refill() == 0
+    assert builds == []
+
+
+def test_stale_pool_entries_removed_on_startup(cache_root, template_dir):
+    """Test that leftovers from a previous process are not reused."""
+    stale = cache_root / ".pool" / "standard-old"
+    stale.mkdir(parents=True)
+
+    pool, _ = make_pool(cache_root, template_dir)
+
+    assert not stale.exists()
+    assert pool.get_stats()["ready"] == {"standard": 0, "n2t": 0}
+
+
+def test_stale_pool_moved_to_trash(cache_root, template_dir):
+    """Test that with a trash reaper, startup hands old pool entries to it."""
+    stale = cache_root / ".pool" / "standard-old"
+    stale.mkdir(parents=True)
+    trash = TrashReaper(trash_root=cache_root / "trash")
+    trash._ensure_started = lambda: None
+
+    make_pool(cache_root, template_dir, trash=trash)
+
+    assert not stale.exists() and (cache_root / ".pool").is_dir()
+    assert trash.get_stats()["pending"] == 1
+
+
+def test_pools_are_per_process(cache_root, template_dir):
+    """Test that startup keeps live workers' pools and reaps dead ones."""
+    live = cache_root / ".pool" / str(os.getppid()) / "standard-live"
+    live.mkdir(parents=True)
+    dead = cache_root / ".pool" / "999999999" / "standard-dead"
+    dead.mkdir(parents=True)
+
+    pool, _ = make_pool(cache_root, template_dir)
+
+    assert pool.pool_root == cache_root / ".pool" / str(os.getpid())
+    assert live.exists()
+    assert not dead.parent.exists()
+
+
+def test_claim_of_vanished_workspace_misses(cache_root, template_dir):
+    """Test that a pooled workspace deleted underneath us counts as a miss."""
+    pool, _ = make_pool(cache_root, template_dir, target_size=1)
+    pool.refill()
+    shutil.rmtree(pool._ready[False][0])
+
+    dest = cache_root / "session-1"
+    assert not pool.claim(False, dest)
+    assert not dest.exists()
+    assert pool.get_stats()["claimed"] == 0
+    assert pool.get_stats()["misses"] == 1
+
+
+def test_warm_builds_take_a_build_slot(fake_dune, cache_root, monkeypatch):
+    """Test that warm-up builds run in a build executor slot."""
+    executor = BuildExecutor(workers=1, queue_size=0)
+    monkeypatch.setattr(compiler, "get_build_executor", lambda: executor)
+
+    compiler.warm_workspace(cache_root, False)
+
+    assert executor.get_stats()["completed"] == 1
+
+
+def test_workspace_cache_uses_pool(cache_root, template_dir):
+    """Test that new sessions claim pooled workspaces and refill in background."""
+    pool, _ = make_pool(cache_root, template_dir, target_size=1)
+    pool.refill()
+    cache = WorkspaceCache(max_slots=3, cache_root=cache_root, pool=pool)
+    pool.start()
+    try:
+        path, cache_hit = cache.get_or_create("session-1", False, template_dir)
+
+        assert not cache_hit
+        assert path.parent == cache_root
+        assert (path / "_build" / "default" / "warm.stamp").exists()
+
+        deadline = time.time() + 5
+        while pool.get_stats()["ready"]["standard"] < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        assert pool.get_stats()["ready"]["standard"] == 1
+    finally:
+        pool.stop()
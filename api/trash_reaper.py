@@ -0,0 +1,256 @@
+"""
+Deferred deletion of workspaces and build directories.
+
+Deleting a workspace with a full _build tree takes hundreds of milliseconds,
+which used to land on whichever request triggered an eviction or finished a
+temporary build. Instead, directories are renamed into a trash area (O(1) on
+the same filesystem) and a background reaper deletes them at a bounded rate
+so it doesn't compete with builds for disk I/O. Anything left in the trash
+by a previous process is reaped at startup.
+
+A directory on another filesystem than the trash can't be renamed into it;
+it is hidden as a .trash-* directory next to where it was instead, and its
+parent is recorded in the trash (ROOTS_FILE) so startup finds those too.
+"""
+
+import errno
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+# Default configuration
+DEFAULT_TRASH_ROOT = Path(tempfile.gettempdir()) / "hardcaml-trash"
+DEFAULT_FILES_PER_SECOND = 20000
+
+# Check the deletion rate after this many files
+_THROTTLE_BATCH = 256
+
+# Directories (one per line) that have held .trash-* directories
+ROOTS_FILE = ".roots"
+_TRASH_PREFIX = ".trash-"
+
+
+class TrashReaper:
+    """Moves directories out of the way immediately and deletes them later."""
+
+    def __init__(
+        self,
+        trash_root: Path = DEFAULT_TRASH_ROOT,
+        files_per_second: int = DEFAULT_FILES_PER_SECOND,
+    ):
+        self.trash_root = trash_root
+        # 0 disables throttling
+        self.files_per_second = files_per_second
+        self.trash_root.mkdir(parents=True, exist_ok=True)
+
+        self._pending: deque[tuple[Path, int]] = deque()
+        # Bytes that pending deletions will free (as reported by callers)
+        self._pending_bytes = 0
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread: threading.Thread | None = None
+        self._reaped = 0
+        self._files_deleted = 0
+        # Contents of ROOTS_FILE
+        self._roots = self._read_roots()
+
+    def discard(self, path: Path, size_bytes: int = 0) -> bool:
+        """
+        Take a directory out of service and schedule it for deletion.
+
+        Args:
+            path: Directory to delete
+            size_bytes: Space its deletion will free, if known (see pending_bytes)
+
+        Returns:
+            False if path did not exist, True otherwise.
+        """
+        target = self.trash_root / f"{path.name}-{uuid.uuid4().hex[:8]}"
+        try:
+            os.rename(path, target)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Different filesystem: hide it next to where it was instead
+            target = path.parent / f"{_TRASH_PREFIX}{path.name}-{uuid.uuid4().hex[:8]}"
+            self._remember_root(path.parent)
+            os.rename(path, target)
+
+        with self._cond:
+            self._pending.append((target, size_bytes))
+            self._pending_bytes += size_bytes
+            self._cond.notify()
+        self._ensure_started()
+        return True
+
+    def _read_roots(self) -> set[Path]:
+        """Directories recorded in ROOTS_FILE."""
+        try:
+            lines = (self.trash_root / ROOTS_FILE).read_text().splitlines()
+        except FileNotFoundError:
+            return set()
+        return {Path(line) for line in lines if line}
+
+    def _remember_root(self, root: Path) -> None:
+        """Record a directory that .trash-* directories are created in."""
+        with self._cond:
+            if root in self._roots:
+                return
+            self._roots.add(root)
+            # Appends of a line are atomic enough; a lost line only delays
+            # reaping until that root is used again
+            with open(self.trash_root / ROOTS_FILE, "a") as f:
+                f.write(f"{root}\n")
+
+    def _leftovers(self) -> list[Path]:
+        """Directories a previous process discarded but didn't delete."""
+        leftovers = [
+            Path(entry.path)
+            for entry in os.scandir(self.trash_root)
+            if entry.name != ROOTS_FILE
+        ]
+        with self._cond:
+            roots = list(self._roots)
+        for root in roots:
+            try:
+                entries = list(os.scandir(root))
+            except FileNotFoundError:
+                continue
+            leftovers.extend(
+                Path(entry.path)
+                for entry in entries
+                if entry.name.startswith(_TRASH_PREFIX)
+                and entry.is_dir(follow_symlinks=False)
+            )
+        return leftovers
+
+    def _delete_tree(self, root: Path) -> None:
+        """Delete a tree file by file, pausing to stay under the rate limit."""
+        deleted = 0
+        t0 = time.time()
+        stack = [(str(root), False)]
+        while stack:
+            path, visited = stack.pop()
+            if visited:
+                os.rmdir(path)
+                continue
+            stack.append((path, True))
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, False))
+                        continue
+                    os.unlink(entry.path)
+                    deleted += 1
+                    if self.files_per_second and deleted % _THROTTLE_BATCH == 0:
+                        ahead = deleted / self.files_per_second - (time.time() - t0)
+                        if ahead > 0:
+                            time.sleep(ahead)
+        self._files_deleted += deleted
+
+    def reap_one(self) -> bool:
+        """Delete the oldest pending directory. Returns False if none was pending."""
+        with self._cond:
+            if not self._pending:
+                return False
+            path, size_bytes = self._pending[0]
+        try:
+            self._delete_tree(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning(f"Failed to reap {path}: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+        with self._cond:
+            self._pending.popleft()
+            self._pending_bytes -= size_bytes
+        self._reaped += 1
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+            self.reap_one()
+
+    def _ensure_started(self) -> None:
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop = False
+            self._thread = threading.Thread(
+                target=self._run, name="trash-reaper", daemon=True
+            )
+            self._thread.start()
+
+    def start(self) -> None:
+        """Start the reaper, first scheduling leftovers from a previous run."""
+        leftovers = self._leftovers()
+        if leftovers:
+            log.info(f"Reaping {len(leftovers)} leftover directories")
+        with self._cond:
+            known = {path for path, _ in self._pending}
+            self._pending.extend((p, 0) for p in leftovers if p not in known)
+            self._cond.notify()
+        self._ensure_started()
+
+    def stop(self) -> None:
+        """Stop the reaper. Pending directories stay in the trash until next start."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def pending_bytes(self) -> int:
+        """Space that deletions still in the trash will free."""
+        with self._cond:
+            return self._pending_bytes
+
+    def get_stats(self) -> dict:
+        """Get reaper statistics."""
+        with self._cond:
+            pending = len(self._pending)
+            pending_bytes = self._pending_bytes
+        return {
+            "path": str(self.trash_root),
+            "pending": pending,
+            "pending_bytes": pending_bytes,
+            "reaped": self._reaped,
+            "files_deleted": self._files_deleted,
+        }
+
+
+# Global singleton instance
+_reaper_instance: TrashReaper | None = None
+_reaper_lock = threading.Lock()
+
+
+def get_trash_reaper() -> TrashReaper:
+    """Get the global trash reaper."""
+    global _reaper_instance
+    if _reaper_instance is None:
+        with _reaper_lock:
+            if _reaper_instance is None:
+                from config import TRASH_DIR, TRASH_REAP_FILES_PER_SECOND
+
+                _reaper_instance = TrashReaper(
+                    trash_root=Path(TRASH_DIR),
+                    files_per_second=TRASH_REAP_FILES_PER_SECOND,
+                )
+    return _reaper_instance
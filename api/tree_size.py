@@ -0,0 +1,113 @@
+"""
+Incremental on-disk size accounting for directory trees.
+
+Re-walking a workspace's _build tree (or the dune cache) with rglob after
+every build is as slow as the build cache it is measuring. Dune replaces
+build targets by creating and renaming files, which updates the parent
+directory's mtime, so a tracker only needs to stat each directory and
+rescan the ones whose mtime changed since the previous measurement.
+
+Files rewritten in place without a directory change are missed until their
+directory changes; for dune trees that is acceptable.
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# A directory modified this recently may change again within the same mtime
+# tick; don't trust its cached listing (same idea as git's "racy" index check)
+_RACY_SECONDS = 2.0
+
+
+@dataclass
+class _DirEntry:
+    mtime_ns: int
+    size: int
+    files: int
+    subdirs: list[str] = field(default_factory=list)
+    trusted: bool = True
+
+
+class TreeSizeTracker:
+    """
+    Tracks total file size and count under root across repeated measurements.
+
+    With split_hardlinks, a file with n hardlinks counts for 1/n of its
+    size: its blocks are shared with a template, the dune cache or other
+    workspaces, so each tree is charged its share of them. Skipping such
+    files altogether would leave dune's cache-linked _build trees almost
+    uncounted.
+    """
+
+    def __init__(self, root: Path, split_hardlinks: bool = False):
+        self.root = root
+        self.split_hardlinks = split_hardlinks
+        self._dirs: dict[str, _DirEntry] = {}
+        self.size_bytes = 0
+        self.file_count = 0
+        # Directories listed by the last refresh (the rest came from cache)
+        self.dirs_rescanned = 0
+
+    def _scan_dir(self, path: str, mtime_ns: int, now: float) -> _DirEntry | None:
+        entry = _DirEntry(
+            mtime_ns=mtime_ns,
+            size=0,
+            files=0,
+            trusted=now - mtime_ns / 1e9 > _RACY_SECONDS,
+        )
+        try:
+            with os.scandir(path) as entries:
+                for child in entries:
+                    try:
+                        if child.is_dir(follow_symlinks=False):
+                            entry.subdirs.append(child.path)
+                        elif child.is_file(follow_symlinks=False):
+                            st = child.stat(follow_symlinks=False)
+                            if self.split_hardlinks and st.st_nlink > 1:
+                                entry.size += st.st_size // st.st_nlink
+                            else:
+                                entry.size += st.st_size
+                            entry.files += 1
+                    except OSError:
+                        continue  # Entry vanished mid-scan
+        except OSError:
+            return None
+        self.dirs_rescanned += 1
+        return entry
+
+    def refresh(self) -> tuple[int, int]:
+        """
+        Re-measure the tree, rescanning only directories that changed.
+
+        Returns:
+            Tuple of (size_bytes, file_count)
+        """
+        now = time.time()
+        self.dirs_rescanned = 0
+        seen: dict[str, _DirEntry] = {}
+        size = 0
+        count = 0
+        stack = [str(self.root)]
+        while stack:
+            path = stack.pop()
+            try:
+                mtime_ns = os.stat(path, follow_symlinks=False).st_mtime_ns
+            except OSError:
+                continue
+            entry = self._dirs.get(path)
+            if entry is None or not entry.trusted or entry.mtime_ns != mtime_ns:
+                entry = self._scan_dir(path, mtime_ns, now)
+                if entry is None:
+                    continue
+            seen[path] = entry
+            size += entry.size
+            count += entry.files
+            stack.extend(entry.subdirs)
+
+        # Directories that no longer exist drop out here
+        self._dirs = seen
+        self.size_bytes = size
+        self.file_count = count
+        return size, count
@@ -0,0 +1,298 @@
+"""
+Streaming VCD parser.
+
+VCDs from long simulations run to hundreds of megabytes, so nothing here
+reads a whole file into memory: the definitions are parsed into a
+VcdHeader, then value changes are yielded one at a time from a binary
+stream (a file, or gzip.open() of a stored payload). Memory use is bounded
+by the longest line.
+
+build_index() makes one pass and keeps per-signal summaries (change count,
+first/last change time, and sparse byte offsets of the signal's changes)
+plus global checkpoints mapping times to byte offsets, so later readers can
+seek close to a time, or to where one signal changes, instead of scanning
+from the start (see iter_signal_changes()). waveform_columns builds its
+columnar files on top of iter_changes().
+"""
+
+import gzip
+from dataclasses import dataclass, field
+from operator import itemgetter
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+# Minimum bytes between index checkpoints, globally and per signal
+CHECKPOINT_BYTES = 1024 * 1024
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+# (time, time_offset, code, value) -> (time, code, value)
+_WITHOUT_OFFSET = itemgetter(0, 2, 3)
+
+
+class VcdFormatError(ValueError):
+    """The input is not a VCD."""
+
+
+@dataclass
+class VcdVariable:
+    """A $var declaration."""
+
+    # Scope path below the top scope, then the reference, joined with "."
+    name: str
+    width: int
+    # Identifier code used in value changes; aliases share one
+    code: bytes
+
+
+@dataclass
+class VcdHeader:
+    """The definitions section of a VCD."""
+
+    timescale: Optional[str] = None
+    variables: list[VcdVariable] = field(default_factory=list)
+    # Byte offset of the first value change
+    data_offset: int = 0
+
+
+@dataclass
+class SignalSummary:
+    """Changes of one identifier code."""
+
+    count: int = 0
+    first_time: Optional[int] = None
+    last_time: Optional[int] = None
+    # (time, byte offset of its "#time" line) for the first change, then for
+    # changes at least CHECKPOINT_BYTES past the previous entry. Scanning
+    # from an entry reaches the signal's next change within about
+    # CHECKPOINT_BYTES, or that change has an entry of its own.
+    offsets: list[tuple[int, int]] = field(default_factory=list)
+
+    @property
+    def first_offset(self) -> Optional[int]:
+        """Byte offset to read from to reach the first change."""
+        return self.offsets[0][1] if self.offsets else None
+
+
+@dataclass
+class VcdIndex:
+    """One-pass summary of a VCD."""
+
+    header: VcdHeader
+    # By identifier code
+    signals: dict[bytes, SignalSummary]
+    min_time: Optional[int]
+    max_time: Optional[int]
+    changes: int
+    # (time, byte offset of its "#time" line), at least CHECKPOINT_BYTES apart
+    checkpoints: list[tuple[int, int]]
+
+
+def open_vcd(path: Path) -> BinaryIO:
+    """Open a VCD file for streaming, decompressing it if gzipped."""
+    with open(path, "rb") as f:
+        compressed = f.read(2) == _GZIP_MAGIC
+    return gzip.open(path, "rb") if compressed else open(path, "rb")
+
+
+def read_header(stream: BinaryIO) -> VcdHeader:
+    """
+    Parse the definitions section, leaving the stream at the first change.
+
+    Args:
+        stream: Binary stream positioned at the start of the VCD
+
+    Returns:
+        VcdHeader
+
+    Raises:
+        VcdFormatError: If the stream ends before $enddefinitions.
+    """
+    header = VcdHeader()
+    scopes: list[str] = []
+    # Tokens of the $keyword ... $end block being read
+    block: list[bytes] = []
+    offset = 0
+    for line in stream:
+        offset += len(line)
+        for token in line.split():
+            if block:
+                if token != b"$end":
+                    block.append(token)
+                    continue
+                keyword, args = block[0], block[1:]
+                block = []
+                if keyword == b"$enddefinitions":
+                    header.data_offset = offset
+                    return header
+                if keyword == b"$scope" and len(args) >= 2:
+                    scopes.append(args[1].decode("utf-8", "replace"))
+                elif keyword == b"$upscope" and scopes:
+                    scopes.pop()
+                elif keyword == b"$var" and len(args) >= 4:
+                    # $var <type> <width> <id> <reference> [<range>] $end
+                    name = ".".join(scopes[1:] + [args[3].decode("utf-8", "replace")])
+                    header.variables.append(VcdVariable(name, int(args[1]), args[2]))
+                elif keyword == b"$timescale":
+                    header.timescale = b"".join(args).decode("ascii", "replace")
+            elif token.startswith(b"$") and token != b"$end":
+                block = [token]
+    raise VcdFormatError("No $enddefinitions in VCD")
+
+
+def iter_changes(
+    stream: BinaryIO,
+    offset: int = 0,
+    checkpoints: Optional[list[tuple[int, int]]] = None,
+) -> Iterator[tuple[int, bytes, bytes]]:
+    """
+    Yield the value changes of a VCD.
+
+    Args:
+        stream: Binary stream positioned after the definitions (see
+            read_header) or at a checkpoint
+        offset: Byte offset of the stream position, for checkpoints
+        checkpoints: If given, (time, offset) pairs are appended to it
+
+    Yields:
+        (time, code, value) with value as VCD bits (b"1", b"0101", b"x").
+        Changes are in file order; $dumpvars values come at time 0 or at
+        the time before them.
+    """
+    # itemgetter keeps the extra field from costing a Python-level generator
+    return map(_WITHOUT_OFFSET, _iter_changes(stream, offset, checkpoints))
+
+
+def _iter_changes(
+    stream: BinaryIO,
+    offset: int = 0,
+    checkpoints: Optional[list[tuple[int, int]]] = None,
+) -> Iterator[tuple[int, int, bytes, bytes]]:
+    """
+    Like iter_changes(), also yielding the byte offset of each change's
+    "#time" line (the stream offset for changes before the first one).
+    """
+    time = 0
+    time_offset = offset
+    next_checkpoint = offset
+    in_comment = False
+    for line in stream:
+        line_offset = offset
+        offset += len(line)
+        tokens = line.split()
+        i = 0
+        n = len(tokens)
+        while i < n:
+            token = tokens[i]
+            i += 1
+            if in_comment:
+                in_comment = token != b"$end"
+                continue
+            head = token[0]
+            if head == 35:  # "#"
+                time = int(token[1:])
+                time_offset = line_offset
+                if checkpoints is not None and line_offset >= next_checkpoint:
+                    checkpoints.append((time, line_offset))
+                    next_checkpoint = line_offset + CHECKPOINT_BYTES
+            elif head == 36:  # "$"
+                # $dumpvars/$dumpall/... blocks hold ordinary value changes
+                in_comment = token == b"$comment"
+            elif head in b"bB":
+                if i < n:
+                    yield time, time_offset, tokens[i], token[1:]
+                    i += 1
+            elif head in b"rR":
+                # Real values aren't produced by Hardcaml
+                i += 1
+            else:
+                yield time, time_offset, token[1:], token[:1]
+
+
+def build_index(stream: BinaryIO) -> VcdIndex:
+    """
+    Read a VCD once and summarize it.
+
+    Args:
+        stream: Binary stream positioned at the start of the VCD
+
+    Returns:
+        VcdIndex
+
+    Raises:
+        VcdFormatError: If the stream is not a VCD.
+    """
+    header = read_header(stream)
+    signals = {variable.code: SignalSummary() for variable in header.variables}
+    checkpoints: list[tuple[int, int]] = []
+    min_time = max_time = None
+    changes = 0
+    for time, time_offset, code, _ in _iter_changes(
+        stream, header.data_offset, checkpoints
+    ):
+        summary = signals.get(code)
+        if summary is None:
+            continue
+        offsets = summary.offsets
+        if not offsets or time_offset >= offsets[-1][1] + CHECKPOINT_BYTES:
+            offsets.append((time, time_offset))
+        if summary.count == 0:
+            summary.first_time = time
+        summary.last_time = time
+        summary.count += 1
+        changes += 1
+        if min_time is None:
+            min_time = time
+        max_time = time
+    return VcdIndex(
+        header=header,
+        signals=signals,
+        min_time=min_time,
+        max_time=max_time,
+        changes=changes,
+        checkpoints=checkpoints,
+    )
+
+
+def iter_signal_changes(
+    stream: BinaryIO, index: VcdIndex, code: bytes, start_time: int = 0
+) -> Iterator[tuple[int, bytes]]:
+    """
+    Yield one signal's changes from a time on, seeking past the rest.
+
+    Reading starts from the signal's latest offset (see SignalSummary) at
+    or before start_time, so neither the start of the file nor the signal's
+    quiet stretches are scanned.
+
+    Args:
+        stream: Seekable binary stream of the VCD the index was built from
+        index: Its VcdIndex
+        code: Identifier code of the signal
+        start_time: First time of interest. The change in effect at that
+            time (the last one at or before it) is yielded first.
+
+    Yields:
+        (time, value) as in iter_changes().
+    """
+    summary = index.signals.get(code)
+    if summary is None or not summary.offsets:
+        return
+    offset = summary.offsets[0][1]
+    for entry_time, entry_offset in summary.offsets[1:]:
+        if entry_time > start_time:
+            break
+        offset = entry_offset
+    stream.seek(offset)
+    held: Optional[tuple[int, bytes]] = None
+    for time, _, change_code, value in _iter_changes(stream, offset):
+        if change_code != code:
+            continue
+        if time <= start_time:
+            held = (time, value)
+            continue
+        if held is not None:
+            yield held
+            held = None
+        yield time, value
+    if held is not None:
+        yield held
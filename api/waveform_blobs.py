@@ -0,0 +1,85 @@
+"""
+Compressed, content-addressed waveform and VCD payloads.
+
+Waveforms are the bulk of a cached result (a long AoC simulation's VCD runs
+to megabytes of highly repetitive text). The result cache and store keep
+them gzip-compressed under the hash of their text, and GET /waveforms/{id}
+sends the compressed bytes as they are to clients that accept gzip.
+"""
+
+import gzip
+import hashlib
+import zlib
+from dataclasses import dataclass
+from typing import BinaryIO
+
+# zlib's default trade-off; waveforms compress ~10x at this level
+COMPRESS_LEVEL = 6
+
+# Bytes read at a time by encode_stream
+CHUNK_BYTES = 1024 * 1024
+
+# zlib window bits for a gzip header and trailer
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+@dataclass(frozen=True)
+class EncodedBlob:
+    """A compressed waveform or VCD payload."""
+
+    # sha256 of the uncompressed text
+    id: str
+    # gzip-compressed UTF-8 text
+    data: bytes
+    # Uncompressed size in bytes
+    size: int
+
+
+def blob_id(text: str) -> str:
+    """Content address of a waveform or VCD payload."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def encode_blob(text: str) -> EncodedBlob:
+    """Compress a payload and compute its id."""
+    raw = text.encode("utf-8")
+    return EncodedBlob(
+        id=hashlib.sha256(raw).hexdigest(),
+        # mtime=0 keeps the bytes (and so ETags and CDN copies) reproducible
+        data=gzip.compress(raw, compresslevel=COMPRESS_LEVEL, mtime=0),
+        size=len(raw),
+    )
+
+
+def encode_stream(src: BinaryIO, dst: BinaryIO) -> tuple[str, int]:
+    """
+    Compress a payload from src into dst, a chunk at a time.
+
+    Large VCDs go through here rather than encode_blob, so their text is
+    never held in memory.
+
+    Returns:
+        Tuple of (id, uncompressed size), the same as encode_blob gives for
+        the payload's text.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    # A gzip stream with mtime=0, byte for byte what encode_blob produces
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, _GZIP_WBITS)
+    while chunk := src.read(CHUNK_BYTES):
+        digest.update(chunk)
+        size += len(chunk)
+        dst.write(compressor.compress(chunk))
+    dst.write(compressor.flush())
+    return digest.hexdigest(), size
+
+
+def decode_blob(data: bytes) -> str:
+    """Decompress a payload. Uncompressed data is returned as is."""
+    # Stores written before compression hold plain text, which never
+    # starts with the gzip magic (VCD and ASCII waveforms are printable)
+    if data[:2] == _GZIP_MAGIC:
+        data = gzip.decompress(data)
+    return data.decode("utf-8")
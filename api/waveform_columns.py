@@ -0,0 +1,351 @@
+"""
+Compact columnar waveforms with windowed, downsampled queries.
+
+A VCD from write_vcd_if_requested is text: every value change of every
+signal, in time order. A viewer that only shows a window of it would have
+to parse all of it for every pan or zoom. Here the VCD is converted once,
+streaming it through vcd_parser, into a binary file with one column set
+per signal:
+
+- times: LEB128 varints, the first absolute and the rest deltas
+- values: LEB128 varints of (value << 1 | unknown), where unknown marks a
+  value with x/z bits
+- index: every INDEX_STRIDE-th change as (time, times offset, values
+  offset), so a query can start decoding near the window instead of at 0
+
+File layout (integers little-endian):
+
+    b"HCWF" | version u8 | header length u32 | header JSON | columns
+
+The header lists each signal's name, width, change count and the offsets
+of its columns. ColumnarWaveform.window() bisects the index and decodes
+only the changes in the window (plus at most INDEX_STRIDE before it), so
+its cost follows the visible changes, not the length of the run.
+"""
+
+import bisect
+import json
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional
+
+from vcd_parser import VcdFormatError, iter_changes, read_header
+
+MAGIC = b"HCWF"
+VERSION = 1
+
+# Suffix in waveform_store, next to the VCD the file was converted from
+SUFFIX = ".hcwf"
+
+# Changes between index entries; bounds the decoding before a window start
+INDEX_STRIDE = 64
+
+_PREAMBLE = struct.Struct("<4sBI")
+_INDEX_ENTRY = struct.Struct("<QII")
+
+# Marks a change whose value has x or z bits
+_UNKNOWN = 1
+
+
+class WaveformFormatError(ValueError):
+    """The input is not a VCD, or not a columnar waveform file."""
+
+
+@dataclass
+class SignalInfo:
+    """A signal in a columnar waveform and where its columns are."""
+
+    name: str
+    width: int
+    # Number of value changes
+    count: int
+    times: int
+    values: int
+    index: int
+    index_count: int
+
+
+def _put_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(buf, pos: int) -> tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _value_token(bits: bytes) -> int:
+    """Encode a VCD value (b"1", b"0101", b"x", ...) as a values-column token."""
+    try:
+        return int(bits, 2) << 1
+    except ValueError:
+        return _UNKNOWN
+
+
+def format_value(token: int) -> str:
+    """Display form of a values-column token: hex, or "x" if unknown."""
+    if token & _UNKNOWN:
+        return "x"
+    return format(token >> 1, "x")
+
+
+class _ColumnWriter:
+    """Encodes one identifier code's changes as they stream in."""
+
+    __slots__ = ("times", "values", "index", "count", "last_time", "last_value", "pending")
+
+    def __init__(self):
+        self.times = bytearray()
+        self.values = bytearray()
+        self.index = bytearray()
+        self.count = 0
+        self.last_time = 0
+        self.last_value: Optional[int] = None
+        # Latest change, held back in case another comes at the same time
+        self.pending: Optional[tuple[int, int]] = None
+
+    def add(self, time: int, value: int) -> None:
+        pending = self.pending
+        if pending is not None and pending[0] != time:
+            self.flush()
+        self.pending = (time, value)
+
+    def flush(self) -> None:
+        if self.pending is None:
+            return
+        time, value = self.pending
+        self.pending = None
+        if value == self.last_value:
+            return
+        if self.count % INDEX_STRIDE == 0:
+            self.index += _INDEX_ENTRY.pack(time, len(self.times), len(self.values))
+        # Most deltas and values fit in one byte; skip the call for those
+        delta = time - self.last_time
+        if delta < 0x80:
+            self.times.append(delta)
+        else:
+            _put_varint(self.times, delta)
+        if value < 0x80:
+            self.values.append(value)
+        else:
+            _put_varint(self.values, value)
+        self.count += 1
+        self.last_time = time
+        self.last_value = value
+
+
+def vcd_to_columnar(stream: BinaryIO) -> bytes:
+    """
+    Convert a VCD into the columnar format, reading it as a stream.
+
+    Args:
+        stream: Binary stream positioned at the start of the VCD
+
+    Raises:
+        WaveformFormatError: If the stream is not a VCD.
+    """
+    try:
+        header = read_header(stream)
+    except VcdFormatError as e:
+        raise WaveformFormatError(str(e)) from e
+    writers = {variable.code: _ColumnWriter() for variable in header.variables}
+    end_time = 0
+    for time, code, bits in iter_changes(stream, header.data_offset):
+        writer = writers.get(code)
+        if writer is not None:
+            writer.add(time, _value_token(bits))
+            end_time = time
+
+    data = bytearray()
+    columns = {}
+    for code, writer in writers.items():
+        writer.flush()
+        columns[code] = {
+            "count": writer.count,
+            "times": len(data),
+            "values": len(data) + len(writer.times),
+            "index": len(data) + len(writer.times) + len(writer.values),
+            "index_count": len(writer.index) // _INDEX_ENTRY.size,
+        }
+        data += writer.times + writer.values + writer.index
+
+    # Aliases (several $vars with one id code) share columns
+    header_json = {
+        "end_time": end_time,
+        "timescale": header.timescale,
+        "signals": [
+            {"name": v.name, "width": v.width, **columns[v.code]}
+            for v in header.variables
+        ],
+    }
+    header_bytes = json.dumps(header_json, separators=(",", ":")).encode("utf-8")
+    return _PREAMBLE.pack(MAGIC, VERSION, len(header_bytes)) + header_bytes + data
+
+
+class ColumnarWaveform:
+    """Read access to a columnar waveform file."""
+
+    def __init__(self, data: bytes):
+        if len(data) < _PREAMBLE.size:
+            raise WaveformFormatError("Truncated waveform file")
+        magic, version, header_len = _PREAMBLE.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise WaveformFormatError("Not a columnar waveform file")
+        start = _PREAMBLE.size
+        header = json.loads(bytes(data[start : start + header_len]))
+        self._data = memoryview(data)[start + header_len :]
+        self.end_time: int = header["end_time"]
+        self.timescale: Optional[str] = header.get("timescale")
+        self.signals = [SignalInfo(**signal) for signal in header["signals"]]
+        self._by_name = {signal.name: signal for signal in self.signals}
+        self._index_times: dict[int, list[int]] = {}
+
+    def _index(self, signal: SignalInfo) -> list[int]:
+        """Times of a signal's index entries, decoded on first use."""
+        # Keyed by offset: aliases share an index
+        times = self._index_times.get(signal.index)
+        if times is None:
+            times = [
+                _INDEX_ENTRY.unpack_from(self._data, signal.index + j * _INDEX_ENTRY.size)[0]
+                for j in range(signal.index_count)
+            ]
+            self._index_times[signal.index] = times
+        return times
+
+    def _changes_from(self, signal: SignalInfo, entry: int) -> Iterator[tuple[int, int]]:
+        """Yield (time, token) for a signal's changes from an index entry on."""
+        data = self._data
+        time, tpos, vpos = _INDEX_ENTRY.unpack_from(
+            data, signal.index + entry * _INDEX_ENTRY.size
+        )
+        tpos += signal.times
+        vpos += signal.values
+        # The entry's time is absolute; skip its (delta) encoding
+        _, tpos = _get_varint(data, tpos)
+        for _ in range(signal.count - entry * INDEX_STRIDE):
+            token, vpos = _get_varint(data, vpos)
+            yield time, token
+            if tpos < signal.values:
+                delta, tpos = _get_varint(data, tpos)
+                time += delta
+
+    def window(
+        self,
+        start: int,
+        end: int,
+        resolution: int = 1,
+        names: Optional[list[str]] = None,
+    ) -> dict:
+        """
+        Get the changes of some signals within a time window.
+
+        Args:
+            start: First time of the window
+            end: Last time of the window (inclusive)
+            resolution: Time units per output point; changes in the same
+                span of `resolution` collapse into one entry
+            names: Signals to return (default: all)
+
+        Returns:
+            Dict with each signal's value at `start` ("initial", None before
+            its first change) and its changes after `start` as [time, value],
+            or [time, value, n] where n changes collapsed into one entry
+            (time of the first, value of the last). Values are hex strings,
+            "x" if unknown.
+
+        Raises:
+            KeyError: If a requested signal doesn't exist.
+        """
+        resolution = max(1, resolution)
+        selected = self.signals if names is None else [self._by_name[n] for n in names]
+        signals = []
+        for signal in selected:
+            initial = None
+            changes: list[list] = []
+            if signal.count:
+                entry = max(0, bisect.bisect_right(self._index(signal), start) - 1)
+                bucket = first = last = None
+                count = 0
+                for time, token in self._changes_from(signal, entry):
+                    if time <= start:
+                        initial = token
+                        continue
+                    if time > end:
+                        break
+                    b = (time - start - 1) // resolution
+                    if b != bucket:
+                        if count:
+                            changes.append(_entry(first, last, count))
+                        bucket, first, count = b, time, 0
+                    last = token
+                    count += 1
+                if count:
+                    changes.append(_entry(first, last, count))
+            signals.append(
+                {
+                    "name": signal.name,
+                    "width": signal.width,
+                    "initial": None if initial is None else format_value(initial),
+                    "changes": changes,
+                }
+            )
+        return {"start": start, "end": end, "resolution": resolution, "signals": signals}
+
+    def describe(self) -> dict:
+        """Signal names, widths and change counts, the end time and timescale."""
+        return {
+            "end_time": self.end_time,
+            "timescale": self.timescale,
+            "signals": [
+                {"name": s.name, "width": s.width, "changes": s.count}
+                for s in self.signals
+            ],
+        }
+
+
+def _entry(time: int, token: int, count: int) -> list:
+    if count == 1:
+        return [time, format_value(token)]
+    return [time, format_value(token), count]
+
+
+# Recently opened files; they are immutable, so entries never go stale
+OPEN_CACHE_SIZE = 8
+
+_open_cache: OrderedDict[str, ColumnarWaveform] = OrderedDict()
+_open_lock = threading.Lock()
+
+
+def open_columnar(waveform_id: str, data_loader) -> ColumnarWaveform:
+    """
+    Get a columnar waveform by id, loading it with data_loader() on a miss.
+
+    Args:
+        waveform_id: Id of the VCD the file was converted from
+        data_loader: Callable returning the file's bytes
+
+    Returns:
+        ColumnarWaveform, shared between callers.
+    """
+    with _open_lock:
+        waveform = _open_cache.get(waveform_id)
+        if waveform is not None:
+            _open_cache.move_to_end(waveform_id)
+            return waveform
+    waveform = ColumnarWaveform(data_loader())
+    with _open_lock:
+        _open_cache[waveform_id] = waveform
+        while len(_open_cache) > OPEN_CACHE_SIZE:
+            _open_cache.popitem(last=False)
+    return waveform
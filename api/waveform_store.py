@@ -0,0 +1,283 @@
+"""
+Content-addressed waveform files on local disk.
+
+GET /waveforms/{id} streams waveform and VCD payloads from here, so it can
+hand the file to the server as-is (with Range support) instead of loading
+it from the result cache into memory. Files are the gzip bytes from
+waveform_blobs, named by the sha256 of their text, so a file never changes
+once written and any copy of it (browser, CDN) stays valid forever.
+
+Files derived from a payload (e.g. waveform_columns' columnar form of a
+VCD) are stored next to it under the same id with their own suffix.
+
+The directory is a cache, not a record: files are written when results are
+cached, re-created from the result cache on demand, and evicted least
+recently used beyond max_bytes. Recency and sizes are tracked in memory
+(read from disk once, at startup), so puts never walk the directory. Every
+put and lookup counts as a use.
+
+Files may be evicted at any time, including while a response is being
+sent from one; pin() gives a request its own hard link to serve from.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from waveform_blobs import EncodedBlob, encode_stream
+
+log = logging.getLogger(__name__)
+
+# Default configuration
+DEFAULT_ROOT = Path(tempfile.gettempdir()) / "hardcaml-waveforms"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+SUFFIX = ".gz"
+
+# Eviction frees space down to this fraction of max_bytes, so a full store
+# isn't trimmed again by the very next put
+LOW_WATER_FRACTION = 0.9
+
+
+class WaveformStore:
+    """Directory of compressed waveform payloads keyed by content hash."""
+
+    def __init__(self, root: Path = DEFAULT_ROOT, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        # 0 disables the size budget
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._evicted = 0
+        # Stored files and their sizes, least recently used first. Files
+        # from a previous run are still valid.
+        self._files: OrderedDict[Path, int] = OrderedDict(
+            (path, size) for _, path, size in sorted(self._scan())
+        )
+        self._total_bytes = sum(self._files.values())
+
+        log.info(
+            f"WaveformStore initialized: root={root}, max_bytes={max_bytes}, "
+            f"existing={self._total_bytes} bytes"
+        )
+
+    def _path(self, blob_id: str, suffix: str = SUFFIX) -> Path:
+        # Fan out over 256 subdirectories to keep directories small
+        return self.root / blob_id[:2] / f"{blob_id}{suffix}"
+
+    def _scan(self) -> list[tuple[float, Path, int]]:
+        """All stored files as (mtime, path, size)."""
+        files = []
+        for sub in self.root.iterdir():
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub):
+                # Skip partial writes
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, Path(entry.path), st.st_size))
+        return files
+
+    def put(self, blob: EncodedBlob) -> Path:
+        """
+        Store a payload (a no-op apart from marking it used if already present).
+
+        Returns:
+            Path of the stored file.
+        """
+        return self.put_data(blob.id, blob.data)
+
+    def put_data(self, blob_id: str, data: bytes, suffix: str = SUFFIX) -> Path:
+        """
+        Store a file under a payload id, unless already present.
+
+        Args:
+            blob_id: Id of the payload the file is (or is derived from)
+            data: File contents
+            suffix: Kind of file; SUFFIX for the payload itself
+
+        Returns:
+            Path of the stored file.
+        """
+        path = self._path(blob_id, suffix)
+        try:
+            os.utime(path)
+            self._touched(path)
+            return path
+        except FileNotFoundError:
+            pass
+        path.parent.mkdir(exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._added(path, len(data))
+        return path
+
+    def put_file(self, src: Path) -> EncodedBlob:
+        """
+        Store a payload read from a file, compressing it as it is read.
+
+        The uncompressed text is never held in memory; only the compressed
+        bytes are, for the returned blob.
+
+        Args:
+            src: File holding the payload's text
+
+        Returns:
+            The stored payload.
+
+        Raises:
+            FileNotFoundError: If src doesn't exist.
+        """
+        # The name depends on the content, so compress into a temporary file
+        # first (outside the fan-out directories, which _scan reads)
+        tmp = self.root / f".incoming.{uuid.uuid4().hex}"
+        try:
+            with open(src, "rb") as f, open(tmp, "wb") as out:
+                blob_id, size = encode_stream(f, out)
+            data = tmp.read_bytes()
+            path = self._path(blob_id)
+            try:
+                os.utime(path)
+                self._touched(path)
+            except FileNotFoundError:
+                path.parent.mkdir(exist_ok=True)
+                os.replace(tmp, path)
+                self._added(path, len(data))
+        finally:
+            tmp.unlink(missing_ok=True)
+        return EncodedBlob(id=blob_id, data=data, size=size)
+
+    def _touched(self, path: Path) -> None:
+        """Mark an existing file most recently used."""
+        with self._lock:
+            if path in self._files:
+                self._files.move_to_end(path)
+                return
+        # Written by another process since startup
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return
+        self._added(path, size)
+
+    def _added(self, path: Path, nbytes: int) -> None:
+        """Account for a new file, evicting if over budget."""
+        with self._lock:
+            self._total_bytes += nbytes - self._files.pop(path, 0)
+            self._files[path] = nbytes
+            over = self.max_bytes > 0 and self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def path(self, blob_id: str, suffix: str = SUFFIX) -> Optional[Path]:
+        """
+        Path of a stored file, marking it used.
+
+        The file may still be evicted before the caller reads it; readers
+        must handle FileNotFoundError (or use pin()).
+
+        Returns:
+            The path, or None if it isn't stored.
+        """
+        path = self._path(blob_id, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        self._touched(path)
+        return path
+
+    def pin(self, blob_id: str, suffix: str = SUFFIX) -> Optional[Path]:
+        """
+        Hard-link a stored file to a private name that eviction never deletes.
+
+        Marks the file used. Release the link with unpin() once done with it.
+
+        Returns:
+            Path of the link, or None if the file isn't stored.
+        """
+        path = self._path(blob_id, suffix)
+        # Outside the fan-out directories, which _scan reads
+        link = self.root / f".pinned.{uuid.uuid4().hex}{suffix}"
+        try:
+            os.link(path, link)
+            os.utime(path)
+        except FileNotFoundError:
+            link.unlink(missing_ok=True)
+            return None
+        self._touched(path)
+        return link
+
+    def unpin(self, link: Path) -> None:
+        """Release a link returned by pin()."""
+        link.unlink(missing_ok=True)
+
+    def evict(self) -> int:
+        """
+        Delete least recently used files down to the low-water mark.
+
+        Returns:
+            Number of files removed.
+        """
+        if self.max_bytes <= 0:
+            return 0
+        target = int(self.max_bytes * LOW_WATER_FRACTION)
+        victims = []
+        with self._lock:
+            while self._files and self._total_bytes > target:
+                path, size = self._files.popitem(last=False)
+                self._total_bytes -= size
+                victims.append(path)
+        # Delete outside the lock; puts go on meanwhile
+        removed = 0
+        for path in victims:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+        if removed:
+            with self._lock:
+                self._evicted += removed
+            log.info(f"Waveform store evicted {removed} files")
+        return removed
+
+    def get_stats(self) -> dict:
+        """Get store statistics."""
+        with self._lock:
+            return {
+                "path": str(self.root),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "evicted": self._evicted,
+            }
+
+
+# Global singleton instance
+_store_instance: Optional[WaveformStore] = None
+_store_lock = threading.Lock()
+
+
+def get_waveform_store() -> WaveformStore:
+    """Get the global waveform store."""
+    global _store_instance
+    if _store_instance is None:
+        with _store_lock:
+            if _store_instance is None:
+                from config import WAVEFORM_DIR, WAVEFORM_STORE_MAX_BYTES
+
+                _store_instance = WaveformStore(
+                    root=Path(WAVEFORM_DIR), max_bytes=WAVEFORM_STORE_MAX_BYTES
+                )
+    return _store_instance
@@ -3,21 +3,74 @@ Session-based workspace cache with LRU eviction.
 
 Provides persistent build directories keyed by session ID, enabling
 browser sessions to reuse their warm dune build cache across requests.
+The slot map is mirrored to an index file in the cache root so workspaces
+survive process restarts (deploys, uvicorn reloads).
+
+Several worker processes can share the cache root. Each index entry records
+the pid of the process that owns the workspace; a process only rewrites its
+own entries (under a file lock) and only adopts entries whose owner has
+exited, so workers never delete or share each other's live workspaces.
 """
 
+import json
 import logging
+import os
 import shutil
 import threading
 import time
+import uuid
 from collections import OrderedDict
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+from tree_size import TreeSizeTracker
+from workspace_materializer import MaterializeStats, materialize_tree
+
+if TYPE_CHECKING:
+    from trash_reaper import TrashReaper
+    from workspace_pool import WorkspacePool
 
 log = logging.getLogger(__name__)
 
 # Default configuration
 DEFAULT_MAX_SLOTS = 10
 DEFAULT_CACHE_ROOT = Path("/tmp/hardcaml-workspaces")
+DEFAULT_MAX_BYTES = 0  # Unlimited
+DEFAULT_MIN_FREE_BYTES = 0
+DEFAULT_IDLE_TTL = 0  # Never expire
+
+# On-disk slot index, rewritten atomically whenever the slot map changes
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1
+# Held (flock) while a process reads, merges and rewrites the index
+INDEX_LOCK_FILE = ".index.lock"
+
+# Directories no index entry lists are only removed once this old (seconds
+# since last modified): another worker may have just created one and not
+# indexed it yet
+ORPHAN_GRACE_SECONDS = 600
+
+
+def _owner_alive(pid: object) -> bool:
+    """Whether an index entry's owner is another process that is still running."""
+    # Entries without a pid predate them; our own pid is a previous process
+    # that had it (e.g. the same container restarted)
+    if not isinstance(pid, int) or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
 
 
 @dataclass
@@ -28,7 +81,141 @@ class WorkspaceSlot:
     path: Path
     is_n2t: bool
     last_accessed: float = field(default_factory=time.time)
+    # Held while a build uses the workspace (and while it is being evicted)
     lock: threading.Lock = field(default_factory=threading.Lock)
+    # Set once the workspace directory exists (or creation failed)
+    ready: threading.Event = field(default_factory=threading.Event)
+    failed: bool = False
+    # Bytes evicting this workspace would free, as of its last measurement
+    size_bytes: int = 0
+    tracker: TreeSizeTracker | None = None
+
+
+def materialize_workspace(template_dir: Path, workspace_path: Path) -> MaterializeStats:
+    """Create a flat-layout workspace directory from a build template."""
+    # Flat layout: src/ and test/ from the template are not used
+    if template_dir.exists():
+        stats = materialize_tree(template_dir, workspace_path, skip={"src", "test"})
+    else:
+        workspace_path.mkdir(parents=True)
+        stats = MaterializeStats()
+
+    # Copy harness_utils.ml from test/ to root if it exists
+    template_harness = template_dir / "test" / "harness_utils.ml"
+    if template_harness.exists():
+        shutil.copy2(template_harness, workspace_path / "harness_utils.ml")
+    return stats
+
+
+def inline_tests_deps(files: dict[str, str]) -> str:
+    """
+    The (deps ...) field of the test library's inline_tests stanza.
+
+    Tests depend on HARDCAML_VCD_PATH, which compile_and_run sets to a new
+    path for each build that wants VCD, so dune reruns them (and writes the
+    VCD) even when nothing else changed. input.txt is a dependency if given.
+    """
+    deps = ["(env_var HARDCAML_VCD_PATH)"]
+    if "input.txt" in files:
+        deps.insert(0, "input.txt")
+    return f" (deps {' '.join(deps)})"
+
+
+def write_workspace_files(workspace_path: Path, files: dict[str, str]) -> None:
+    """
+    Write user files and the matching dune file into a workspace (flat layout).
+
+    Files whose content is unchanged are not rewritten, preserving mtimes
+    (and therefore dune's incremental build state).
+    """
+    # Ensure dune file exists (flat layout)
+    # Determine if this is an N2T project using same logic as compiler.py
+    circuit_files = [
+        f for f in files.keys() if f.endswith(".ml") and f != "test.ml"
+    ]
+    is_n2t = "circuit.ml" not in circuit_files
+
+    libs = "core hardcaml"
+    if is_n2t:
+        libs += " n2t_chips"
+
+    test_libs = "core hardcaml hardcaml_waveterm hardcaml_test_harness"
+    if is_n2t:
+        test_libs += " n2t_chips"
+    test_libs += " user_circuit"
+
+    # Determine circuit modules dynamically
+    circuit_modules = [
+        f[:-3]  # Remove .ml extension
+        for f in files.keys()
+        if f.endswith(".ml") and f not in ("test.ml", "harness_utils.ml")
+    ]
+    if is_n2t:
+        # For N2T projects, include all circuit files
+        modules_list = circuit_modules if circuit_modules else None
+    else:
+        # For standard projects, only include circuit if it exists
+        if "circuit" in circuit_modules:
+            modules_list = ["circuit"]
+        else:
+            modules_list = circuit_modules if circuit_modules else None
+
+    modules_line = f" (modules {' '.join(modules_list)})\n" if modules_list else ""
+
+    input_deps_line = inline_tests_deps(files)
+
+    dune_file = workspace_path / "dune"
+    dune_content = f"""(library
+ (name user_circuit)
+ (libraries {libs}){modules_line}(preprocess
+  (pps ppx_hardcaml ppx_jane)))
+
+(library
+ (name user_test)
+ (libraries 
+   {test_libs})
+ (modules test harness_utils)
+ (wrapped false)
+ (inline_tests{input_deps_line})
+ (preprocess
+  (pps ppx_hardcaml ppx_jane ppx_expect)))
+"""
+    # Always write dune file (may change if project type changes)
+    dune_file.write_text(dune_content)
+
+    # Ensure harness_utils.ml exists
+    harness_file = workspace_path / "harness_utils.ml"
+    if not harness_file.exists():
+        harness_file.write_text("""open! Hardcaml_waveterm
+
+let write_vcd_if_requested waves =
+  match Sys.getenv_opt "HARDCAML_VCD_PATH" with
+  | Some path -> Waveform.Serialize.marshall_vcd waves path
+  | None -> ()
+""")
+
+    # Write files to root (flat layout)
+    for filename, content in files.items():
+        if (
+            filename.endswith(".ml")
+            or filename.endswith(".mli")
+            or filename == "input.txt"
+        ):
+            file_path = workspace_path / filename
+        else:
+            continue  # Skip unknown file types
+
+        # Skip writing if content hasn't changed (preserves mtime for dune)
+        if file_path.exists():
+            try:
+                existing_content = file_path.read_text()
+                if existing_content == content:
+                    continue  # Content unchanged, skip write
+            except Exception:
+                # If read fails, write anyway
+                pass
+
+        file_path.write_text(content)
 
 
 class WorkspaceCache:
@@ -37,26 +224,192 @@ class WorkspaceCache:
 
     Each session gets a dedicated build directory that persists across
     requests, allowing dune's incremental build to work effectively.
-    When the cache is full, the least recently used workspace is evicted.
+    Least recently used workspaces are evicted when the cache has
+    max_slots workspaces, when their total size exceeds max_bytes, when the
+    filesystem has less than min_free_bytes free, or after idle_ttl seconds
+    without use.
     """
 
     def __init__(
         self,
         max_slots: int = DEFAULT_MAX_SLOTS,
         cache_root: Path = DEFAULT_CACHE_ROOT,
+        pool: "WorkspacePool | None" = None,
+        trash: "TrashReaper | None" = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        min_free_bytes: int = DEFAULT_MIN_FREE_BYTES,
+        idle_ttl: int = DEFAULT_IDLE_TTL,
     ):
         self.max_slots = max_slots
+        self.max_bytes = max_bytes
+        self.min_free_bytes = min_free_bytes
+        self.idle_ttl = idle_ttl
         self.cache_root = cache_root
+        # Optional source of pre-warmed workspaces for new sessions
+        self.pool = pool
+        # Evicted workspaces are handed to the reaper instead of deleted inline
+        self.trash = trash
         self.cache_root.mkdir(parents=True, exist_ok=True)
 
         # OrderedDict maintains insertion order; we move items to end on access
         self._slots: OrderedDict[str, WorkspaceSlot] = OrderedDict()
         self._global_lock = threading.Lock()
+        # Serializes index writes; taken before (never while holding) _global_lock
+        self._index_lock = threading.Lock()
+
+        self._adopt_existing()
 
         log.info(
-            f"WorkspaceCache initialized: max_slots={max_slots}, root={cache_root}"
+            f"WorkspaceCache initialized: max_slots={max_slots}, "
+            f"max_bytes={max_bytes}, min_free_bytes={min_free_bytes}, "
+            f"idle_ttl={idle_ttl}, root={cache_root}, adopted={len(self._slots)}"
         )
 
+    def _adopt_existing(self) -> None:
+        """
+        Re-adopt workspaces listed in the index by a previous process.
+
+        Entries owned by a process that is still running (another worker, or
+        the previous process during an overlapping restart) are left to it.
+        Of the rest, entries whose directory is missing or isn't a workspace
+        are dropped. Directories that no entry lists are deleted once older
+        than ORPHAN_GRACE_SECONDS. Dot-directories (e.g. the workspace pool)
+        are left alone.
+        """
+        with self._locked_index():
+            entries = self._read_index()
+            others = [e for e in entries if _owner_alive(e.get("pid"))]
+            discard = []
+            # Oldest first, so the OrderedDict ends up in LRU order
+            for entry in sorted(entries, key=lambda e: e.get("last_accessed", 0)):
+                if _owner_alive(entry.get("pid")):
+                    continue
+                try:
+                    session_id = str(entry["session_id"])
+                    dir_name = str(entry["dir"])
+                    is_n2t = bool(entry["is_n2t"])
+                    last_accessed = float(entry["last_accessed"])
+                    size_bytes = int(entry.get("size_bytes", 0))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                path = self.cache_root / dir_name
+                if not self._is_valid_workspace(session_id, path):
+                    log.info(f"Dropping invalid workspace for session {session_id[:8]}")
+                    if path.parent == self.cache_root and path.is_dir():
+                        discard.append(path)
+                    continue
+                slot = WorkspaceSlot(
+                    session_id=session_id,
+                    path=path,
+                    is_n2t=is_n2t,
+                    last_accessed=last_accessed,
+                    size_bytes=size_bytes,
+                    tracker=TreeSizeTracker(path, split_hardlinks=True),
+                )
+                slot.ready.set()
+                if session_id in self._slots:
+                    # Also adopted from another exited process; keep the newer
+                    discard.append(self._slots.pop(session_id).path)
+                self._slots[session_id] = slot
+
+            while len(self._slots) > self.max_slots:
+                _, victim = self._slots.popitem(last=False)
+                discard.append(victim.path)
+
+            known = {slot.path.name for slot in self._slots.values()}
+            known.update(str(e.get("dir")) for e in others)
+            cutoff = time.time() - ORPHAN_GRACE_SECONDS
+            for child in self.cache_root.iterdir():
+                if child.name.startswith(".") or child.name in known:
+                    continue
+                try:
+                    if not child.is_dir() or child.stat().st_mtime > cutoff:
+                        continue
+                except OSError:
+                    continue
+                log.info(f"Removing orphaned workspace {child.name}")
+                discard.append(child)
+
+            self._write_index(others + self._index_entries())
+
+        for path in discard:
+            self._discard_dir(path)
+        if self._slots:
+            log.info(f"Adopted {len(self._slots)} workspaces from {self.cache_root / INDEX_FILE}")
+        if others:
+            log.info(f"Left {len(others)} workspaces to other running processes")
+
+    def _is_valid_workspace(self, session_id: str, path: Path) -> bool:
+        """Whether an indexed directory is a usable workspace for session_id."""
+        return (
+            path.parent == self.cache_root
+            and path.name.startswith(f"{session_id}-")
+            and path.is_dir()
+            and (path / "dune-project").is_file()
+        )
+
+    @contextmanager
+    def _locked_index(self) -> Iterator[None]:
+        """Hold the index for a read-merge-write, against threads and processes."""
+        with self._index_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.cache_root / INDEX_LOCK_FILE, "a") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                yield
+
+    def _read_index(self) -> list[dict]:
+        """Entries of the index file; [] if missing or unreadable."""
+        index_path = self.cache_root / INDEX_FILE
+        try:
+            data = json.loads(index_path.read_text())
+            if data.get("version") == INDEX_VERSION:
+                return [e for e in data.get("slots", []) if isinstance(e, dict)]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as e:
+            log.warning(f"Ignoring unreadable workspace index {index_path}: {e}")
+        return []
+
+    def _write_index(self, entries: list[dict]) -> None:
+        """Replace the index file (atomically, via rename; caller holds the index lock)."""
+        index_path = self.cache_root / INDEX_FILE
+        tmp_path = self.cache_root / f".{INDEX_FILE}.{os.getpid()}.tmp"
+        try:
+            tmp_path.write_text(json.dumps({"version": INDEX_VERSION, "slots": entries}))
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            log.warning(f"Failed to write workspace index {index_path}: {e}")
+
+    def _index_entries(self) -> list[dict]:
+        """This process's slots as index entries."""
+        with self._global_lock:
+            return [
+                {
+                    "session_id": slot.session_id,
+                    "dir": slot.path.name,
+                    "is_n2t": slot.is_n2t,
+                    "last_accessed": slot.last_accessed,
+                    "size_bytes": slot.size_bytes,
+                    "pid": os.getpid(),
+                }
+                for slot in self._slots.values()
+                if slot.ready.is_set() and not slot.failed
+            ]
+
+    def _save_index(self) -> None:
+        """
+        Write this process's slots to the index file.
+
+        Entries of other processes are kept as they are in the file, so
+        workers sharing the cache root don't overwrite each other's.
+        """
+        with self._locked_index():
+            pid = os.getpid()
+            others = [e for e in self._read_index() if e.get("pid") != pid]
+            self._write_index(others + self._index_entries())
+
     def get_or_create(
         self,
         session_id: str,
@@ -66,124 +419,233 @@ class WorkspaceCache:
         """
         Get or create a workspace for the given session.
 
+        The global lock is only held for map operations. A new workspace is
+        registered as a placeholder slot and created outside the lock, so a
+        slow cold setup never blocks other sessions; concurrent requests for
+        the same new session wait for the placeholder instead.
+
         Returns:
             Tuple of (workspace_path, is_cache_hit)
         """
-        with self._global_lock:
-            # Check if session already has a workspace
-            if session_id in self._slots:
-                slot = self._slots[session_id]
-
-                # Check if project type matches (n2t vs standard)
-                if slot.is_n2t != is_n2t:
+        while True:
+            stale: list[WorkspaceSlot] = []
+            with self._global_lock:
+                stale.extend(self._pop_expired_locked())
+                slot = self._slots.get(session_id)
+                if slot is not None and slot.is_n2t != is_n2t:
                     # Project type changed - need to recreate
                     log.info(
                         f"Session {session_id[:8]} changed project type, recreating"
                     )
-                    self._evict_slot(session_id)
-                else:
+                    stale.append(self._slots.pop(session_id))
+                    slot = None
+
+                if slot is not None:
                     # Move to end (most recently used)
                     self._slots.move_to_end(session_id)
                     slot.last_accessed = time.time()
-                    log.info(f"Cache hit for session {session_id[:8]}")
-                    return slot.path, True
-
-            # Need to create new workspace
-            # First, evict if at capacity
-            while len(self._slots) >= self.max_slots:
-                self._evict_lru()
-
-            # Create new workspace
-            workspace_path = self._create_workspace(session_id, is_n2t, template_dir)
-            slot = WorkspaceSlot(
-                session_id=session_id,
-                path=workspace_path,
-                is_n2t=is_n2t,
-            )
-            self._slots[session_id] = slot
-            log.info(
-                f"Created new workspace for session {session_id[:8]} "
-                f"(slots: {len(self._slots)}/{self.max_slots})"
-            )
-            return workspace_path, False
-
-    def _create_workspace(
-        self, session_id: str, is_n2t: bool, template_dir: Path
-    ) -> Path:
-        """Create a new workspace from template."""
-        workspace_path = self.cache_root / session_id
-        if workspace_path.exists():
-            shutil.rmtree(workspace_path)
-
-        # Check template contents
-        template_build = template_dir / "_build"
-        # For flat layout, check root for files
-        template_files = (
-            list(template_dir.glob("*.ml")) if template_dir.exists() else []
-        )
-        build_size = (
-            sum(f.stat().st_size for f in template_build.rglob("*") if f.is_file())
-            if template_build.exists()
-            else 0
-        )
+                    creating = False
+                else:
+                    # Make room, then register a placeholder while we create.
+                    # Workspaces in use are never evicted; with every slot
+                    # busy the cache goes over max_slots until one is free.
+                    idle = (s for s in list(self._slots.values()) if self._is_idle(s))
+                    while len(self._slots) >= self.max_slots:
+                        victim = next(idle, None)
+                        if victim is None:
+                            log.info(f"All {len(self._slots)} workspaces busy, over max_slots")
+                            break
+                        del self._slots[victim.session_id]
+                        stale.append(victim)
+                    path = self.cache_root / f"{session_id}-{uuid.uuid4().hex[:8]}"
+                    slot = WorkspaceSlot(
+                        session_id=session_id,
+                        path=path,
+                        is_n2t=is_n2t,
+                        tracker=TreeSizeTracker(path, split_hardlinks=True),
+                    )
+                    self._slots[session_id] = slot
+                    creating = True
+
+            for victim in stale:
+                self._evict_slot(victim)
+            if stale and not creating:
+                self._save_index()
+
+            if creating:
+                self._populate_slot(slot, template_dir)
+                self._measure(slot)
+                self._enforce_limits(keep=slot)
+                self._save_index()
+                log.info(
+                    f"Created new workspace for session {session_id[:8]} "
+                    f"(slots: {len(self._slots)}/{self.max_slots}, "
+                    f"size: {slot.size_bytes // 1024}KB)"
+                )
+                return slot.path, False
+
+            if not slot.ready.is_set():
+                # Another request is creating this session's workspace
+                slot.ready.wait()
+                if slot.failed:
+                    continue
+                return slot.path, False
+
+            # Picks up what the session's previous build added to _build/
+            self._measure(slot)
+            # The index only changes with the slot map, not on every hit
+            if self._enforce_limits(keep=slot):
+                self._save_index()
+            log.info(f"Cache hit for session {session_id[:8]}")
+            return slot.path, True
+
+    def checkout(
+        self,
+        session_id: str,
+        is_n2t: bool,
+        template_dir: Path,
+    ) -> tuple[WorkspaceSlot, bool]:
+        """
+        Get or create a session's workspace and acquire its slot lock.
 
-        log.info(
-            f"Creating workspace: template={template_dir}, "
-            f"has_build={template_build.exists()} ({build_size // 1024}KB), "
-            f"files={[f.name for f in template_files]}"
-        )
+        Builds within a session are serialized by the slot lock; the caller
+        must release `slot.lock` when the build is done. A held slot is never
+        evicted from under the build (eviction waits for the lock).
 
-        t0 = time.time()
-        shutil.copytree(template_dir, workspace_path)
+        Returns:
+            Tuple of (slot, is_cache_hit)
+        """
+        while True:
+            _, cache_hit = self.get_or_create(session_id, is_n2t, template_dir)
+            with self._global_lock:
+                slot = self._slots.get(session_id)
+            if slot is None:
+                continue  # Evicted before we got here
+            slot.lock.acquire()
+            with self._global_lock:
+                current = self._slots.get(session_id) is slot
+            if current:
+                return slot, cache_hit
+            # Evicted or recreated while we waited for the lock
+            slot.lock.release()
+
+    def _measure(self, slot: WorkspaceSlot) -> None:
+        """Update a slot's size (incremental: only changed directories are listed)."""
+        if slot.tracker is not None:
+            slot.size_bytes, _ = slot.tracker.refresh()
+
+    def _free_bytes(self) -> int | None:
+        """Free space on the cache filesystem, counting deletions still pending."""
+        try:
+            free = shutil.disk_usage(self.cache_root).free
+        except OSError:
+            return None
+        if self.trash is not None:
+            free += self.trash.pending_bytes()
+        return free
+
+    @staticmethod
+    def _is_idle(slot: WorkspaceSlot) -> bool:
+        """Whether a slot can be evicted: created and not used by a build."""
+        return slot.ready.is_set() and not slot.lock.locked()
+
+    def _pop_expired_locked(self) -> list[WorkspaceSlot]:
+        """Remove idle slots from the map (caller holds the global lock)."""
+        if not self.idle_ttl:
+            return []
+        cutoff = time.time() - self.idle_ttl
+        expired = [
+            slot
+            for slot in self._slots.values()
+            if self._is_idle(slot) and slot.last_accessed < cutoff
+        ]
+        for slot in expired:
+            del self._slots[slot.session_id]
+            log.info(f"Workspace for session {slot.session_id[:8]} idle, evicting")
+        return expired
 
-        # Remove src/ and test/ directories if they exist (we use flat layout)
-        for subdir in ["src", "test"]:
-            subdir_path = workspace_path / subdir
-            if subdir_path.exists():
-                shutil.rmtree(subdir_path)
+    def _enforce_limits(self, keep: WorkspaceSlot) -> int:
+        """
+        Evict LRU workspaces until the byte budget and free-space floor hold.
 
-        # Copy harness_utils.ml from test/ to root if it exists
-        template_harness = template_dir / "test" / "harness_utils.ml"
-        if template_harness.exists():
-            shutil.copy2(template_harness, workspace_path / "harness_utils.ml")
+        Workspaces in use are skipped; they count against the limits until
+        a later call finds them idle.
 
-        copy_time = int((time.time() - t0) * 1000)
+        Returns:
+            Number of workspaces evicted.
+        """
+        free = self._free_bytes() if self.min_free_bytes else None
+        deficit = self.min_free_bytes - free if free is not None else 0
 
-        # Verify _build was copied
-        workspace_build = workspace_path / "_build"
-        if workspace_build.exists():
-            ws_build_size = sum(
-                f.stat().st_size for f in workspace_build.rglob("*") if f.is_file()
-            )
-            log.info(
-                f"Workspace created ({session_id[:8]}): copy_time={copy_time}ms, _build={ws_build_size // 1024}KB"
-            )
-        else:
+        victims = []
+        with self._global_lock:
+            total = sum(slot.size_bytes for slot in self._slots.values())
+            for slot in list(self._slots.values()):  # LRU first
+                over_budget = self.max_bytes and total > self.max_bytes
+                if not over_budget and deficit <= 0:
+                    break
+                if slot is keep or not self._is_idle(slot):
+                    continue
+                del self._slots[slot.session_id]
+                victims.append(slot)
+                total -= slot.size_bytes
+                deficit -= slot.size_bytes
+
+        for slot in victims:
             log.info(
-                f"Workspace created ({session_id[:8]}): copy_time={copy_time}ms, NO _build copied"
+                f"Evicting session {slot.session_id[:8]} "
+                f"({slot.size_bytes // 1024}KB) to stay within disk limits"
             )
+            self._evict_slot(slot)
+        return len(victims)
 
-        return workspace_path
+    def _populate_slot(self, slot: WorkspaceSlot, template_dir: Path) -> None:
+        """Create a placeholder slot's workspace and mark it ready."""
+        try:
+            self._create_workspace(slot.session_id, slot.path, slot.is_n2t, template_dir)
+        except Exception:
+            slot.failed = True
+            with self._global_lock:
+                if self._slots.get(slot.session_id) is slot:
+                    del self._slots[slot.session_id]
+            shutil.rmtree(slot.path, ignore_errors=True)
+            raise
+        finally:
+            slot.ready.set()
 
-    def _evict_slot(self, session_id: str) -> None:
-        """Evict a specific session's workspace."""
-        if session_id not in self._slots:
+    def _create_workspace(
+        self, session_id: str, workspace_path: Path, is_n2t: bool, template_dir: Path
+    ) -> None:
+        """Create a new workspace from template."""
+        # A pre-warmed workspace from the pool is a single rename away
+        if self.pool is not None and self.pool.claim(is_n2t, workspace_path):
+            log.info(f"Workspace created ({session_id[:8]}): claimed from pool")
             return
-        slot = self._slots.pop(session_id)
+
+        log.info(f"Creating workspace: template={template_dir}")
+        stats = materialize_workspace(template_dir, workspace_path)
+        log.info(f"Workspace created ({session_id[:8]}): {stats.summary()}")
+
+    def _evict_slot(self, slot: WorkspaceSlot) -> None:
+        """
+        Delete an evicted slot's workspace. Called without the global lock,
+        after the slot has been removed from the map.
+        """
+        slot.ready.wait()
+        # Wait for any build still using the workspace
+        with slot.lock:
+            self._discard_dir(slot.path, slot.size_bytes)
+        log.info(f"Evicted workspace for session {slot.session_id[:8]}")
+
+    def _discard_dir(self, path: Path, size_bytes: int = 0) -> None:
+        """Delete a workspace directory (via the trash reaper if there is one)."""
         try:
-            if slot.path.exists():
-                shutil.rmtree(slot.path)
-            log.info(f"Evicted workspace for session {session_id[:8]}")
+            if self.trash is not None:
+                self.trash.discard(path, size_bytes)
+            elif path.exists():
+                shutil.rmtree(path)
         except Exception as e:
-            log.warning(f"Failed to clean up workspace {slot.path}: {e}")
-
-    def _evict_lru(self) -> None:
-        """Evict the least recently used workspace."""
-        if not self._slots:
-            return
-        # First item in OrderedDict is the LRU
-        session_id, slot = next(iter(self._slots.items()))
-        self._evict_slot(session_id)
+            log.warning(f"Failed to clean up workspace {path}: {e}")
 
     def update_workspace(
         self,
@@ -201,96 +663,7 @@ class WorkspaceCache:
                 raise KeyError(f"No workspace for session {session_id}")
             slot = self._slots[session_id]
 
-        # Ensure dune file exists (flat layout)
-        # Determine if this is an N2T project using same logic as compiler.py
-        circuit_files = [
-            f for f in files.keys() if f.endswith(".ml") and f != "test.ml"
-        ]
-        is_n2t = "circuit.ml" not in circuit_files
-
-        libs = "core hardcaml"
-        if is_n2t:
-            libs += " n2t_chips"
-
-        test_libs = "core hardcaml hardcaml_waveterm hardcaml_test_harness"
-        if is_n2t:
-            test_libs += " n2t_chips"
-        test_libs += " user_circuit"
-
-        # Determine circuit modules dynamically
-        circuit_modules = [
-            f[:-3]  # Remove .ml extension
-            for f in files.keys()
-            if f.endswith(".ml") and f not in ("test.ml", "harness_utils.ml")
-        ]
-        if is_n2t:
-            # For N2T projects, include all circuit files
-            modules_list = circuit_modules if circuit_modules else None
-        else:
-            # For standard projects, only include circuit if it exists
-            if "circuit" in circuit_modules:
-                modules_list = ["circuit"]
-            else:
-                modules_list = circuit_modules if circuit_modules else None
-
-        modules_line = f" (modules {' '.join(modules_list)})\n" if modules_list else ""
-
-        # Only include input.txt dependency if it exists
-        has_input_txt = "input.txt" in files
-        input_deps_line = " (deps input.txt)" if has_input_txt else ""
-
-        dune_file = slot.path / "dune"
-        dune_content = f"""(library
- (name user_circuit)
- (libraries {libs}){modules_line}(preprocess
-  (pps ppx_hardcaml ppx_jane)))
-
-(library
- (name user_test)
- (libraries 
-   {test_libs})
- (modules test harness_utils)
- (wrapped false)
- (inline_tests{input_deps_line})
- (preprocess
-  (pps ppx_hardcaml ppx_jane ppx_expect)))
-"""
-        # Always write dune file (may change if project type changes)
-        dune_file.write_text(dune_content)
-
-        # Ensure harness_utils.ml exists
-        harness_file = slot.path / "harness_utils.ml"
-        if not harness_file.exists():
-            harness_file.write_text("""open! Hardcaml_waveterm
-
-let write_vcd_if_requested waves =
-  match Sys.getenv_opt "HARDCAML_VCD_PATH" with
-  | Some path -> Waveform.Serialize.marshall_vcd waves path
-  | None -> ()
-""")
-
-        # Write files to root (flat layout)
-        for filename, content in files.items():
-            if (
-                filename.endswith(".ml")
-                or filename.endswith(".mli")
-                or filename == "input.txt"
-            ):
-                file_path = slot.path / filename
-            else:
-                continue  # Skip unknown file types
-
-            # Skip writing if content hasn't changed (preserves mtime for dune)
-            if file_path.exists():
-                try:
-                    existing_content = file_path.read_text()
-                    if existing_content == content:
-                        continue  # Content unchanged, skip write
-                except Exception:
-                    # If read fails, write anyway
-                    pass
-
-            file_path.write_text(content)
+        write_workspace_files(slot.path, files)
 
     def get_stats(self) -> dict:
         """Get cache statistics."""
@@ -301,20 +674,33 @@ let write_vcd_if_requested waves =
                     {
                         "session_id": session_id[:8] + "...",
                         "is_n2t": slot.is_n2t,
+                        "ready": slot.ready.is_set(),
+                        "busy": slot.lock.locked(),
+                        "size_bytes": slot.size_bytes,
                         "age_seconds": int(time.time() - slot.last_accessed),
                     }
                 )
             return {
                 "max_slots": self.max_slots,
                 "used_slots": len(self._slots),
+                "max_bytes": self.max_bytes,
+                "used_bytes": sum(slot.size_bytes for slot in self._slots.values()),
+                "min_free_bytes": self.min_free_bytes,
+                "free_bytes": self._free_bytes(),
+                "idle_ttl": self.idle_ttl,
                 "slots": slots_info,
+                "pool": self.pool.get_stats() if self.pool is not None else None,
+                "trash": self.trash.get_stats() if self.trash is not None else None,
             }
 
     def clear(self) -> None:
         """Clear all cached workspaces."""
         with self._global_lock:
-            for session_id in list(self._slots.keys()):
-                self._evict_slot(session_id)
+            slots = list(self._slots.values())
+            self._slots.clear()
+        for slot in slots:
+            self._evict_slot(slot)
+        self._save_index()
         log.info("Workspace cache cleared")
 
 
@@ -329,5 +715,21 @@ def get_workspace_cache() -> WorkspaceCache:
     if _cache_instance is None:
         with _cache_lock:
             if _cache_instance is None:
-                _cache_instance = WorkspaceCache()
+                from config import (
+                    WORKSPACE_CACHE_IDLE_TTL,
+                    WORKSPACE_CACHE_MAX_BYTES,
+                    WORKSPACE_CACHE_MAX_SLOTS,
+                    WORKSPACE_CACHE_MIN_FREE_BYTES,
+                )
+                from trash_reaper import get_trash_reaper
+                from workspace_pool import get_workspace_pool
+
+                _cache_instance = WorkspaceCache(
+                    max_slots=WORKSPACE_CACHE_MAX_SLOTS,
+                    pool=get_workspace_pool(),
+                    trash=get_trash_reaper(),
+                    max_bytes=WORKSPACE_CACHE_MAX_BYTES,
+                    min_free_bytes=WORKSPACE_CACHE_MIN_FREE_BYTES,
+                    idle_ttl=WORKSPACE_CACHE_IDLE_TTL,
+                )
     return _cache_instance
@@ -0,0 +1,198 @@
+"""
+Fast workspace materialization from build templates.
+
+Copying a template's pre-built _build/ tree byte for byte dominates cold
+session setup. Instead each file is materialized as cheaply as is safe:
+
+1. reflink (copy-on-write clone) when the filesystem supports it - always safe
+2. hardlink for immutable _build artifacts - dune replaces targets by
+   unlinking and rewriting them, so the template's inode is never modified
+3. plain copy for everything else: sources and dune files we overwrite in
+   place, and dune's own state files at the top of _build/
+
+The result is a metadata-only operation for the bulk of the tree.
+"""
+
+import errno
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# ioctl request for FICLONE (Linux): clone src_fd's extents into dst_fd
+FICLONE = 0x40049409
+
+BUILD_DIR_NAME = "_build"
+
+# Errors meaning "this filesystem can't do that", not "this file is broken"
+_UNSUPPORTED_ERRNOS = {
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EPERM,
+    errno.EMLINK,
+}
+
+# Reflink support per destination device (st_dev), probed on first use
+_reflink_support: dict[int, bool] = {}
+_reflink_lock = threading.Lock()
+
+
+@dataclass
+class MaterializeStats:
+    """What materialize_tree did, for logging and benchmarks."""
+
+    files: int = 0
+    bytes: int = 0
+    cloned: int = 0
+    linked: int = 0
+    copied: int = 0
+    elapsed_ms: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{self.files} files ({self.bytes // 1024}KB): "
+            f"{self.cloned} cloned, {self.linked} linked, {self.copied} copied "
+            f"in {self.elapsed_ms}ms"
+        )
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """Clone src into dst with FICLONE. Returns False if unsupported."""
+    if fcntl is None:
+        return False
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError as e:
+            if e.errno in _UNSUPPORTED_ERRNOS:
+                ok = False
+            else:
+                raise
+        else:
+            ok = True
+    if not ok:
+        os.unlink(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def _is_mutable_build_file(rel_parts: tuple[str, ...]) -> bool:
+    """
+    Whether a path inside _build/ may be rewritten in place by dune.
+
+    Dune's own databases and logs live directly in _build/ (.db,
+    .digest-db, log, .lock, ...); build targets live in subdirectories.
+    """
+    return len(rel_parts) == 2
+
+
+class _Materializer:
+    def __init__(self, link_build: bool):
+        self.link_build = link_build
+        self.stats = MaterializeStats()
+        self._dest_reflink: bool | None = None
+
+    def _reflink_supported(self, dest_dir: str) -> bool:
+        if self._dest_reflink is None:
+            dev = os.stat(dest_dir).st_dev
+            with _reflink_lock:
+                self._dest_reflink = _reflink_support.get(dev, fcntl is not None)
+        return self._dest_reflink
+
+    def _mark_reflink_unsupported(self, dest_dir: str) -> None:
+        self._dest_reflink = False
+        with _reflink_lock:
+            _reflink_support[os.stat(dest_dir).st_dev] = False
+
+    def file(
+        self, src: str, dst: str, rel_parts: tuple[str, ...], size: int, fresh: bool
+    ) -> None:
+        self.stats.files += 1
+        self.stats.bytes += size
+        dest_dir = os.path.dirname(dst)
+        if not fresh and os.path.lexists(dst):
+            # Never write through an existing file: it may be a hardlink
+            os.unlink(dst)
+
+        if self._reflink_supported(dest_dir):
+            if _reflink(src, dst):
+                self.stats.cloned += 1
+                return
+            self._mark_reflink_unsupported(dest_dir)
+
+        in_build = rel_parts[0] == BUILD_DIR_NAME
+        if self.link_build and in_build and not _is_mutable_build_file(rel_parts):
+            try:
+                os.link(src, dst)
+                self.stats.linked += 1
+                return
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+
+        shutil.copy2(src, dst)
+        self.stats.copied += 1
+
+    def tree(
+        self, src: str, dst: str, rel_parts: tuple[str, ...], skip: set[str]
+    ) -> None:
+        fresh = not os.path.exists(dst)
+        os.makedirs(dst, exist_ok=True)
+        with os.scandir(src) as entries:
+            for entry in entries:
+                if entry.name in skip:
+                    continue
+                child_parts = rel_parts + (entry.name,)
+                target = os.path.join(dst, entry.name)
+                if entry.is_symlink():
+                    if not fresh and os.path.lexists(target):
+                        os.unlink(target)
+                    os.symlink(os.readlink(entry.path), target)
+                elif entry.is_dir():
+                    self.tree(entry.path, target, child_parts, set())
+                else:
+                    size = entry.stat(follow_symlinks=False).st_size
+                    self.file(entry.path, target, child_parts, size, fresh)
+        shutil.copystat(src, dst)
+
+
+def materialize_tree(
+    src: Path,
+    dest: Path,
+    skip: set[str] | None = None,
+    link_build: bool = True,
+    rel_root: tuple[str, ...] = (),
+) -> MaterializeStats:
+    """
+    Recreate the template tree `src` at `dest` as cheaply as possible.
+
+    Args:
+        src: Template directory
+        dest: Destination (created; may already exist)
+        skip: Top-level entry names to leave out (e.g. {"src", "test"})
+        link_build: Allow hardlinks for immutable _build/ artifacts
+        rel_root: Location of `src` inside a workspace, e.g. ("_build",) when
+            materializing just a build tree; decides which files are artifacts
+
+    Returns:
+        MaterializeStats with per-method file counts and total bytes.
+    """
+    t0 = time.time()
+    materializer = _Materializer(link_build=link_build)
+    materializer.tree(str(src), str(dest), rel_root, skip or set())
+    materializer.stats.elapsed_ms = int((time.time() - t0) * 1000)
+    return materializer.stats
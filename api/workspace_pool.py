@@ -0,0 +1,250 @@
+"""
+Pool of pre-warmed workspaces for instant first compiles.
+
+A brand-new session otherwise pays for template materialization plus
+dune's first full build of the workspace (ppx drivers, harness_utils, the
+inline test runner). The pool keeps a few workspaces per project type that
+have already been built once against a placeholder circuit; a new session
+claims one with a single rename, and a background thread refills the pool.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+from workspace_cache import _owner_alive, materialize_workspace, write_workspace_files
+
+if TYPE_CHECKING:
+    from trash_reaper import TrashReaper
+
+log = logging.getLogger(__name__)
+
+# Default configuration
+DEFAULT_TARGET_SIZE = 2
+REFILL_INTERVAL_SECONDS = 30
+
+# Minimal sources used for the warm-up build. They are removed on claim so
+# nothing stale is left next to the user's files.
+PLACEHOLDER_FILES = {
+    False: {
+        "circuit.ml": "let placeholder = ()\n",
+        "circuit.mli": "val placeholder : unit\n",
+        "test.ml": 'let%expect_test "warmup" = ()\n',
+    },
+    True: {
+        "placeholder.ml": "let placeholder = ()\n",
+        "test.ml": 'let%expect_test "warmup" = ()\n',
+    },
+}
+
+# Runs the warm-up build in a prepared workspace: (workspace_path, is_n2t)
+WarmBuild = Callable[[Path, bool], None]
+
+
+def _kind(is_n2t: bool) -> str:
+    return "n2t" if is_n2t else "standard"
+
+
+class WorkspacePool:
+    """
+    Ready-to-use workspaces, kept separately for standard and N2T projects.
+
+    Pool directories live under `pool_root/<pid>`, so worker processes
+    sharing a cache root never touch each other's pools. `pool_root` must be
+    on the same filesystem as the workspace cache so claiming is an O(1)
+    rename.
+    """
+
+    def __init__(
+        self,
+        pool_root: Path,
+        template_dir_for: Callable[[bool], Path],
+        warm_build: WarmBuild,
+        target_size: int = DEFAULT_TARGET_SIZE,
+        should_defer: Callable[[], bool] | None = None,
+        trash: "TrashReaper | None" = None,
+    ):
+        self.pool_root = pool_root / str(os.getpid())
+        self.template_dir_for = template_dir_for
+        self.warm_build = warm_build
+        self.target_size = target_size
+        # Lets the refill thread yield to user builds when the server is busy
+        self.should_defer = should_defer or (lambda: False)
+
+        self._ready: dict[bool, deque[Path]] = {False: deque(), True: deque()}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._claimed = 0
+        self._misses = 0
+
+        # Leftovers from processes that are gone may be half-built: start
+        # clean (via the trash reaper if there is one, so startup doesn't wait
+        # on deleting their _build trees). Pools of live workers are theirs.
+        pool_root.mkdir(parents=True, exist_ok=True)
+        for stale in self._stale_dirs(pool_root):
+            if trash is not None:
+                trash.discard(stale)
+            else:
+                shutil.rmtree(stale, ignore_errors=True)
+        self.pool_root.mkdir(exist_ok=True)
+
+        log.info(
+            f"WorkspacePool initialized: target={target_size}, root={self.pool_root}"
+        )
+
+    @staticmethod
+    def _stale_dirs(pool_root: Path) -> list[Path]:
+        """Per-process pool directories whose process is no longer running."""
+        stale = []
+        for entry in pool_root.iterdir():
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            # Anything not named after a pid predates per-process pools
+            pid = int(entry.name) if entry.name.isdigit() else None
+            if not _owner_alive(pid):
+                stale.append(entry)
+        return stale
+
+    def claim(self, is_n2t: bool, dest: Path) -> bool:
+        """
+        Move a ready workspace to dest.
+
+        Returns:
+            True if a pooled workspace was claimed, False if the pool was empty
+            or the pooled workspace could not be moved.
+        """
+        with self._lock:
+            ready = self._ready[is_n2t]
+            if not ready:
+                self._misses += 1
+                self._wakeup.set()
+                return False
+            path = ready.popleft()
+            self._claimed += 1
+
+        try:
+            os.rename(path, dest)
+        except OSError as e:
+            # Treat as a miss: the caller materializes the workspace instead
+            log.warning(f"Could not claim pooled workspace {path.name}: {e}")
+            with self._lock:
+                self._claimed -= 1
+                self._misses += 1
+            shutil.rmtree(path, ignore_errors=True)
+            self._wakeup.set()
+            return False
+        for filename in PLACEHOLDER_FILES[is_n2t]:
+            (dest / filename).unlink(missing_ok=True)
+        self._wakeup.set()
+        log.info(f"Claimed pooled {_kind(is_n2t)} workspace")
+        return True
+
+    def prepare_one(self, is_n2t: bool) -> Path:
+        """Materialize and warm one workspace, then add it to the pool."""
+        path = self.pool_root / f"{_kind(is_n2t)}-{uuid.uuid4().hex[:12]}"
+        try:
+            stats = materialize_workspace(self.template_dir_for(is_n2t), path)
+            write_workspace_files(path, PLACEHOLDER_FILES[is_n2t])
+            self.warm_build(path, is_n2t)
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+        with self._lock:
+            self._ready[is_n2t].append(path)
+        log.info(f"Prepared pooled {_kind(is_n2t)} workspace ({stats.summary()})")
+        return path
+
+    def refill(self) -> int:
+        """Top up both pools to the target size. Returns workspaces prepared."""
+        prepared = 0
+        for is_n2t in (False, True):
+            while not self._stop.is_set():
+                with self._lock:
+                    if len(self._ready[is_n2t]) >= self.target_size:
+                        break
+                if self.should_defer():
+                    return prepared
+                self.prepare_one(is_n2t)
+                prepared += 1
+        return prepared
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refill()
+            except Exception as e:
+                log.warning(f"Workspace pool refill failed: {e}")
+            self._wakeup.wait(REFILL_INTERVAL_SECONDS)
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        """Start refilling in the background."""
+        if self.target_size <= 0:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="workspace-pool", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the refill thread (ready workspaces are kept)."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def get_stats(self) -> dict:
+        """Get pool statistics."""
+        with self._lock:
+            return {
+                "target_size": self.target_size,
+                "ready": {
+                    _kind(is_n2t): len(paths) for is_n2t, paths in self._ready.items()
+                },
+                "claimed": self._claimed,
+                "misses": self._misses,
+            }
+
+
+# Global singleton instance
+_pool_instance: WorkspacePool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_workspace_pool() -> WorkspacePool | None:
+    """Get the global workspace pool, or None if pooling is disabled."""
+    global _pool_instance
+    from config import WORKSPACE_POOL_SIZE
+
+    if WORKSPACE_POOL_SIZE <= 0:
+        return None
+    if _pool_instance is None:
+        with _pool_lock:
+            if _pool_instance is None:
+                # Lazy imports: compiler imports the workspace cache
+                from build_executor import get_build_executor
+                from compiler import get_template_dir_for, warm_workspace
+                from trash_reaper import get_trash_reaper
+                from workspace_cache import DEFAULT_CACHE_ROOT
+
+                _pool_instance = WorkspacePool(
+                    pool_root=DEFAULT_CACHE_ROOT / ".pool",
+                    template_dir_for=get_template_dir_for,
+                    warm_build=warm_workspace,
+                    target_size=WORKSPACE_POOL_SIZE,
+                    should_defer=lambda: get_build_executor().get_stats()["waiting"] > 0,
+                    trash=get_trash_reaper(),
+                )
+    return _pool_instance
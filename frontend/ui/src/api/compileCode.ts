@@ -32,6 +32,8 @@ export interface CompileOptions {
   timeoutSeconds?: number;
   includeVcd?: boolean;
   apiBase?: string;
+  /** "check" for cheap editor feedback: diagnostics only, nothing runs */
+  mode?: CompileRequest["mode"];
 }
 
 export async function compileCode(
@@ -47,6 +49,7 @@ export async function compileCode(
     timeoutSeconds = 60,
     includeVcd = true,
     apiBase = "",
+    mode = "test",
   } = options;
 
   const processedTest = input ? injectInputData(test, input) : test;
@@ -60,6 +63,9 @@ export async function compileCode(
     timeout_seconds: timeoutSeconds,
     include_vcd: includeVcd,
     session_id: getSessionId(),
+    // The VCD is only needed for download; fetch it from waveform_vcd_ref then
+    inline_vcd: false,
+    mode,
   };
 
   if (input) {
@@ -82,6 +88,15 @@ export async function compileCode(
       };
     }
 
+    if (response.status === 503) {
+      return {
+        success: false,
+        error_type: "server_busy",
+        error_message:
+          "The build server is busy. Please try again in a few seconds.",
+      };
+    }
+
     if (!response.ok) {
       return {
         success: false,
@@ -90,7 +105,12 @@ export async function compileCode(
       };
     }
 
-    return await response.json();
+    const result: CompileResult = await response.json();
+    // Waveform URLs are relative to the API
+    for (const ref of [result.waveform_ref, result.waveform_vcd_ref]) {
+      if (ref) ref.url = `${apiBase}${ref.url}`;
+    }
+    return result;
   } catch (error) {
     return {
       success: false,
@@ -0,0 +1,46 @@
+import type {
+  WaveformRef,
+  WaveformSignals,
+  WaveformWindow,
+} from "@ui/shared-types/compiler";
+
+export interface WaveformWindowOptions {
+  start: number;
+  end: number;
+  /** Width of the view in pixels; denser changes are merged server-side */
+  points: number;
+  /** Signal names (default: all) */
+  signals?: string[];
+}
+
+async function getJson<T>(url: string): Promise<T> {
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+  }
+  return response.json();
+}
+
+/** List the signals of a VCD (e.g. result.waveform_vcd_ref). */
+export function fetchWaveformSignals(ref: WaveformRef): Promise<WaveformSignals> {
+  return getJson(`${ref.url}/signals`);
+}
+
+/**
+ * Fetch the visible part of a VCD, so panning and zooming only transfers
+ * the changes on screen.
+ */
+export function fetchWaveformWindow(
+  ref: WaveformRef,
+  options: WaveformWindowOptions
+): Promise<WaveformWindow> {
+  const params = new URLSearchParams({
+    start: String(options.start),
+    end: String(options.end),
+    points: String(options.points),
+  });
+  if (options.signals) {
+    params.set("signals", options.signals.join(","));
+  }
+  return getJson(`${ref.url}/window?${params}`);
+}
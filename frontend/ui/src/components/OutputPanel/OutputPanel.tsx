@@ -34,9 +34,22 @@ export function OutputPanel({
     []
   );
 
-  const handleDownloadVcd = () => {
-    if (!result?.waveform_vcd) return;
-    const blob = new Blob([result.waveform_vcd], { type: "text/plain" });
+  const hasVcd = Boolean(result?.waveform_vcd || result?.waveform_vcd_ref);
+
+  const handleDownloadVcd = async () => {
+    let vcd = result?.waveform_vcd;
+    if (!vcd && result?.waveform_vcd_ref) {
+      try {
+        const response = await fetch(result.waveform_vcd_ref.url);
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        vcd = await response.text();
+      } catch (err) {
+        console.error("Failed to fetch VCD:", err);
+        return;
+      }
+    }
+    if (!vcd) return;
+    const blob = new Blob([vcd], { type: "text/plain" });
     const url = URL.createObjectURL(blob);
     const a = document.createElement("a");
     a.href = url;
@@ -122,11 +135,11 @@ export function OutputPanel({
             <button
               className={styles.downloadBtn}
               onClick={handleDownloadVcd}
-              disabled={!result?.waveform_vcd}
+              disabled={!hasVcd}
               title={
                 !generateVcd
                   ? "Enable 'Generate VCD' and run again"
-                  : !result?.waveform_vcd
+                  : !hasVcd
                     ? "Run your code to generate VCD"
                     : "Download VCD file"
               }
@@ -3,5 +3,17 @@ export { OcamlEditor, type OcamlEditorProps } from "@ui/components/OcamlEditor";
 export { OutputPanel, type OutputPanelProps } from "@ui/components/OutputPanel/OutputPanel";
 export { useCompiler, type UseCompilerReturn, type UseCompilerOptions } from "@ui/hooks/useCompiler";
 export { compileCode, type CompileOptions } from "@ui/api/compileCode";
-export type { CompileResult, CompileRequest } from "@ui/shared-types/compiler";
+export {
+  fetchWaveformSignals,
+  fetchWaveformWindow,
+  type WaveformWindowOptions,
+} from "@ui/api/waveformWindow";
+export type {
+  CompileResult,
+  CompileRequest,
+  Diagnostic,
+  WaveformRef,
+  WaveformSignals,
+  WaveformWindow,
+} from "@ui/shared-types/compiler";
 export { apiConfig, getApiUrl } from "@ui/config";
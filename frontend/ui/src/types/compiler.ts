@@ -1,3 +1,25 @@
+export interface WaveformRef {
+  /** sha256 of the payload */
+  id: string;
+  /** Uncompressed size in bytes */
+  size: number;
+  url: string;
+}
+
+/** A compiler error, warning or alert at a source location */
+export interface Diagnostic {
+  file: string;
+  line: number;
+  end_line: number;
+  /** 0-based columns on line and end_line, end exclusive */
+  column: number | null;
+  end_column: number | null;
+  severity: "error" | "warning" | "alert";
+  message: string;
+  /** unbound_error, syntax_error, type_error or compile_error; "warning"/"alert" otherwise */
+  error_class: string;
+}
+
 export interface CompileResult {
   success: boolean;
   output?: string;
@@ -10,6 +32,12 @@ export interface CompileResult {
   run_time_ms?: number;
   tests_passed?: number;
   tests_failed?: number;
+  queue_wait_ms?: number;
+  queue_depth?: number;
+  waveform_ref?: WaveformRef;
+  waveform_vcd_ref?: WaveformRef;
+  /** Distinct compiler diagnostics, in the order dune printed them */
+  diagnostics?: Diagnostic[];
 }
 
 export interface CompileRequest {
@@ -17,4 +45,42 @@ export interface CompileRequest {
   timeout_seconds?: number;
   include_vcd?: boolean;
   session_id?: string;
+  inline_vcd?: boolean;
+  /** check: type-check only; build: compile and link; test (default): also run the tests */
+  mode?: "check" | "build" | "test";
+}
+
+export interface WaveformSignalInfo {
+  name: string;
+  width: number;
+  /** Number of value changes */
+  changes: number;
+}
+
+export interface WaveformSignals {
+  end_time: number;
+  signals: WaveformSignalInfo[];
+}
+
+/**
+ * A change as [time, value], or [time, value, n] where n changes closer
+ * together than the window's resolution were merged (value of the last).
+ * Values are hex strings, "x" if unknown.
+ */
+export type WaveformChange = [number, string] | [number, string, number];
+
+export interface WaveformWindowSignal {
+  name: string;
+  width: number;
+  /** Value at the window start; null before the signal's first change */
+  initial: string | null;
+  changes: WaveformChange[];
+}
+
+export interface WaveformWindow {
+  start: number;
+  end: number;
+  /** Time units per point */
+  resolution: number;
+  signals: WaveformWindowSignal[];
 }